@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from .authentication import token_deleted, user_changed
+        from .db import configure_sqlite
+        from .metrics import install_query_recorder
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_query_recorder)
+        post_delete.connect(token_deleted, sender=Token)
+        post_save.connect(user_changed, sender=User)
+        post_delete.connect(user_changed, sender=User)
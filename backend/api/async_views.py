@@ -0,0 +1,322 @@
+"""
+Async versions of the read endpoints for ASGI deployments (uvicorn workers).
+
+DRF 3.14 views are synchronous, so these are plain Django async views using the async
+ORM. They return the same JSON as their counterparts in api.views and are mounted in
+place of them when settings.ASYNC_READ_VIEWS is enabled. event_stream has no
+synchronous counterpart and is always mounted.
+"""
+import asyncio
+import json
+import time
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db.models import Count
+from django.db import router
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import token_cache
+from .events import events_after, hub, latest_event_id, redeem_ticket
+from .conditional import not_modified, with_etag
+from .derived import DerivedError, add_derived_values, derived_rows, derived_stats, parse_derived
+from .exports import acsv_export_chunks, aexport_batches
+from .filters import EquipmentPagination, FilterError, filter_equipment
+from .metrics import TimedJSONRenderer
+from .models import Equipment, UploadHistory
+from .routers import areplica_allowed, read_from_replica
+from .serializers import EquipmentSerializer, UploadHistorySerializer
+
+
+class AuthenticationFailed(Exception):
+    pass
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(TimedJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+async def token_user(key):
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        raise AuthenticationFailed('Invalid token.')
+    if not token.user.is_active:
+        raise AuthenticationFailed('User inactive or deleted.')
+    token_cache.set(token.key, token.user, token)
+    return token.user
+
+
+async def authenticate(request):
+    """Token auth (as api.authentication.CachingTokenAuthentication), then session."""
+    auth = request.headers.get('Authorization', '').split()
+    if auth and auth[0].lower() == 'token':
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        return await token_user(auth[1])
+    user = await sync_to_async(get_user)(request)
+    return user if user.is_authenticated else None
+
+
+def async_read_view(view):
+    """Authenticate, then run the view with replica routing, as @api_view + @use_read_replica do."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        try:
+            user = await authenticate(request)
+        except AuthenticationFailed as e:
+            return json_response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        with read_from_replica(await areplica_allowed(user)):
+            return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+async def get_upload(upload_id, user):
+    """Resolve upload_id (latest upload when empty) and check ownership; returns (upload, error_response)."""
+    if not upload_id:
+        latest_upload = await UploadHistory.objects.filter(user=user).order_by('-uploaded_at').afirst()
+        if not latest_upload:
+            return None, json_response({'error': 'No data available'}, status=status.HTTP_404_NOT_FOUND)
+        return latest_upload, None
+    
+    try:
+        upload = await UploadHistory.objects.aget(id=upload_id)
+    except UploadHistory.DoesNotExist:
+        return None, json_response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if upload.user_id != (user.id if user else None):
+        return None, json_response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    return upload, None
+
+
+@async_read_view
+async def get_summary(request, user):
+    try:
+        derived = parse_derived(request.GET.getlist('derived'))
+    except DerivedError as e:
+        return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    upload, error = await get_upload(request.GET.get('upload_id'), user)
+    if error:
+        return error
+    cached = not_modified(request, upload)
+    if cached:
+        return cached
+    
+    summary = {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'uploaded_at': upload.uploaded_at,
+        'total_count': upload.total_count,
+        'avg_flowrate': round(upload.avg_flowrate, 2),
+        'avg_pressure': round(upload.avg_pressure, 2),
+        'avg_temperature': round(upload.avg_temperature, 2),
+        'type_distribution': await upload.atype_distribution()
+    }
+    if derived:
+        summary['derived'] = await sync_to_async(derived_stats)(upload, derived)
+    return with_etag(json_response(summary), upload)
+
+
+@async_read_view
+async def get_derived(request, user):
+    try:
+        derived = parse_derived(request.GET.getlist('derived'))
+    except DerivedError as e:
+        return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not derived:
+        return json_response({'error': 'No derived expressions given'}, status=status.HTTP_400_BAD_REQUEST)
+    upload, error = await get_upload(request.GET.get('upload_id'), user)
+    if error:
+        return error
+    cached = not_modified(request, upload)
+    if cached:
+        return cached
+    
+    return with_etag(json_response({
+        'upload_id': upload.id,
+        'derived': await sync_to_async(derived_stats)(upload, derived),
+    }), upload)
+
+
+@async_read_view
+async def get_equipment_list(request, user):
+    try:
+        derived = parse_derived(request.GET.getlist('derived'))
+    except DerivedError as e:
+        return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    upload, error = await get_upload(request.GET.get('upload_id'), user)
+    if error:
+        return error
+    cached = not_modified(request, upload)
+    if cached:
+        return cached
+    
+    try:
+        # filter_equipment may probe the schema once, so build the queryset off the event loop
+        equipment_list = await sync_to_async(filter_equipment)(
+            Equipment.objects.filter(upload_history=upload).select_related('equipment_type'),
+            request.GET
+        )
+    except FilterError as e:
+        return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    paginator = EquipmentPagination()
+    try:
+        page_size = min(int(request.GET[paginator.page_size_query_param]), paginator.max_page_size)
+        if page_size <= 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        page_size = paginator.page_size
+    if not page_size:
+        items = [eq async for eq in equipment_list]
+        data = EquipmentSerializer(items, many=True).data
+        await sync_to_async(add_derived_values)(upload, derived, data)
+        return with_etag(json_response(data), upload)
+    
+    count = await equipment_list.acount()
+    try:
+        page_number = max(int(request.GET.get(paginator.page_query_param, 1)), 1)
+    except ValueError:
+        page_number = 1
+    offset = (page_number - 1) * page_size
+    if offset and offset >= count:
+        return json_response({'detail': 'Invalid page.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    items = [eq async for eq in equipment_list[offset:offset + page_size]]
+    data = EquipmentSerializer(items, many=True).data
+    await sync_to_async(add_derived_values)(upload, derived, data)
+    url = request.build_absolute_uri()
+    previous_url = None
+    if page_number > 1:
+        previous_url = (remove_query_param(url, paginator.page_query_param) if page_number == 2
+                        else replace_query_param(url, paginator.page_query_param, page_number - 1))
+    return with_etag(json_response({
+        'count': count,
+        'next': (replace_query_param(url, paginator.page_query_param, page_number + 1)
+                 if offset + page_size < count else None),
+        'previous': previous_url,
+        'results': data,
+    }), upload)
+
+
+@async_read_view
+async def get_history(request, user):
+    uploads = (UploadHistory.objects.filter(user=user).order_by('-uploaded_at')
+               .annotate(num_equipment=Count('equipment'))[:5])
+    items = [upload async for upload in uploads]
+    return json_response(UploadHistorySerializer(items, many=True).data)
+
+
+@async_read_view
+async def export_csv(request, user):
+    try:
+        derived = parse_derived(request.GET.getlist('derived'))
+    except DerivedError as e:
+        return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    upload, error = await get_upload(request.GET.get('upload_id'), user)
+    if error:
+        return error
+    cached = not_modified(request, upload)
+    if cached:
+        return cached
+    
+    # The alias is bound now because the rows are read after the replica routing context exits
+    lookup = None
+    if derived:
+        # Evaluate while the routing still applies; streaming then reads the cache
+        lookup = sync_to_async(partial(derived_rows, upload, derived))
+        await lookup([])
+    batches = aexport_batches(Equipment.objects.using(router.db_for_read(Equipment)).filter(upload_history=upload),
+                              lookup)
+    response = StreamingHttpResponse(acsv_export_chunks(batches, list(derived)), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="equipment_data_{upload.id}.csv"'
+    return with_etag(response, upload)
+
+
+def sse_message(event):
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(event.data)}\n\n'
+
+
+async def event_messages(user_id, after):
+    """
+    Server-sent events for one stream: the user's events after ``after``, then new ones as
+    they are published, with a comment line every EVENT_HEARTBEAT_SECONDS.
+    """
+    queue = hub.subscribe(user_id)
+    try:
+        # Replay after subscribing so nothing published in between is missed; the
+        # queue may then repeat some of the replayed events, hence last_id
+        yield f'retry: {settings.EVENT_RETRY_MS}\n\n'
+        last_id = after
+        for event in await events_after(user_id, after):
+            last_id = event.id
+            yield sse_message(event)
+        
+        # Django 4.2 does not notice a client disconnecting mid-stream, so end every stream
+        # after EVENT_STREAM_SECONDS; EventSource reconnects and resumes from Last-Event-ID
+        deadline = time.monotonic() + settings.EVENT_STREAM_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(remaining, settings.EVENT_HEARTBEAT_SECONDS))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event is None:
+                # Fell behind; the client catches up from the table on reconnect
+                break
+            if event.id > last_id:
+                last_id = event.id
+                yield sse_message(event)
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+async def event_stream(request):
+    """
+    Push upload, history and report changes to the user as server-sent events. EventSource
+    cannot send headers, so a browser passes ``?ticket=`` from POST /api/events/ticket/
+    instead; the token itself would end up in access logs and browser history.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the stream would hold a worker thread for its whole lifetime
+        return json_response({'error': 'The event stream needs the ASGI server (config.asgi:application)'},
+                             status=status.HTTP_501_NOT_IMPLEMENTED)
+    if 'token' in request.GET:
+        return json_response({'error': 'Pass a ticket from POST /api/events/ticket/, not the token'},
+                             status=status.HTTP_400_BAD_REQUEST)
+    try:
+        ticket = request.GET.get('ticket')
+        if ticket:
+            user = await redeem_ticket(ticket)
+            if user is None:
+                raise AuthenticationFailed('Invalid or expired ticket.')
+        else:
+            user = await authenticate(request)
+    except AuthenticationFailed as e:
+        return json_response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        after = int(last_event_id) if last_event_id else await latest_event_id()
+    except ValueError:
+        return json_response({'error': 'Last-Event-ID must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(event_messages(user.id if user else None, after),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,102 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    Token key -> (user, token), kept in the Django cache for TOKEN_AUTH_CACHE_TTL seconds.
+
+    Entries are deleted explicitly when their token is deleted or their user changes (see
+    the signal receivers below). That only reaches every worker process when the cache
+    is shared (e.g. REDIS_URL), so with a per-process backend nothing is cached and a
+    revoked token is refused everywhere at once.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def cache(self):
+        backend = caches['default']
+        if settings.TOKEN_AUTH_CACHE_TTL <= 0 or isinstance(backend, (LocMemCache, DummyCache)):
+            return None
+        return backend
+    
+    def _key(self, key):
+        return f'auth-token:{key}'
+    
+    def get(self, key):
+        cache = self.cache
+        if cache is None:
+            return None
+        entry = cache.get(self._key(key))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        # Unpickled per lookup, so each request gets its own User instance
+        return entry
+    
+    def set(self, key, user, token):
+        cache = self.cache
+        if cache is not None:
+            cache.set(self._key(key), (user, token), settings.TOKEN_AUTH_CACHE_TTL)
+    
+    def invalidate(self, key):
+        cache = self.cache
+        if cache is not None:
+            cache.delete(self._key(key))
+    
+    def invalidate_user(self, user_id):
+        cache = self.cache
+        if cache is not None:
+            from rest_framework.authtoken.models import Token
+            cache.delete_many([self._key(key) for key in Token.objects.filter(user_id=user_id)
+                               .values_list('key', flat=True)])
+    
+    def clear(self):
+        with self._lock:
+            self.hits = self.misses = 0
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.cache is not None,
+                'ttl_seconds': settings.TOKEN_AUTH_CACHE_TTL,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the token/user query while the key is cached."""
+    
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+def user_changed(sender, instance, **kwargs):
+    # Deactivation, password changes and deletion must not be masked by a cached user
+    token_cache.invalidate_user(instance.pk)
@@ -0,0 +1,12 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Django's SQLite backend, able to start a transaction with BEGIN IMMEDIATE."""
+
+    # Set by api.db.write_transaction() around the atomic block it opens
+    begin_immediate = False
+
+    def _start_transaction_under_autocommit(self):
+        # IMMEDIATE takes the write lock at BEGIN, waiting out busy_timeout if it is held
+        self.cursor().execute('BEGIN IMMEDIATE' if self.begin_immediate else 'BEGIN')
@@ -0,0 +1,88 @@
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections
+
+from .ingest import UPLOAD_EXTENSIONS, CSVFormatError, csv_filename, ingest_csv, prune_history
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BatchError(ValueError):
+    pass
+
+
+def batch_executor():
+    """
+    Thread pool shared by all batch requests, so at most BATCH_UPLOAD_WORKERS files are
+    being ingested at once however many batches arrive together.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BATCH_UPLOAD_WORKERS,
+                                           thread_name_prefix='batch-ingest')
+        return _executor
+
+
+def expand_batch(uploaded_files):
+    """
+    Flatten the uploaded files into (name, file) pairs, opening each CSV inside a .zip
+    archive as its own file. Members are decompressed lazily as they are parsed.
+    """
+    files = []
+    for uploaded_file in uploaded_files:
+        if not uploaded_file.name.lower().endswith('.zip'):
+            files.append((uploaded_file.name, uploaded_file))
+            continue
+        try:
+            archive = zipfile.ZipFile(uploaded_file)
+        except zipfile.BadZipFile:
+            files.append((uploaded_file.name, None))
+            continue
+        for member in archive.infolist():
+            name = os.path.basename(member.filename)
+            if (member.is_dir() or member.filename.startswith('__MACOSX/')
+                    or not name.lower().endswith(UPLOAD_EXTENSIONS) or name.lower().endswith('.zip')):
+                continue
+            files.append((name, File(archive.open(member), name=name)))
+    if not files:
+        raise BatchError('No CSV files provided')
+    if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+        raise BatchError(f'A batch can contain at most {settings.BATCH_UPLOAD_MAX_FILES} files')
+    return files
+
+
+def ingest_one(name, uploaded_file, user):
+    try:
+        if uploaded_file is None:
+            raise CSVFormatError('Invalid zip archive')
+        if not name.lower().endswith(UPLOAD_EXTENSIONS):
+            raise CSVFormatError(f'File must be one of: {", ".join(UPLOAD_EXTENSIONS)}')
+        result = ingest_csv(uploaded_file, user, filename=csv_filename(name), prune=False)
+        return {'filename': name, 'upload_id': result['upload_id'], 'dropped_rows': result['dropped_rows'],
+                'summary': result['summary']}
+    except Exception as e:
+        # One bad file is reported in its result instead of failing the whole batch
+        return {'filename': name, 'error': str(e)}
+    finally:
+        # Pool threads outlive the request, so don't leave their connections open
+        connections.close_all()
+
+
+def ingest_batch(uploaded_files, user):
+    """
+    Ingest every file of a batch on the shared pool, each in its own transaction, and
+    prune history once at the end. Returns one result per file, in upload order.
+    """
+    files = expand_batch(uploaded_files)
+    futures = [batch_executor().submit(ingest_one, name, f, user) for name, f in files]
+    results = [future.result() for future in futures]
+    if any('upload_id' in result for result in results):
+        prune_history(user)
+    return results
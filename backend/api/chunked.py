@@ -0,0 +1,118 @@
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .ingest import CSVFormatError
+from .models import ChunkedUpload
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ChunkError(ValueError):
+    pass
+
+
+class ChunkedUploadBusy(Exception):
+    pass
+
+
+def purge_expired_chunked_uploads():
+    cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+    for session in ChunkedUpload.objects.filter(created_at__lt=cutoff):
+        shutil.rmtree(session.directory, ignore_errors=True)
+        session.delete()
+
+
+def expected_chunk_size(session, index):
+    if index == session.total_chunks - 1:
+        return session.total_size - session.chunk_size * (session.total_chunks - 1)
+    return session.chunk_size
+
+
+def store_chunk(session, index, stream, sha256):
+    """
+    Stream one chunk body to disk, verifying its length and SHA-256 before it becomes
+    visible as a received part. Re-sending a chunk simply replaces it.
+    """
+    if not 0 <= index < session.total_chunks:
+        raise ChunkError(f'Chunk index must be between 0 and {session.total_chunks - 1}')
+
+    session.directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = session.directory / f'{index:06d}.{uuid.uuid4().hex}.tmp'
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                block = stream.read(COPY_BUFFER_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > session.chunk_size:
+                    raise ChunkError('Chunk is larger than the negotiated chunk size')
+                digest.update(block)
+                out.write(block)
+
+        if size != expected_chunk_size(session, index):
+            raise ChunkError(f'Chunk {index} must be {expected_chunk_size(session, index)} bytes, got {size}')
+        if digest.hexdigest() != sha256.lower():
+            raise ChunkError(f'Checksum mismatch for chunk {index}')
+
+        os.replace(tmp_path, session.part_path(index))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def assemble_and_ingest(session, ingest):
+    """
+    Concatenate the received parts and hand the file to ``ingest``. The session
+    directory is claimed by renaming it, so concurrent finalize calls cannot both ingest.
+
+    The session is consumed when ingest succeeds or rejects the file. Any other failure
+    (e.g. a locked database) hands the parts back, so finalize can be retried.
+    """
+    missing = sorted(set(range(session.total_chunks)) - set(session.received_chunks()))
+    if missing:
+        raise ChunkError(f'Missing chunks: {missing[:20]}')
+
+    work_dir = session.directory.with_name(f'{session.id}.assembling')
+    try:
+        os.rename(session.directory, work_dir)
+    except FileNotFoundError:
+        raise ChunkedUploadBusy()
+
+    assembled = work_dir / 'assembled'
+    try:
+        with open(assembled, 'wb') as out:
+            for index in range(session.total_chunks):
+                with open(work_dir / session.part_path(index).name, 'rb') as part:
+                    shutil.copyfileobj(part, out, COPY_BUFFER_SIZE)
+
+        with open(assembled, 'rb') as f:
+            result = ingest(File(f, name=session.filename))
+    except CSVFormatError:
+        discard_chunked_upload(session, work_dir)
+        raise
+    except BaseException:
+        assembled.unlink(missing_ok=True)
+        try:
+            os.rename(work_dir, session.directory)
+        except OSError:
+            # A chunk re-sent meanwhile recreated the directory; start over
+            shutil.rmtree(session.directory, ignore_errors=True)
+            discard_chunked_upload(session, work_dir)
+        raise
+    discard_chunked_upload(session, work_dir)
+    return result
+
+
+def discard_chunked_upload(session, directory):
+    shutil.rmtree(directory, ignore_errors=True)
+    session.delete()
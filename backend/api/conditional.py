@@ -0,0 +1,20 @@
+from django.utils.cache import get_conditional_response
+
+
+def upload_etag(upload):
+    # A delta upload moves uploaded_at to the time of the merge, so id + upload time identify
+    # every representation of a dataset version (summary, equipment pages, CSV export)
+    return f'W/"upload-{upload.id}-{int(upload.uploaded_at.timestamp() * 1000000)}"'
+
+
+def not_modified(request, upload):
+    """Return a 304 response if the client's If-None-Match already names this upload, else None."""
+    response = get_conditional_response(request, etag=upload_etag(upload))
+    if response is not None:
+        response['ETag'] = upload_etag(upload)
+    return response
+
+
+def with_etag(response, upload):
+    response['ETag'] = upload_etag(upload)
+    return response
@@ -0,0 +1,33 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to every new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def write_transaction(using=DEFAULT_DB_ALIAS):
+    """
+    transaction.atomic() that takes SQLite's write lock before anything is read.
+
+    In WAL mode a transaction that reads and then writes fails at once with "database is
+    locked", without waiting out busy_timeout, if another connection committed in between.
+    The outermost block therefore starts with BEGIN IMMEDIATE (see api.backends.sqlite3);
+    nested inside another atomic block, it runs in that block's transaction.
+    """
+    connection = connections[using]
+    previous = getattr(connection, 'begin_immediate', False)
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        connection.begin_immediate = previous
@@ -0,0 +1,332 @@
+"""
+Derived parameters: user-defined arithmetic over a dataset's Flowrate, Pressure and
+Temperature, evaluated with NumPy over whole columns.
+
+An expression is parsed with ast and only a small whitelist of nodes is accepted, so
+nothing the user sends is ever executed as Python. Columns are read once per dataset
+version and kept, with every evaluated expression, in a per-process LRU bounded by
+DERIVED_CACHE_BYTES.
+"""
+import ast
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+
+from .conditional import upload_etag
+from .models import Equipment, EquipmentType
+
+COLUMNS = ['flowrate', 'pressure', 'temperature']
+DERIVED_FETCH_SIZE = 100000
+
+
+@lru_cache(maxsize=None)
+def operators():
+    """
+    The whitelist: ``(binary, comparisons, functions)`` mapping AST operator types and
+    function names to NumPy. Built on first use, so serving requests without derived
+    parameters never imports NumPy.
+    """
+    import numpy as np
+
+    binary = {
+        ast.Add: np.add,
+        ast.Sub: np.subtract,
+        ast.Mult: np.multiply,
+        ast.Div: np.true_divide,
+        ast.Pow: np.power,
+        ast.Mod: lambda a, b: a - b * np.floor(a / b),  # Python's modulo; several times faster than np.mod
+    }
+    comparisons = {
+        ast.Lt: np.less,
+        ast.LtE: np.less_equal,
+        ast.Gt: np.greater,
+        ast.GtE: np.greater_equal,
+        ast.Eq: np.equal,
+        ast.NotEq: np.not_equal,
+    }
+    functions = {
+        'abs': (1, np.abs),
+        'sqrt': (1, np.sqrt),
+        'log': (1, np.log),
+        'log10': (1, np.log10),
+        'exp': (1, np.exp),
+        'min': (2, np.minimum),
+        'max': (2, np.maximum),
+        'where': (3, np.where),
+    }
+    return binary, comparisons, functions
+
+
+class DerivedError(ValueError):
+    pass
+
+
+def type_mean(values, data):
+    """Each row's value replaced by the mean over the rows of its equipment type."""
+    import numpy as np
+
+    values = np.broadcast_to(values, data['type_codes'].shape).astype('float64')
+    sums = np.bincount(data['type_codes'], weights=values, minlength=len(data['type_names']))
+    counts = np.bincount(data['type_codes'], minlength=len(data['type_names']))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums / counts)[data['type_codes']]
+
+
+class Expression:
+    """A validated expression; evaluate() maps the dataset columns to one array."""
+
+    def __init__(self, text):
+        if len(text) > settings.DERIVED_MAX_LENGTH:
+            raise DerivedError(f'Expression longer than {settings.DERIVED_MAX_LENGTH} characters')
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError:
+            raise DerivedError(f'Invalid expression: {text}')
+        self._evaluate = self._compile(tree.body)
+        # Normalised text (case, spacing, parentheses): the cache key
+        self.source = ast.unparse(tree)
+
+    def evaluate(self, data):
+        import numpy as np
+
+        with np.errstate(all='ignore'):
+            result = self._evaluate(data)
+        return np.broadcast_to(result, data['type_codes'].shape)
+
+    def _compile(self, node):
+        """Turn an AST node into a function of the column data, rejecting anything not whitelisted."""
+        import numpy as np
+
+        binary, comparisons, functions = operators()
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = float(node.value)
+            return lambda data: value
+        if isinstance(node, ast.Name):
+            name = node.id.lower()
+            if name not in COLUMNS:
+                raise DerivedError(f'Unknown column: {node.id} (use {", ".join(COLUMNS)})')
+            node.id = name
+            return lambda data: data[name]
+        if (isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow) and isinstance(node.right, ast.Constant)
+                and node.right.value in (2, 3, 4)):
+            # np.power takes the slow libm path for negative bases; small powers are products
+            base, exponent = self._compile(node.left), int(node.right.value)
+
+            def power(data):
+                value = base(data)
+                result = np.square(value)
+                for _ in range(exponent - 2):
+                    result = result * value
+                return result
+            return power
+        if isinstance(node, ast.BinOp) and type(node.op) in binary:
+            operator, left, right = binary[type(node.op)], self._compile(node.left), self._compile(node.right)
+            return lambda data: operator(left(data), right(data))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Not)):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.USub):
+                return lambda data: np.negative(operand(data))
+            if isinstance(node.op, ast.Not):
+                return lambda data: np.logical_not(operand(data))
+            return operand
+        if isinstance(node, ast.Compare) and all(type(op) in comparisons for op in node.ops):
+            # a < b < c is (a < b) and (b < c)
+            operands = [self._compile(operand) for operand in [node.left, *node.comparators]]
+            tests = [comparisons[type(op)] for op in node.ops]
+
+            def compare(data):
+                values = [operand(data) for operand in operands]
+                result = tests[0](values[0], values[1])
+                for i, operator in enumerate(tests[1:], 1):
+                    result = np.logical_and(result, operator(values[i], values[i + 1]))
+                return result
+            return compare
+        if isinstance(node, ast.BoolOp):
+            operator = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            operands = [self._compile(operand) for operand in node.values]
+
+            def combine(data):
+                result = operands[0](data)
+                for operand in operands[1:]:
+                    result = operator(result, operand(data))
+                return result
+            return combine
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name = node.func.id.lower()
+            arity = 1 if name == 'type_mean' else functions.get(name, (None,))[0]
+            if arity != len(node.args):
+                raise DerivedError(f'Unknown function or wrong number of arguments: {node.func.id}()')
+            node.func.id = name
+            args = [self._compile(arg) for arg in node.args]
+            if name == 'type_mean':
+                return lambda data: type_mean(args[0](data), data)
+            function = functions[name][1]
+            return lambda data: function(*(arg(data) for arg in args))
+        raise DerivedError(f'Unsupported syntax in expression: {ast.unparse(node)}')
+
+
+def parse_derived(values):
+    """
+    Parse ``derived`` query values, each ``name:expression`` or a bare expression (named
+    after itself), into a dict of name -> Expression.
+    """
+    if len(values) > settings.DERIVED_MAX_EXPRESSIONS:
+        raise DerivedError(f'At most {settings.DERIVED_MAX_EXPRESSIONS} derived expressions per request')
+    derived = {}
+    for value in values:
+        name, colon, text = value.partition(':')
+        if not colon:
+            name, text = None, value
+        elif not name.strip().isidentifier():
+            raise DerivedError(f'Invalid derived name: {name}')
+        expression = Expression(text)
+        derived[name.strip() if name else expression.source] = expression
+    return derived
+
+
+class DerivedCache:
+    """LRU of dataset columns and evaluated expressions, bounded by the bytes of their arrays."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (nbytes, value)
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, nbytes):
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[0]
+            self._entries[key] = (nbytes, value)
+            self._size += nbytes
+            while self._size > settings.DERIVED_CACHE_BYTES and len(self._entries) > 1:
+                self._size -= self._entries.popitem(last=False)[1][0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+derived_cache = DerivedCache()
+
+
+def load_columns(upload):
+    """
+    Read a dataset's ids, type codes and metric columns into arrays, in id order. Raw
+    cursor batches keep the peak to one batch of row tuples rather than the whole dataset.
+    """
+    import numpy as np
+
+    queryset = (Equipment.objects.filter(upload_history=upload).order_by('id')
+                .values_list('id', 'equipment_type_id', *COLUMNS))
+    sql, params = queryset.query.sql_with_params()
+    batches = []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(DERIVED_FETCH_SIZE):
+            batches.append(np.array(rows, dtype='float64'))
+    table = np.concatenate(batches) if batches else np.empty((0, 2 + len(COLUMNS)))
+    type_ids, type_codes = np.unique(table[:, 1].astype('int64'), return_inverse=True)
+    names = dict(EquipmentType.objects.filter(id__in=type_ids.tolist()).values_list('id', 'name'))
+    return {
+        'ids': table[:, 0].astype('int64'),
+        'type_codes': type_codes,
+        'type_names': [names[type_id] for type_id in type_ids.tolist()],
+        **{column: np.ascontiguousarray(table[:, 2 + i]) for i, column in enumerate(COLUMNS)},
+    }
+
+
+def dataset_columns(upload):
+    # The ETag names the dataset version, so a delta upload never reads stale columns
+    key = (upload.id, upload_etag(upload))
+    data = derived_cache.get(key)
+    if data is None:
+        data = load_columns(upload)
+        derived_cache.set(key, data, sum(value.nbytes for value in data.values() if hasattr(value, 'nbytes')))
+    return data
+
+
+def evaluate(upload, expression):
+    """Return ``(data, values)``: the dataset's columns and the expression over every row."""
+    data = dataset_columns(upload)
+    key = (upload.id, upload_etag(upload), expression.source)
+    values = derived_cache.get(key)
+    if values is None:
+        values = expression.evaluate(data).copy()
+        derived_cache.set(key, values, values.nbytes)
+    return data, values
+
+
+def json_value(value):
+    if isinstance(value, bool):
+        return value
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def derived_stats(upload, derived):
+    """Summary statistics of each derived expression: overall and per equipment type."""
+    import numpy as np
+
+    stats = {}
+    for name, expression in derived.items():
+        data, values = evaluate(upload, expression)
+        flag = values.dtype == np.bool_
+        numbers = values.astype('float64')
+        finite = np.isfinite(numbers)
+        codes = data['type_codes'][finite]
+        sums = np.bincount(codes, weights=numbers[finite], minlength=len(data['type_names']))
+        counts = np.bincount(codes, minlength=len(data['type_names']))
+        stats[name] = {
+            'expression': expression.source,
+            'kind': 'flag' if flag else 'number',
+            'count': int(finite.sum()),
+            'null_count': int(len(numbers) - finite.sum()),
+            'mean': json_value(numbers[finite].mean()) if finite.any() else None,
+            'min': json_value(numbers[finite].min()) if finite.any() else None,
+            'max': json_value(numbers[finite].max()) if finite.any() else None,
+            'by_type': {type_name: json_value(total / count) if count else None
+                        for type_name, total, count in zip(data['type_names'], sums.tolist(), counts.tolist())},
+        }
+        if flag:
+            stats[name]['true_count'] = int(values.sum())
+    return stats
+
+
+def derived_rows(upload, derived, ids):
+    """Values of each derived expression for the given equipment ids: one tuple per id."""
+    if not derived:
+        return [()] * len(ids)
+    import numpy as np
+
+    data = dataset_columns(upload)
+    ids = np.asarray(ids, dtype='int64')
+    if not len(data['ids']):
+        return [(None,) * len(derived)] * len(ids)
+    positions = np.minimum(np.searchsorted(data['ids'], ids), len(data['ids']) - 1)
+    found = (data['ids'][positions] == ids).tolist()
+    columns = []
+    for expression in derived.values():
+        values = evaluate(upload, expression)[1][positions].tolist()
+        columns.append([json_value(value) if present else None for value, present in zip(values, found)])
+    return list(zip(*columns))
+
+
+def add_derived_values(upload, derived, items):
+    """Give each serialized equipment row a ``derived`` dict of name -> value."""
+    if not derived:
+        return
+    for item, values in zip(items, derived_rows(upload, derived, [item['id'] for item in items])):
+        item['derived'] = dict(zip(derived, values))
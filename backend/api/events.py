@@ -0,0 +1,147 @@
+"""
+Push notifications behind the server-sent event stream (GET /api/events/).
+
+publish() records an Event row from any thread, off the caller's thread so an upload
+never waits on it. EventHub fans new rows out to the open streams of their owner: each
+process polls the table once per EVENT_POLL_INTERVAL however many streams it serves, so
+events published by other worker processes arrive too, and an event published by the
+process itself wakes its poller at once.
+"""
+import asyncio
+import contextvars
+import logging
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Event, EventTicket
+
+logger = logging.getLogger(__name__)
+
+EVENT_PURGE_INTERVAL = 60
+EVENT_POLL_BATCH = 500
+
+# One writer thread: events keep their order and add a single connection's worth of writes
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='event-writer')
+_last_purge = 0.0
+
+
+def publish(user_id, kind, data):
+    """Queue an event for the streams of a user (of guests when None). Never blocks or raises."""
+    _writer.submit(_record, user_id, kind, data)
+
+
+def _record(user_id, kind, data):
+    global _last_purge
+    close_old_connections()
+    try:
+        Event.objects.create(user_id=user_id, kind=kind, data=data)
+        if time.monotonic() - _last_purge > EVENT_PURGE_INTERVAL:
+            _last_purge = time.monotonic()
+            cutoff = timezone.now() - timedelta(seconds=settings.EVENT_RETENTION_SECONDS)
+            Event.objects.filter(created_at__lt=cutoff).delete()
+    except Exception:
+        logger.exception('Could not record %s event', kind)
+        return
+    hub.wake()
+
+
+def issue_ticket(user):
+    """A single-use key for opening one event stream as ``user`` within EVENT_TICKET_SECONDS."""
+    cutoff = timezone.now() - timedelta(seconds=settings.EVENT_TICKET_SECONDS)
+    EventTicket.objects.filter(created_at__lt=cutoff).delete()
+    return EventTicket.objects.create(key=secrets.token_urlsafe(32), user=user).key
+
+
+async def redeem_ticket(key):
+    """Consume a stream ticket and return its user, or None if it is unknown, used or expired."""
+    cutoff = timezone.now() - timedelta(seconds=settings.EVENT_TICKET_SECONDS)
+    ticket = await EventTicket.objects.select_related('user').filter(key=key, created_at__gte=cutoff).afirst()
+    if ticket is None:
+        return None
+    # Only the request whose delete removes the row gets to use it
+    deleted, _ = await EventTicket.objects.filter(key=key).adelete()
+    return ticket.user if deleted and ticket.user.is_active else None
+
+
+async def latest_event_id():
+    return await Event.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+async def events_after(user_id, after):
+    return [event async for event in Event.objects.filter(user_id=user_id, id__gt=after).order_by('id')]
+
+
+class EventHub:
+    """Per-process fan-out of new Event rows to asyncio queues, one per open stream."""
+
+    def __init__(self):
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self._streams = {}  # user id (None for guests) -> set of queues
+
+    def subscribe(self, user_id):
+        """
+        Return a queue receiving the user's new events. A queue that fills up gets None
+        after its last event and is dropped; the client then resumes from Last-Event-ID.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._wake, self._task, self._streams = loop, asyncio.Event(), None, {}
+        queue = asyncio.Queue(maxsize=settings.EVENT_QUEUE_SIZE)
+        self._streams.setdefault(user_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            # A fresh context: the poller outlives the request that started it
+            # (create_task only takes context= from Python 3.11)
+            self._task = contextvars.Context().run(loop.create_task, self._poll())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._streams.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._streams[user_id]
+
+    def wake(self):
+        """Poll now instead of at the next interval. Safe to call from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # The loop has been closed
+                pass
+
+    async def _poll(self):
+        last_id = await latest_event_id()
+        while self._streams:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.EVENT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                events = [event async for event in
+                          Event.objects.filter(id__gt=last_id).order_by('id')[:EVENT_POLL_BATCH]]
+            except Exception:
+                logger.exception('Could not poll events')
+                continue
+            for event in events:
+                last_id = event.id
+                for queue in list(self._streams.get(event.user_id, ())):
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        self.unsubscribe(event.user_id, queue)
+                        queue.get_nowait()
+                        queue.put_nowait(None)
+
+
+hub = EventHub()
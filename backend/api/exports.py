@@ -0,0 +1,65 @@
+import csv
+import io
+from itertools import islice
+
+from .ingest import REQUIRED_COLUMNS
+
+# values_list() fields in REQUIRED_COLUMNS order
+EXPORT_FIELDS = ['equipment_name', 'equipment_type__name', 'flowrate', 'pressure', 'temperature']
+CSV_EXPORT_CHUNK_SIZE = 2000
+
+
+def format_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def csv_export_chunks(rows, derived_columns=()):
+    """Render rows as CSV, one string per CSV_EXPORT_CHUNK_SIZE rows rather than one per row."""
+    yield format_csv([REQUIRED_COLUMNS + list(derived_columns)])
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, CSV_EXPORT_CHUNK_SIZE))
+        if not batch:
+            return
+        yield format_csv(batch)
+
+
+def with_derived(rows, lookup):
+    """
+    Append derived values to ``('id', *EXPORT_FIELDS)`` rows; ``lookup`` maps a batch of
+    ids to one tuple of values per id.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, CSV_EXPORT_CHUNK_SIZE)):
+        yield from (row[1:] + values for row, values in zip(batch, lookup([row[0] for row in batch])))
+
+
+async def aexport_batches(queryset, lookup=None):
+    """
+    Yield lists of EXPORT_FIELDS tuples in id order, one keyset-paginated query per batch,
+    each row extended by the values of the async ``lookup`` (as with_derived) if given.
+
+    Each batch is a short query, so a slow client never holds a cursor or transaction open.
+    (values_list().aiterator() would also do, but on Django 4.2 it runs the query on the
+    event loop thread.)
+    """
+    queryset = queryset.order_by('id').values_list('id', *EXPORT_FIELDS)
+    last_id = 0
+    while True:
+        batch = [row async for row in queryset.filter(id__gt=last_id)[:CSV_EXPORT_CHUNK_SIZE]]
+        if batch and lookup:
+            values = await lookup([row[0] for row in batch])
+            yield [row[1:] + extra for row, extra in zip(batch, values)]
+        elif batch:
+            yield [row[1:] for row in batch]
+        if len(batch) < CSV_EXPORT_CHUNK_SIZE:
+            return
+        last_id = batch[-1][0]
+
+
+async def acsv_export_chunks(batches, derived_columns=()):
+    yield format_csv([REQUIRED_COLUMNS + list(derived_columns)])
+    async for batch in batches:
+        yield format_csv(batch)
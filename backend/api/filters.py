@@ -0,0 +1,116 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.pagination import PageNumberPagination
+
+from .models import EquipmentType
+
+NAME_SEARCH_TABLE = 'api_equipment_name_fts'
+
+# Query param -> model field for the numeric range filters (<param>_min / <param>_max)
+RANGE_FIELDS = {
+    'flowrate': 'flowrate',
+    'pressure': 'pressure',
+    'temperature': 'temperature',
+}
+
+# Public sort keys -> model fields; all but type are backed by an (upload_history, field) index
+ORDERING_FIELDS = {
+    'name': 'equipment_name',
+    'type': 'equipment_type__name',
+    'flowrate': 'flowrate',
+    'pressure': 'pressure',
+    'temperature': 'temperature',
+    'id': 'id',
+}
+
+
+class FilterError(ValueError):
+    pass
+
+
+class EquipmentPagination(PageNumberPagination):
+    # No default page size: clients that don't ask for a page keep getting the full list
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def name_contains(term, using=DEFAULT_DB_ALIAS):
+    """Substring match on equipment_name that uses the trigram index when ``using`` has one."""
+    connection = connections[using]
+    # The FTS5 trigram tokenizer cannot match terms shorter than three characters
+    if connection.vendor == 'sqlite' and len(term) >= 3 and _sqlite_search_table_exists(connection):
+        phrase = '"%s"' % term.replace('"', '""')
+        return Q(id__in=RawSQL(
+            f'SELECT rowid FROM {NAME_SEARCH_TABLE} WHERE equipment_name MATCH %s',
+            [phrase]
+        ))
+    # On PostgreSQL the gin_trgm_ops index serves ILIKE directly
+    return Q(equipment_name__icontains=term)
+
+
+def name_startswith(prefix):
+    # A half-open range is served by the (upload_history, equipment_name) index on every backend
+    return Q(equipment_name__gte=prefix, equipment_name__lt=prefix + '\U0010ffff')
+
+
+def filter_equipment(queryset, params):
+    types = params.get('type')
+    if types:
+        names = [t.strip() for t in types.split(',') if t.strip()]
+        # Resolve names to ids first so the (upload_history, equipment_type) index applies
+        queryset = queryset.filter(equipment_type__in=EquipmentType.objects.filter(name__in=names))
+
+    name = params.get('name')
+    if name:
+        queryset = queryset.filter(name_contains(name, queryset.db))
+
+    name_prefix = params.get('name_prefix')
+    if name_prefix:
+        queryset = queryset.filter(name_startswith(name_prefix))
+
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(name_contains(search, queryset.db) | Q(equipment_type__name__icontains=search))
+
+    for param, field in RANGE_FIELDS.items():
+        for suffix, lookup in (('min', 'gte'), ('max', 'lte')):
+            value = params.get(f'{param}_{suffix}')
+            if value in (None, ''):
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                raise FilterError(f'{param}_{suffix} must be a number')
+            queryset = queryset.filter(**{f'{field}__{lookup}': value})
+
+    ordering = params.get('ordering')
+    if ordering:
+        descending = ordering.startswith('-')
+        key = ordering.lstrip('-')
+        if key not in ORDERING_FIELDS:
+            raise FilterError(f'ordering must be one of: {", ".join(ORDERING_FIELDS)}')
+        field = ORDERING_FIELDS[key]
+        queryset = queryset.order_by(f'-{field}' if descending else field, '-id' if descending else 'id')
+    else:
+        queryset = queryset.order_by('id')
+
+    return queryset
+
+
+_search_table_cache = {}
+
+
+def _sqlite_search_table_exists(connection):
+    # Older SQLite builds without FTS5 skip the table in the migration, and a replica may not
+    # have it, so check once per database file
+    db_name = str(connection.settings_dict['NAME'])
+    if db_name not in _search_table_cache:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [NAME_SEARCH_TABLE]
+            )
+            _search_table_cache[db_name] = cursor.fetchone() is not None
+    return _search_table_cache[db_name]
@@ -0,0 +1,344 @@
+import bz2
+import gzip
+import importlib.util
+import zipfile
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .db import write_transaction
+from .events import publish
+from .models import Equipment, EquipmentType, UploadHistory
+from .profiling import stage
+from .reports import discard_reports
+from .routers import pin_to_primary
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+METRIC_FIELDS = ['flowrate', 'pressure', 'temperature']
+
+# float64 to match the FloatField (double) columns the values end up in
+COLUMN_DTYPES = {
+    'Equipment Name': str,
+    'Type': 'category',
+    'Flowrate': 'float64',
+    'Pressure': 'float64',
+    'Temperature': 'float64',
+}
+
+# pandas (and pyarrow) are imported by the functions that parse: the URLconf imports this
+# module, and login or history requests should not pay for them
+CSV_ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+
+UPLOAD_EXTENSIONS = ('.csv', '.csv.gz', '.gz', '.zip', '.bz2')
+
+
+class CSVFormatError(ValueError):
+    pass
+
+
+def open_upload(uploaded_file):
+    """
+    Return a readable binary stream of CSV text for an uploaded file.
+
+    Compressed uploads are decompressed lazily as the parser reads, so the expanded
+    CSV never touches disk.
+    """
+    name = uploaded_file.name.lower()
+    if name.endswith('.csv'):
+        return uploaded_file
+    if name.endswith('.gz'):
+        return gzip.GzipFile(fileobj=uploaded_file, mode='rb')
+    if name.endswith('.bz2'):
+        return bz2.BZ2File(uploaded_file, mode='rb')
+    if name.endswith('.zip'):
+        try:
+            archive = zipfile.ZipFile(uploaded_file)
+        except zipfile.BadZipFile:
+            raise CSVFormatError('Invalid zip archive')
+        members = [m for m in archive.infolist() if m.filename.lower().endswith('.csv') and not m.is_dir()]
+        if len(members) != 1:
+            raise CSVFormatError('Zip archive must contain exactly one CSV file')
+        return archive.open(members[0])
+    raise CSVFormatError(f'File must be one of: {", ".join(UPLOAD_EXTENSIONS)}')
+
+
+def csv_filename(name):
+    """Strip a transport compression suffix so history shows ``data.csv`` rather than ``data.csv.gz``."""
+    for suffix in ('.gz', '.bz2'):
+        if name.lower().endswith('.csv' + suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def read_equipment_csv(csv_file, optional_columns=()):
+    """
+    Parse an equipment CSV into a typed DataFrame holding only the required columns,
+    plus those of ``optional_columns`` (read as text) that the file has.
+
+    Returns ``(df, dropped_rows)`` where ``dropped_rows`` counts rows discarded for
+    missing or non-numeric values.
+    """
+    import pandas as pd
+
+    with stage('parse'):
+        try:
+            header = pd.read_csv(csv_file, nrows=0).columns
+        except (OSError, EOFError, zipfile.BadZipFile) as e:
+            # Corrupt gzip/bz2/zip payloads surface on first read
+            raise CSVFormatError(f'Could not decompress upload: {e}')
+        except pd.errors.EmptyDataError:
+            raise CSVFormatError('File is empty')
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise CSVFormatError(f'Could not parse CSV: {e}')
+        missing = [col for col in REQUIRED_COLUMNS if col not in header]
+        if missing:
+            raise CSVFormatError(f'CSV must contain columns: {", ".join(REQUIRED_COLUMNS)}')
+        extra = [col for col in optional_columns if col in header]
+
+        csv_file.seek(0)
+        try:
+            df = pd.read_csv(csv_file, engine=CSV_ENGINE, usecols=REQUIRED_COLUMNS + extra,
+                             dtype={**COLUMN_DTYPES, **dict.fromkeys(extra, str)})
+        except ValueError:
+            # A numeric column holds text (or pyarrow hit a ragged line): re-read untyped
+            # with the C engine and coerce, so bad values become NaN instead of failing the upload
+            csv_file.seek(0)
+            try:
+                df = pd.read_csv(csv_file, engine='c', usecols=REQUIRED_COLUMNS + extra,
+                                 dtype={'Equipment Name': str, 'Type': 'category', **dict.fromkeys(extra, str)})
+            except (pd.errors.ParserError, UnicodeDecodeError) as e:
+                raise CSVFormatError(f'Could not parse CSV: {e}')
+            for col in NUMERIC_COLUMNS:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    rows_read = len(df)
+    with stage('dropna'):
+        df = df.dropna()
+        df['Type'] = df['Type'].cat.remove_unused_categories()
+    return df, rows_read - len(df)
+
+
+def equipment_type_ids(names):
+    """Map type names to EquipmentType ids, creating any that don't exist yet."""
+    names = [str(name) for name in names]
+    existing = dict(EquipmentType.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [name for name in names if name not in existing]
+    if missing:
+        # ignore_conflicts tolerates a concurrent upload creating the same type
+        EquipmentType.objects.bulk_create([EquipmentType(name=name) for name in missing], ignore_conflicts=True)
+        existing.update(EquipmentType.objects.filter(name__in=missing).values_list('name', 'id'))
+    return existing
+
+
+def prune_history(user, keep=5):
+    """Delete all but the ``keep`` most recent uploads of a user (or of guests when ``user`` is None)."""
+    if user:
+        uploads = UploadHistory.objects.filter(user=user).order_by('-uploaded_at')
+    else:
+        uploads = UploadHistory.objects.filter(user__isnull=True).order_by('-uploaded_at')
+    old_ids = list(uploads.values_list('id', flat=True)[keep:])
+    if not old_ids:
+        return
+    # The cascade reads before it deletes, which concurrent uploads would otherwise turn
+    # into "database is locked"
+    with write_transaction():
+        UploadHistory.objects.filter(id__in=old_ids).delete()
+    for upload_id in old_ids:
+        discard_reports(upload_id)
+    pin_to_primary(user)
+    publish(user.pk if user else None, 'history.pruned', {'upload_ids': old_ids})
+
+
+def ingest_csv(uploaded_file, user, filename=None, prune=True):
+    """
+    Parse an uploaded (optionally compressed) CSV, store it as a new dataset and prune
+    old history. Returns the upload response payload.
+    
+    The dataset is written in one transaction, so a failed insert leaves no partial upload.
+    """
+    df, dropped_rows = read_equipment_csv(open_upload(uploaded_file))
+    if df.empty:
+        raise CSVFormatError('No valid rows in file')
+    
+    with stage('aggregate'):
+        avg_flowrate = df['Flowrate'].mean()
+        avg_pressure = df['Pressure'].mean()
+        avg_temperature = df['Temperature'].mean()
+        total_count = len(df)
+        type_distribution = df['Type'].value_counts().to_dict()
+    
+    with stage('insert'), transaction.atomic():
+        upload_history = UploadHistory.objects.create(
+            filename=filename or csv_filename(uploaded_file.name),
+            total_count=total_count,
+            avg_flowrate=avg_flowrate,
+            avg_pressure=avg_pressure,
+            avg_temperature=avg_temperature,
+            user=user
+        )
+        
+        # Per-upload dictionary: categorical code -> EquipmentType id
+        type_ids = equipment_type_ids(df['Type'].cat.categories)
+        code_to_type_id = [type_ids[name] for name in df['Type'].cat.categories]
+        
+        equipment_objects = []
+        for name, code, flowrate, pressure, temperature in zip(
+                df['Equipment Name'], df['Type'].cat.codes, df['Flowrate'], df['Pressure'], df['Temperature']):
+            equipment_objects.append(Equipment(
+                upload_history=upload_history,
+                equipment_name=name,
+                equipment_type_id=code_to_type_id[code],
+                flowrate=flowrate,
+                pressure=pressure,
+                temperature=temperature
+            ))
+        
+        Equipment.objects.bulk_create(equipment_objects)
+    pin_to_primary(user)
+    
+    summary = {
+        'total_count': total_count,
+        'avg_flowrate': round(avg_flowrate, 2),
+        'avg_pressure': round(avg_pressure, 2),
+        'avg_temperature': round(avg_temperature, 2),
+        'type_distribution': type_distribution
+    }
+    publish(user.pk if user else None, 'upload.created',
+            {'upload_id': upload_history.id, 'filename': upload_history.filename, 'summary': summary})
+    
+    if prune:
+        with stage('prune'):
+            prune_history(user)
+    
+    return {
+        'message': 'File uploaded successfully',
+        'upload_id': upload_history.id,
+        'dropped_rows': dropped_rows,
+        'summary': summary
+    }
+
+
+def equipment_frame(df):
+    """Equipment rows of a parsed CSV, keyed like stored rows: name, occurrence, type id, metrics."""
+    import pandas as pd
+    
+    type_ids = equipment_type_ids(df['Type'].cat.categories)
+    code_to_type_id = pd.Series([type_ids[name] for name in df['Type'].cat.categories], dtype='int64')
+    rows = pd.DataFrame({
+        'equipment_name': df['Equipment Name'].to_numpy(),
+        'equipment_type_id': code_to_type_id.to_numpy()[df['Type'].cat.codes.to_numpy()],
+        **{field: df[column].to_numpy() for field, column in zip(METRIC_FIELDS, NUMERIC_COLUMNS)},
+    })
+    # Names may repeat within a dataset: the n-th row of a name pairs with the n-th stored one
+    rows['occurrence'] = rows.groupby('equipment_name').cumcount()
+    return rows
+
+
+def diff_equipment(stored, incoming):
+    """
+    Hash-join incoming rows to stored ones on (name, occurrence). Returns the DataFrames
+    ``(inserted, updated, deleted)`` and the number of unchanged rows; ``updated`` holds
+    both the new values and the stored ones (suffixed ``_old``).
+    """
+    merged = incoming.merge(stored, on=['equipment_name', 'occurrence'], how='outer',
+                            suffixes=('', '_old'), indicator=True)
+    inserted = merged[merged['_merge'] == 'left_only']
+    deleted = merged[merged['_merge'] == 'right_only']
+    both = merged[merged['_merge'] == 'both']
+    changed = both['equipment_type_id'] != both['equipment_type_id_old']
+    for field in METRIC_FIELDS:
+        changed |= both[field] != both[f'{field}_old']
+    return inserted, both[changed], deleted, int((~changed).sum())
+
+
+def _execute_many(sql, rows):
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+def merge_csv(uploaded_file, upload, filename=None):
+    """
+    Apply an uploaded CSV to an existing dataset as a delta: rows are matched to the
+    stored ones by ``Equipment Name``, and only added, changed or missing rows are
+    written. The stored averages are adjusted by those rows alone, and the dataset's
+    ``uploaded_at`` moves to now so caches holding the old version revalidate.
+    """
+    import pandas as pd
+    
+    df, dropped_rows = read_equipment_csv(open_upload(uploaded_file))
+    if df.empty:
+        raise CSVFormatError('No valid rows in file')
+    
+    with stage('insert'), write_transaction():
+        # Serialise deltas to one dataset (a no-op on SQLite, where the write lock already does)
+        upload = UploadHistory.objects.select_for_update().get(pk=upload.pk)
+        incoming = equipment_frame(df)
+        
+        with stage('diff'):
+            stored = pd.DataFrame.from_records(
+                list(upload.equipment.order_by('id').values_list('id', 'equipment_name', 'equipment_type_id',
+                                                                *METRIC_FIELDS)),
+                columns=['id', 'equipment_name', 'equipment_type_id', *METRIC_FIELDS])
+            stored['occurrence'] = stored.groupby('equipment_name').cumcount()
+            inserted, updated, deleted, unchanged = diff_equipment(stored, incoming)
+        
+        table = connection.ops.quote_name(Equipment._meta.db_table)
+        _execute_many(f'DELETE FROM {table} WHERE id = %s', [(int(pk),) for pk in deleted['id']])
+        _execute_many(
+            f'UPDATE {table} SET equipment_type_id = %s, flowrate = %s, pressure = %s, temperature = %s WHERE id = %s',
+            list(zip(updated['equipment_type_id'].astype('int64').tolist(),
+                     *[updated[field].tolist() for field in METRIC_FIELDS],
+                     updated['id'].astype('int64').tolist())))
+        Equipment.objects.bulk_create([
+            Equipment(upload_history=upload, equipment_name=name, equipment_type_id=int(type_id),
+                      flowrate=flowrate, pressure=pressure, temperature=temperature)
+            for name, type_id, flowrate, pressure, temperature in zip(
+                inserted['equipment_name'], inserted['equipment_type_id'],
+                *[inserted[field] for field in METRIC_FIELDS])
+        ])
+        
+        # Stored mean * count is the running sum; fold in only the rows that changed
+        total_count = upload.total_count + len(inserted) - len(deleted)
+        averages = {}
+        for field in METRIC_FIELDS:
+            total = (getattr(upload, f'avg_{field}') * upload.total_count
+                     + inserted[field].sum() - deleted[f'{field}_old'].sum()
+                     + (updated[field] - updated[f'{field}_old']).sum())
+            averages[f'avg_{field}'] = float(total / total_count)
+        UploadHistory.objects.filter(pk=upload.pk).update(
+            filename=filename or csv_filename(uploaded_file.name),
+            total_count=total_count,
+            uploaded_at=timezone.now(),
+            **averages
+        )
+        upload.refresh_from_db()
+        type_distribution = upload.type_distribution()
+    discard_reports(upload.id)
+    pin_to_primary(upload.user)
+    
+    changes = {
+        'inserted': len(inserted),
+        'updated': len(updated),
+        'deleted': len(deleted),
+        'unchanged': unchanged,
+    }
+    summary = {
+        'total_count': total_count,
+        'avg_flowrate': round(upload.avg_flowrate, 2),
+        'avg_pressure': round(upload.avg_pressure, 2),
+        'avg_temperature': round(upload.avg_temperature, 2),
+        'type_distribution': type_distribution
+    }
+    publish(upload.user_id, 'upload.updated',
+            {'upload_id': upload.id, 'filename': upload.filename, 'changes': changes, 'summary': summary})
+    
+    return {
+        'message': 'Dataset updated',
+        'upload_id': upload.id,
+        'dropped_rows': dropped_rows,
+        'changes': changes,
+        'summary': summary
+    }
@@ -0,0 +1,161 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from api.synthetic import synthetic_csv_bytes
+
+ENDPOINTS = ['upload', 'summary', 'equipment', 'equipment_page', 'history', 'pdf', 'excel']
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'min': round(ordered[0] * 1000, 2),
+        'p50': round(statistics.median(ordered) * 1000, 2),
+        'p95': round(ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)] * 1000, 2),
+        'mean': round(statistics.fmean(ordered) * 1000, 2),
+    }, round(len(ordered) / elapsed, 2)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the API endpoints on synthetic datasets of several sizes against a scratch SQLite '
+        'database, and save latency, throughput, query counts and peak RSS as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated row counts')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per endpoint and size')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument('--types', type=int, default=5)
+        parser.add_argument('--nan-ratio', type=float, default=0.0)
+        parser.add_argument('--extra-columns', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='JSON results path (default: bench-<rev>.json)')
+        parser.add_argument('--child', action='store_true', help='Internal: run against the scratch database')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.run_benchmark(options)))
+            return
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Always a fresh SQLite file, never the configured database or its replica
+            env = dict(os.environ, DB_ENGINE='sqlite', SQLITE_PATH=os.path.join(tmp, 'bench.sqlite3'),
+                       SQLITE_REPLICA_PATH='', MEDIA_ROOT=os.path.join(tmp, 'media'))
+            cmd = [sys.executable, sys.argv[0], 'bench_api', '--child']
+            for option in ('sizes', 'repeat', 'endpoints', 'types', 'nan_ratio', 'extra_columns', 'seed'):
+                cmd += [f"--{option.replace('_', '-')}", str(options[option])]
+            # stderr passes through, so failures in the child are visible
+            output = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, text=True, check=True).stdout
+            results = json.loads(output.strip().splitlines()[-1])
+
+        revision = git_revision()
+        report = {
+            'revision': revision,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': {key: options[key] for key in
+                        ('sizes', 'repeat', 'types', 'nan_ratio', 'extra_columns', 'seed')},
+            'results': results,
+        }
+        path = options['output'] or f"bench-{revision or 'local'}.json"
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(f"{'rows':>8} {'endpoint':<15}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>9}"
+                          f"{'queries':>9}{'bytes':>11}{'rss MiB':>9}")
+        for r in results:
+            rss = '-' if r['peak_rss_kib'] is None else f"{r['peak_rss_kib'] / 1024:.0f}"
+            self.stdout.write(
+                f"{r['rows']:>8} {r['endpoint']:<15}{r['latency_ms']['p50']:>10.1f}{r['latency_ms']['p95']:>10.1f}"
+                f"{r['throughput_rps']:>9.1f}{r['queries']:>9}{r['response_bytes']:>11}{rss:>9}"
+            )
+        self.stdout.write(f'Saved {path}')
+
+    def run_benchmark(self, options):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from api.reports import discard_reports
+        try:
+            import resource
+        except ImportError:
+            # Unix only; peak RSS is reported as null elsewhere (e.g. Windows)
+            resource = None
+
+        call_command('migrate', verbosity=0)
+        user = User.objects.create_user('bench', password='bench')
+        client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        endpoints = [e for e in options['endpoints'].split(',') if e]
+
+        results = []
+        for rows in [int(size) for size in options['sizes'].split(',')]:
+            csv_bytes = synthetic_csv_bytes(rows, types=options['types'], nan_ratio=options['nan_ratio'],
+                                            extra_columns=options['extra_columns'], seed=options['seed'])
+            upload_id = client.post('/api/upload/', {'file': SimpleUploadedFile('bench.csv', csv_bytes)}).json()[
+                'upload_id']
+            requests = {
+                'upload': lambda: client.post('/api/upload/', {'file': SimpleUploadedFile('bench.csv', csv_bytes)}),
+                'summary': lambda: client.get('/api/summary/', {'upload_id': upload_id}),
+                'equipment': lambda: client.get('/api/equipment/', {'upload_id': upload_id}),
+                'equipment_page': lambda: client.get('/api/equipment/', {'upload_id': upload_id, 'page_size': 100,
+                                                                         'ordering': '-flowrate'}),
+                'history': lambda: client.get('/api/history/'),
+                # Reports are cached per upload, so drop the cached file to time a full render
+                'pdf': lambda: (discard_reports(upload_id),
+                                client.post('/api/generate-report/', {'upload_id': upload_id},
+                                            content_type='application/json'))[1],
+                'excel': lambda: (discard_reports(upload_id),
+                                  client.post('/api/export-excel/', {'upload_id': upload_id},
+                                              content_type='application/json'))[1],
+            }
+
+            for endpoint in endpoints:
+                send = requests[endpoint]
+                send()  # warm-up (report pool start-up, caches)
+                latencies = []
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        t0 = time.perf_counter()
+                        response = send()
+                        body = b''.join(response.streaming_content) if response.streaming else response.content
+                        latencies.append(time.perf_counter() - t0)
+                        if response.status_code >= 400:
+                            raise RuntimeError(f'{endpoint} returned {response.status_code}: {body[:200]}')
+                    elapsed = time.perf_counter() - started
+                latency, throughput = summarize(latencies, elapsed)
+                results.append({
+                    'rows': rows,
+                    'endpoint': endpoint,
+                    'latency_ms': latency,
+                    'throughput_rps': throughput,
+                    # Report rendering queries run in the pool workers and are not included
+                    'queries': len(queries) // options['repeat'],
+                    'response_bytes': len(body),
+                    'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+                })
+        return results
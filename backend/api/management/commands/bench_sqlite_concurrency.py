@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from api.synthetic import synthetic_csv_bytes
+
+
+class Command(BaseCommand):
+    help = (
+        'Run N reader and M uploader threads against a scratch SQLite database, with and without '
+        'the SQLite tuning layer, and report throughput and "database is locked" error rates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--uploaders', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+        parser.add_argument('--rows', type=int, default=2000, help='Rows per uploaded CSV')
+        parser.add_argument('--child', action='store_true', help='Internal: run one configuration')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.run_load(options)))
+            return
+
+        results = {}
+        for label, tuning in (('default', 'False'), ('tuned', 'True')):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, SQLITE_TUNING=tuning, SQLITE_PATH=os.path.join(tmp, 'bench.sqlite3'))
+                cmd = [sys.executable, sys.argv[0], 'bench_sqlite_concurrency', '--child',
+                       '--readers', str(options['readers']), '--uploaders', str(options['uploaders']),
+                       '--duration', str(options['duration']), '--rows', str(options['rows'])]
+                output = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True).stdout
+                results[label] = json.loads(output.strip().splitlines()[-1])
+
+        self.stdout.write(f"{'config':<10}{'role':<10}{'requests':>10}{'req/s':>10}{'errors':>10}{'locked':>10}")
+        for label, result in results.items():
+            for role in ('reader', 'uploader'):
+                r = result[role]
+                self.stdout.write(
+                    f"{label:<10}{role:<10}{r['requests']:>10}{r['requests'] / result['elapsed']:>10.1f}"
+                    f"{r['errors']:>10}{r['locked']:>10}"
+                )
+
+    def run_load(self, options):
+        call_command('migrate', verbosity=0)
+        csv_bytes = synthetic_csv_bytes(options['rows'])
+        Client().post('/api/upload/', {'file': SimpleUploadedFile('seed.csv', csv_bytes)})
+
+        stats = {role: {'requests': 0, 'errors': 0, 'locked': 0} for role in ('reader', 'uploader')}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def record(role, response):
+            body = response.content if response.status_code >= 500 else b''
+            with lock:
+                stats[role]['requests'] += 1
+                if response.status_code >= 500:
+                    stats[role]['errors'] += 1
+                    if b'locked' in body:
+                        stats[role]['locked'] += 1
+
+        def reader():
+            client = Client(raise_request_exception=False)
+            paths = ['/api/summary/', '/api/history/', '/api/equipment/?page_size=100']
+            i = 0
+            while time.monotonic() < deadline:
+                record('reader', client.get(paths[i % len(paths)]))
+                i += 1
+            connection.close()
+
+        def uploader():
+            client = Client(raise_request_exception=False)
+            while time.monotonic() < deadline:
+                record('uploader', client.post('/api/upload/', {'file': SimpleUploadedFile('load.csv', csv_bytes)}))
+            connection.close()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=uploader) for _ in range(options['uploaders'])]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return dict(stats, elapsed=time.monotonic() - start)
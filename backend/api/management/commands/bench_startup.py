@@ -0,0 +1,240 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.synthetic import synthetic_csv_bytes
+
+from .loadtest import VirtualClient, free_port, multipart
+
+DEFERRED_MODULES = 'pandas,numpy,reportlab.platypus,openpyxl'
+
+# What a worker does before serving: set Django up and import the URLconf (which
+# imports every view module), then, timed one by one, the lazily imported libraries
+STARTUP_SCRIPT = '''
+import json, os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+startup = time.perf_counter() - start
+startup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+loaded = [name for name in sys.argv[1:] if name in sys.modules]
+sys.stderr.write(DEFERRED_MARKER + '\\n')
+deferred = {}
+for name in sys.argv[1:]:
+    start = time.perf_counter()
+    __import__(name)
+    deferred[name] = time.perf_counter() - start
+print(json.dumps({'startup_s': startup, 'startup_rss_kb': startup_rss, 'loaded_at_startup': loaded,
+                  'deferred_s': deferred, 'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+'''
+
+DEFERRED_MARKER = '-- deferred imports --'
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Top-level imports of a ``-X importtime`` report: module -> (self, cumulative) microseconds."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and not match.group(3):
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def process_memory(pid):
+    """RSS and PSS (kB) of a process; PSS splits pages shared with forked siblings between them."""
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key.lower()] = int(value.split()[0])
+    return memory
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name (field 2) may hold spaces; the parent pid follows it
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return children
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure worker start-up: the time and memory to set Django up and import the URLconf '
+        '(with a -X importtime breakdown), the cost of the lazily imported libraries, and optionally '
+        'gunicorn boot time and per-worker memory with and without preload_app.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Start-up runs (the median is reported)')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+        parser.add_argument('--deferred', default=DEFERRED_MODULES, help='Lazily imported modules to time')
+        parser.add_argument('--gunicorn', action='store_true', help='Also compare gunicorn with and without preload')
+        parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+        parser.add_argument('--uploads', type=int, default=2, help='Uploads per gunicorn worker before re-measuring')
+        parser.add_argument('--output', help='Also write the results as JSON')
+
+    def handle(self, *args, **options):
+        results = {'startup': self.measure_startup(options)}
+        if options['gunicorn']:
+            if not os.path.exists('/proc/self/smaps_rollup'):
+                raise CommandError('--gunicorn reads worker memory from /proc and needs Linux')
+            results['gunicorn'] = {
+                'no_preload': self.measure_gunicorn(options, preload=False),
+                'preload': self.measure_gunicorn(options, preload=True),
+            }
+            self.report_gunicorn(results['gunicorn'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def measure_startup(self, options):
+        deferred = [name for name in options['deferred'].split(',') if name]
+        runs = []
+        for _ in range(options['repeat']):
+            script = f'DEFERRED_MARKER = {DEFERRED_MARKER!r}\n{STARTUP_SCRIPT}'
+            proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', script, *deferred],
+                                  cwd=settings.BASE_DIR, capture_output=True, text=True)
+            if proc.returncode:
+                raise CommandError(f'Start-up run failed:\n{proc.stderr[-2000:]}')
+            run = json.loads(proc.stdout.strip().splitlines()[-1])
+            # The report goes on to list the deferred imports; keep what start-up imported
+            run['imports'] = parse_importtime(proc.stderr.partition(DEFERRED_MARKER)[0])
+            runs.append(run)
+
+        startup = {
+            'startup_ms': round(statistics.median(run['startup_s'] for run in runs) * 1000, 1),
+            'startup_rss_mb': round(statistics.median(run['startup_rss_kb'] for run in runs) / 1024, 1),
+            'rss_after_deferred_mb': round(statistics.median(run['rss_kb'] for run in runs) / 1024, 1),
+            'loaded_at_startup': runs[0]['loaded_at_startup'],
+            'deferred_ms': {name: round(statistics.median(run['deferred_s'][name] for run in runs) * 1000, 1)
+                            for name in deferred},
+            'slowest_imports_ms': {
+                name: round(cumulative / 1000, 1) for name, (_, cumulative) in
+                sorted(runs[-1]['imports'].items(), key=lambda item: -item[1][1])[:options['top']]
+            },
+        }
+
+        self.stdout.write(f"Django set-up + URLconf: {startup['startup_ms']} ms, "
+                          f"peak RSS {startup['startup_rss_mb']} MB (median of {len(runs)})")
+        loaded = ', '.join(startup['loaded_at_startup']) or 'none'
+        self.stdout.write(f'Deferred modules already imported at start-up: {loaded}')
+        self.stdout.write('Slowest top-level imports (cumulative ms):')
+        for name, ms in startup['slowest_imports_ms'].items():
+            self.stdout.write(f'  {ms:>8.1f}  {name}')
+        self.stdout.write('First use of a lazily imported library (ms):')
+        for name, ms in startup['deferred_ms'].items():
+            self.stdout.write(f'  {ms:>8.1f}  {name}')
+        self.stdout.write(f"Peak RSS after importing them all: {startup['rss_after_deferred_mb']} MB")
+        return startup
+
+    @contextmanager
+    def gunicorn(self, options, preload):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_ENGINE='sqlite', SQLITE_PATH=os.path.join(tmp, 'startup.sqlite3'),
+                       SQLITE_REPLICA_PATH='', MEDIA_ROOT=os.path.join(tmp, 'media'),
+                       GUNICORN_PRELOAD=str(preload))
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+                           cwd=settings.BASE_DIR, env=env, check=True)
+            url = f'http://127.0.0.1:{free_port()}'
+            started = time.monotonic()
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', 'config.wsgi:application', '--bind', url[len('http://'):],
+                 '--workers', str(options['workers']), '--log-level', 'warning'],
+                cwd=settings.BASE_DIR, env=env)
+            try:
+                yield server, url, started
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def concurrent_round(self, url, requests):
+        """Send one request per worker at once, so that every (sync) worker serves one."""
+        latencies = [None] * len(requests)
+
+        def send(i, method, path, body, content_type):
+            client = VirtualClient(url, timeout=120)
+            start = time.perf_counter()
+            status, _ = client.request(method, path, body, content_type)
+            if status >= 400:
+                raise CommandError(f'{method} {path} returned {status}')
+            latencies[i] = time.perf_counter() - start
+
+        threads = [threading.Thread(target=send, args=(i, *request)) for i, request in enumerate(requests)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        return max(latencies) * 1000
+
+    def memory(self, server):
+        workers = [process_memory(pid) for pid in child_pids(server.pid)]
+        master = process_memory(server.pid)
+        return {
+            'workers': len(workers),
+            'worker_rss_mb': round(statistics.fmean(w['rss'] for w in workers) / 1024, 1),
+            'worker_pss_mb': round(statistics.fmean(w['pss'] for w in workers) / 1024, 1),
+            'total_pss_mb': round((master['pss'] + sum(w['pss'] for w in workers)) / 1024, 1),
+        }
+
+    def measure_gunicorn(self, options, preload):
+        workers = options['workers']
+        with self.gunicorn(options, preload) as (server, url, started):
+            # Any response will do; it warms only the one worker that serves it
+            deadline = started + 60
+            while True:
+                if server.poll() is not None:
+                    raise CommandError('gunicorn exited during start-up')
+                try:
+                    if VirtualClient(url, timeout=5).request('GET', '/api/auth/login/')[0]:
+                        break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise CommandError('gunicorn did not start within 60 s')
+                    time.sleep(0.05)
+            result = {'ready_ms': round((time.monotonic() - started) * 1000)}
+            # Sync workers each take one of the concurrent requests; the first round is every
+            # worker's first request
+            history = [('GET', '/api/history/', None, None)] * workers
+            result['first_request_max_ms'] = round(self.concurrent_round(url, history))
+            result['warm_request_max_ms'] = round(self.concurrent_round(url, history))
+            result['idle'] = self.memory(server)
+
+            upload = ('POST', '/api/upload/', *multipart('file', 'startup.csv', synthetic_csv_bytes(1000)))
+            result['first_upload_max_ms'] = round(self.concurrent_round(url, [upload] * workers))
+            for _ in range(options['uploads'] - 1):
+                self.concurrent_round(url, [upload] * workers)
+            result['after_uploads'] = self.memory(server)
+        return result
+
+    def report_gunicorn(self, results):
+        self.stdout.write(f"\n{'gunicorn':<11}{'ready ms':>9}{'1st req':>9}{'warm req':>9}{'1st upl':>9}"
+                          f"{'idle RSS':>10}{'idle PSS':>10}{'RSS':>8}{'PSS':>8}{'total PSS':>11}")
+        for mode, r in results.items():
+            self.stdout.write(
+                f"{mode:<11}{r['ready_ms']:>9}{r['first_request_max_ms']:>9}{r['warm_request_max_ms']:>9}"
+                f"{r['first_upload_max_ms']:>9}{r['idle']['worker_rss_mb']:>10}{r['idle']['worker_pss_mb']:>10}"
+                f"{r['after_uploads']['worker_rss_mb']:>8}{r['after_uploads']['worker_pss_mb']:>8}"
+                f"{r['after_uploads']['total_pss_mb']:>11}"
+            )
+        self.stdout.write('Per-worker means in MB; RSS/PSS after uploads; total PSS includes the master.')
@@ -0,0 +1,25 @@
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from api.synthetic import generate_equipment_csv
+
+
+class Command(BaseCommand):
+    help = 'Write a reproducible synthetic equipment CSV (gzip-compressed when the path ends in .gz).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--types', type=int, default=5, help='Number of distinct equipment types')
+        parser.add_argument('--nan-ratio', type=float, default=0.0, help='Share of empty numeric cells')
+        parser.add_argument('--extra-columns', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', newline='') as out:
+            generate_equipment_csv(out, options['rows'], types=options['types'], nan_ratio=options['nan_ratio'],
+                                   extra_columns=options['extra_columns'], seed=options['seed'])
+        self.stdout.write(f"Wrote {options['rows']} rows to {path}")
@@ -0,0 +1,277 @@
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.synthetic import synthetic_csv_bytes
+
+DEFAULT_MIX = 'summary=40,history=20,equipment=20,export=10,upload=5,report=5'
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ACTIONS:
+            raise CommandError(f'Unknown action {name!r}; choose from {", ".join(ACTIONS)}')
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: text/csv\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class VirtualClient:
+    """One simulated user: its own keep-alive connection, token and dataset."""
+    
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.timeout = timeout
+        self.conn = None
+        self.token = None
+        self.upload_id = None
+    
+    def request(self, method, path, body=None, content_type=None):
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if content_type:
+            headers['Content-Type'] = content_type
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection (sync gunicorn workers always do)
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+    
+    def json(self, method, path, data):
+        return self.request(method, path, json.dumps(data).encode(), 'application/json')
+
+
+def do_summary(client, csv_bytes):
+    return client.request('GET', '/api/summary/')
+
+
+def do_history(client, csv_bytes):
+    return client.request('GET', '/api/history/')
+
+
+def do_equipment(client, csv_bytes):
+    return client.request('GET', f'/api/equipment/?page_size=100&page={random.randint(1, 5)}&ordering=-flowrate')
+
+
+def do_export(client, csv_bytes):
+    return client.request('GET', '/api/export-csv/')
+
+
+def do_upload(client, csv_bytes):
+    status, body = client.request('POST', '/api/upload/', *multipart('file', 'load.csv', csv_bytes))
+    if status == 201:
+        client.upload_id = json.loads(body)['upload_id']
+    return status, body
+
+
+def do_report(client, csv_bytes):
+    return client.json('POST', '/api/generate-report/', {'upload_id': client.upload_id})
+
+
+ACTIONS = {
+    'summary': do_summary,
+    'history': do_history,
+    'equipment': do_equipment,
+    'export': do_export,
+    'upload': do_upload,
+    'report': do_report,
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a weighted mix of uploads, summary polling, history refreshes, equipment pages, '
+        'exports and reports from concurrent clients against a running server (or one started on a '
+        'scratch database) and report throughput, latency percentiles and error rates per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Server to test, e.g. http://127.0.0.1:8000 (default: start one)')
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Action weights, e.g. summary=50,upload=5')
+        parser.add_argument('--think', type=float, default=0.1, help='Mean pause between requests (seconds)')
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per uploaded CSV')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout')
+        parser.add_argument('--app', default='config.wsgi:application', help='Started server: gunicorn app')
+        parser.add_argument('--workers', type=int, default=2, help='Started server: gunicorn workers')
+        parser.add_argument('--threads', type=int, default=1, help='Started server: threads per worker')
+        parser.add_argument('--worker-class', default=None, help='Started server: gunicorn -k, e.g. gthread')
+        parser.add_argument('--output', help='Also write the results as JSON')
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options['mix'])
+        csv_bytes = synthetic_csv_bytes(options['rows'])
+        if options['url']:
+            results = self.run_load(options['url'], weights, csv_bytes, options)
+        else:
+            with self.scratch_server(options) as url:
+                results = self.run_load(url, weights, csv_bytes, options)
+
+        self.stdout.write(f"{'endpoint':<11}{'requests':>9}{'req/s':>8}{'errors':>8}{'locked':>8}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, r in results['endpoints'].items():
+            self.stdout.write(
+                f"{name:<11}{r['requests']:>9}{r['throughput_rps']:>8.1f}{r['errors']:>8}{r['locked']:>8}"
+                f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}{r['max_ms']:>9.0f}"
+            )
+        for error in results['setup_errors']:
+            self.stderr.write(f'Setup failed for {error}')
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    @contextmanager
+    def scratch_server(self, options):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_ENGINE='sqlite', SQLITE_PATH=os.path.join(tmp, 'load.sqlite3'),
+                       SQLITE_REPLICA_PATH='', MEDIA_ROOT=os.path.join(tmp, 'media'))
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+                           cwd=settings.BASE_DIR, env=env, check=True)
+            port = free_port()
+            cmd = [sys.executable, '-m', 'gunicorn', options['app'], '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(options['workers']), '--threads', str(options['threads']),
+                   '--timeout', str(int(options['timeout']) + 30), '--log-level', 'warning']
+            if options['worker_class']:
+                cmd += ['--worker-class', options['worker_class']]
+            server = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env)
+            try:
+                url = f'http://127.0.0.1:{port}'
+                self.wait_until_ready(url, server)
+                self.stdout.write(f"Started {options['app']} on {url} ({' '.join(cmd[3:])})")
+                yield url
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def wait_until_ready(self, url, server):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Server exited during start-up')
+            try:
+                VirtualClient(url, timeout=2).request('GET', '/api/history/')
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('Server did not start within 30 seconds')
+
+    def run_load(self, url, weights, csv_bytes, options):
+        run_id = uuid.uuid4().hex[:8]
+        stats = {name: {'latencies': [], 'errors': 0, 'locked': 0, 'statuses': {}} for name in weights}
+        setup_errors = []
+        lock = threading.Lock()
+        clock = {}
+        # The clock starts once every client has signed up and uploaded its dataset
+        ready = threading.Barrier(options['clients'] + 1, action=lambda: clock.setdefault('started', time.monotonic()))
+        names, cumulative = list(weights), list(weights.values())
+
+        def record(name, elapsed, status, body):
+            with lock:
+                s = stats[name]
+                s['latencies'].append(elapsed)
+                s['statuses'][str(status)] = s['statuses'].get(str(status), 0) + 1
+                if not status or status >= 400:
+                    s['errors'] += 1
+                if b'locked' in body:
+                    s['locked'] += 1
+
+        def client_loop(index):
+            client = VirtualClient(url, options['timeout'])
+            try:
+                # Every simulated user has an account and a dataset of its own
+                status, body = client.json('POST', '/api/auth/register/',
+                                           {'username': f'load-{run_id}-{index}', 'password': 'load-test-pw'})
+                client.token = json.loads(body)['token']
+                status, body = do_upload(client, csv_bytes)
+                if status != 201:
+                    setup_errors.append(f'client {index} seed upload: {status} {body[:200]!r}')
+            except (OSError, ValueError, KeyError) as e:
+                setup_errors.append(f'client {index} setup: {e!r}')
+            finally:
+                ready.wait()
+            rng = random.Random(index)
+            deadline = clock['started'] + options['duration']
+            while time.monotonic() < deadline:
+                name = rng.choices(names, cumulative)[0]
+                started = time.monotonic()
+                try:
+                    status, body = ACTIONS[name](client, csv_bytes)
+                except OSError as e:
+                    status, body = 0, str(e).encode()
+                    client.conn = None
+                record(name, time.monotonic() - started, status, body)
+                if options['think']:
+                    time.sleep(rng.expovariate(1 / options['think']))
+
+        threads = [threading.Thread(target=client_loop, args=(i,), daemon=True) for i in range(options['clients'])]
+        for t in threads:
+            t.start()
+        ready.wait()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - clock['started']
+
+        endpoints = {}
+        for name, s in stats.items():
+            ordered = sorted(s['latencies'])
+            if not ordered:
+                continue
+            endpoints[name] = {
+                'requests': len(ordered),
+                'throughput_rps': round(len(ordered) / elapsed, 2),
+                'errors': s['errors'],
+                'error_rate': round(s['errors'] / len(ordered), 4),
+                'locked': s['locked'],
+                'statuses': s['statuses'],
+                'p50_ms': round(statistics.median(ordered) * 1000, 1),
+                'p95_ms': round(percentile(ordered, 0.95), 1),
+                'p99_ms': round(percentile(ordered, 0.99), 1),
+                'max_ms': round(ordered[-1] * 1000, 1),
+            }
+        return {'url': url, 'clients': options['clients'], 'duration': round(elapsed, 2),
+                'mix': weights, 'setup_errors': setup_errors, 'endpoints': endpoints}
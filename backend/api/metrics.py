@@ -0,0 +1,244 @@
+"""
+Per-endpoint request metrics, kept in process memory.
+
+RequestMetricsMiddleware records wall time, DB query count and time, JSON rendering
+time, response size and peak memory growth for every request. It adds a Server-Timing
+header and keeps a rolling window of samples per endpoint, which metrics_view serves
+in the Prometheus text format. Each worker process keeps its own numbers.
+"""
+import contextvars
+import hmac
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import token_cache
+
+try:
+    import resource
+except ImportError:
+    # Unix only; elsewhere memory growth is measured only with METRICS_TRACE_MEMORY
+    resource = None
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Metric name -> HELP text
+METRICS = {
+    'http_request_duration_seconds': 'Wall time spent handling the request',
+    'http_request_db_queries': 'Database queries per request',
+    'http_request_db_duration_seconds': 'Time spent in database queries',
+    'http_request_serialize_duration_seconds': 'Time spent rendering the response body',
+    'http_response_size_bytes': 'Response body size',
+    'http_request_memory_peak_bytes': 'Peak memory growth while handling the request',
+}
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestRecord:
+    __slots__ = ('db_queries', 'db_time', 'serialize_time')
+    
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+
+class RollingSummary:
+    """Count and sum since start-up, plus quantiles over the most recent samples."""
+    
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+    
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (metric, endpoint, method) -> RollingSummary
+    
+    def observe(self, endpoint, method, values):
+        with self._lock:
+            for metric, value in values.items():
+                key = (metric, endpoint, method)
+                if key not in self._series:
+                    self._series[key] = RollingSummary(settings.METRICS_WINDOW)
+                self._series[key].observe(value)
+    
+    def snapshot(self):
+        with self._lock:
+            return {key: (summary.count, summary.total, summary.quantiles())
+                    for key, summary in self._series.items()}
+    
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+    
+    def render_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for metric, help_text in METRICS.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} summary')
+            for (name, endpoint, method), (count, total, quantiles) in sorted(snapshot.items()):
+                if name != metric:
+                    continue
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                for q, value in quantiles.items():
+                    lines.append(f'{metric}{{{labels},quantile="{q}"}} {value:.6g}')
+                lines.append(f'{metric}_sum{{{labels}}} {total:.6g}')
+                lines.append(f'{metric}_count{{{labels}}} {count}')
+        
+        stats = token_cache.stats()
+        lines += [
+            '# HELP api_token_cache_lookups_total Token authentication cache lookups',
+            '# TYPE api_token_cache_lookups_total counter',
+            f'api_token_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+            f'api_token_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper: charge the query to the current request, if any."""
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.db_queries += 1
+        record.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            record = _current.get()
+            if record is not None:
+                record.serialize_time += time.perf_counter() - start
+
+
+def _peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource else 0
+
+
+def _memory_mark():
+    if tracemalloc.is_tracing():
+        # The peak is process-wide, so concurrent requests share it
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+    return _peak_rss()
+
+
+def _memory_growth(mark):
+    if tracemalloc.is_tracing():
+        return max(tracemalloc.get_traced_memory()[1] - mark, 0)
+    # Without tracemalloc only growth of the process's peak RSS is visible
+    return max(_peak_rss() - mark, 0)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if settings.METRICS_TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, record, started)
+    
+    async def __acall__(self, request):
+        record, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, record, started)
+    
+    def _start(self):
+        record = RequestRecord()
+        return record, _current.set(record), (time.perf_counter(), _memory_mark())
+    
+    def _finish(self, request, response, record, started):
+        # Streaming bodies are produced after this point, so their queries and bytes are
+        # only partly counted (Content-Length is used when the response sets it)
+        duration = time.perf_counter() - started[0]
+        values = {
+            'http_request_duration_seconds': duration,
+            'http_request_db_queries': record.db_queries,
+            'http_request_db_duration_seconds': record.db_time,
+            'http_request_serialize_duration_seconds': record.serialize_time,
+            'http_request_memory_peak_bytes': _memory_growth(started[1]),
+        }
+        if not response.streaming:
+            values['http_response_size_bytes'] = len(response.content)
+        elif response.has_header('Content-Length'):
+            values['http_response_size_bytes'] = int(response['Content-Length'])
+        
+        match = request.resolver_match
+        registry.observe(match.view_name if match else 'unmatched', request.method, values)
+        
+        response['Server-Timing'] = ', '.join(filter(None, [
+            response.get('Server-Timing'),
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={record.db_time * 1000:.1f};desc="{record.db_queries} queries"',
+            f'serialize;dur={record.serialize_time * 1000:.1f}',
+        ]))
+        # Lets the browser expose Server-Timing to the frontend's origin
+        response['Timing-Allow-Origin'] = settings.METRICS_TIMING_ALLOW_ORIGIN
+        return response
+
+
+def metrics_view(request):
+    """
+    Serve the metrics to ``Authorization: Bearer <METRICS_TOKEN>`` (for a scraper) or a
+    logged-in staff user. Without METRICS_TOKEN set, only staff can read them.
+    """
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    scraper = (settings.METRICS_TOKEN and scheme.lower() == 'bearer'
+               and hmac.compare_digest(credentials.encode(), settings.METRICS_TOKEN.encode()))
+    if not scraper and not request.user.is_staff:
+        response = HttpResponse('Authentication required\n', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:36
+
+from django.db import migrations, models
+
+SQLITE_FTS_TABLE = 'api_equipment_name_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5(
+        equipment_name, content='api_equipment', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER api_equipment_fts_ai AFTER INSERT ON api_equipment BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, equipment_name) VALUES (new.id, new.equipment_name);
+    END""",
+    f"""CREATE TRIGGER api_equipment_fts_ad AFTER DELETE ON api_equipment BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, equipment_name)
+        VALUES ('delete', old.id, old.equipment_name);
+    END""",
+    f"""CREATE TRIGGER api_equipment_fts_au AFTER UPDATE OF equipment_name ON api_equipment BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, equipment_name)
+        VALUES ('delete', old.id, old.equipment_name);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, equipment_name) VALUES (new.id, new.equipment_name);
+    END""",
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def create_name_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            try:
+                for sql in SQLITE_FTS_SQL:
+                    cursor.execute(sql)
+            except Exception:
+                # SQLite built without FTS5/trigram (< 3.34): name search falls back to LIKE
+                for name in ('api_equipment_fts_ai', 'api_equipment_fts_ad', 'api_equipment_fts_au'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS equipment_name_trgm_idx '
+            'ON api_equipment USING gin (equipment_name gin_trgm_ops)'
+        )
+
+
+def drop_name_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for name in ('api_equipment_fts_ai', 'api_equipment_fts_ad', 'api_equipment_fts_au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS equipment_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['upload_history', 'equipment_type'], name='equipment_upload_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['upload_history', 'equipment_name'], name='equipment_upload_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['upload_history', 'flowrate'], name='equipment_upload_flow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['upload_history', 'pressure'], name='equipment_upload_press_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['upload_history', 'temperature'], name='equipment_upload_temp_idx'),
+        ),
+        migrations.RunPython(create_name_search_index, drop_name_search_index),
+    ]
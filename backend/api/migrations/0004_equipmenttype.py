@@ -0,0 +1,103 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+SQLITE_FTS_TABLE = 'api_equipment_name_fts'
+
+# SQLite rebuilds api_equipment to change a column type, which drops the triggers
+# that keep the name search index from 0002 in sync; they are recreated at the end.
+SQLITE_FTS_TRIGGERS = [
+    f"""CREATE TRIGGER api_equipment_fts_ai AFTER INSERT ON api_equipment BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, equipment_name) VALUES (new.id, new.equipment_name);
+    END""",
+    f"""CREATE TRIGGER api_equipment_fts_ad AFTER DELETE ON api_equipment BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, equipment_name)
+        VALUES ('delete', old.id, old.equipment_name);
+    END""",
+    f"""CREATE TRIGGER api_equipment_fts_au AFTER UPDATE OF equipment_name ON api_equipment BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, equipment_name)
+        VALUES ('delete', old.id, old.equipment_name);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, equipment_name) VALUES (new.id, new.equipment_name);
+    END""",
+]
+
+
+def types_to_table(apps, schema_editor):
+    Equipment = apps.get_model('api', 'Equipment')
+    EquipmentType = apps.get_model('api', 'EquipmentType')
+    db = schema_editor.connection.alias
+    names = Equipment.objects.using(db).values_list('equipment_type', flat=True).distinct()
+    for name in list(names):
+        equipment_type = EquipmentType.objects.using(db).create(name=name)
+        Equipment.objects.using(db).filter(equipment_type=name).update(equipment_type_ref=equipment_type)
+
+
+def types_to_column(apps, schema_editor):
+    Equipment = apps.get_model('api', 'Equipment')
+    EquipmentType = apps.get_model('api', 'EquipmentType')
+    db = schema_editor.connection.alias
+    for equipment_type in EquipmentType.objects.using(db).all():
+        Equipment.objects.using(db).filter(equipment_type_ref=equipment_type).update(
+            equipment_type=equipment_type.name
+        )
+
+
+def recreate_name_search_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_FTS_TABLE])
+        if cursor.fetchone() is None:
+            return
+        for name in ('api_equipment_fts_ai', 'api_equipment_fts_ad', 'api_equipment_fts_au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        for sql in SQLITE_FTS_TRIGGERS:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='equipment_type_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='api.equipmenttype'),
+        ),
+        migrations.RunPython(types_to_table, types_to_column),
+        migrations.RemoveIndex(
+            model_name='equipment',
+            name='equipment_upload_type_idx',
+        ),
+        migrations.RemoveField(
+            model_name='equipment',
+            name='equipment_type',
+        ),
+        migrations.RenameField(
+            model_name='equipment',
+            old_name='equipment_type_ref',
+            new_name='equipment_type',
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='equipment_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='equipment',
+                                    to='api.equipmenttype'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['upload_history', 'equipment_type'], name='equipment_upload_type_idx'),
+        ),
+        migrations.RunPython(recreate_name_search_triggers, recreate_name_search_triggers),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.11 on 2026-10-19 11:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0005_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeriesEquipment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('equipment_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='series_equipment', to='api.equipmenttype')),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='equipment', to='api.timeseries')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Rollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('count', models.IntegerField()),
+                ('flowrate_sum', models.FloatField()),
+                ('flowrate_min', models.FloatField()),
+                ('flowrate_max', models.FloatField()),
+                ('pressure_sum', models.FloatField()),
+                ('pressure_min', models.FloatField()),
+                ('pressure_max', models.FloatField()),
+                ('temperature_sum', models.FloatField()),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='api.seriesequipment')),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='api.timeseries')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.BigIntegerField()),
+                ('flowrate', models.FloatField()),
+                ('pressure', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='api.seriesequipment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timeseries',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='timeseries_user_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='seriesequipment',
+            constraint=models.UniqueConstraint(fields=('series', 'name'), name='series_equipment_name_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='rollup',
+            index=models.Index(fields=['series', 'resolution', 'bucket'], name='rollup_series_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rollup',
+            constraint=models.UniqueConstraint(fields=('equipment', 'resolution', 'bucket'), name='rollup_equipment_bucket_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='reading',
+            constraint=models.UniqueConstraint(fields=('equipment', 'timestamp'), name='reading_equipment_ts_uniq'),
+        ),
+    ]
@@ -1,3 +1,7 @@
+import uuid
+from pathlib import Path
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -15,14 +19,154 @@ class UploadHistory(models.Model):
         
     def __str__(self):
         return f"{self.filename} - {self.uploaded_at}"
+    
+    def type_distribution(self):
+        # GROUP BY the small-int type id (served by the type index), then resolve the few names
+        counts = dict(
+            self.equipment.values_list('equipment_type').annotate(count=models.Count('id')).order_by()
+        )
+        names = dict(EquipmentType.objects.filter(id__in=counts).values_list('id', 'name'))
+        return {names[type_id]: count for type_id, count in counts.items()}
+    
+    async def atype_distribution(self):
+        counts = {
+            type_id: count async for type_id, count in
+            self.equipment.values_list('equipment_type').annotate(count=models.Count('id')).order_by()
+        }
+        names = {
+            type_id: name async for type_id, name in
+            EquipmentType.objects.filter(id__in=counts).values_list('id', 'name')
+        }
+        return {names[type_id]: count for type_id, count in counts.items()}
+
+class EquipmentType(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    
+    def __str__(self):
+        return self.name
 
 class Equipment(models.Model):
     upload_history = models.ForeignKey(UploadHistory, on_delete=models.CASCADE, related_name='equipment')
     equipment_name = models.CharField(max_length=255)
-    equipment_type = models.CharField(max_length=100)
+    equipment_type = models.ForeignKey(EquipmentType, on_delete=models.PROTECT, related_name='equipment')
     flowrate = models.FloatField()
     pressure = models.FloatField()
     temperature = models.FloatField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['upload_history', 'equipment_type'], name='equipment_upload_type_idx'),
+            models.Index(fields=['upload_history', 'equipment_name'], name='equipment_upload_name_idx'),
+            models.Index(fields=['upload_history', 'flowrate'], name='equipment_upload_flow_idx'),
+            models.Index(fields=['upload_history', 'pressure'], name='equipment_upload_press_idx'),
+            models.Index(fields=['upload_history', 'temperature'], name='equipment_upload_temp_idx'),
+        ]
+    
     def __str__(self):
         return self.equipment_name
+
+class ChunkedUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    total_chunks = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.id})"
+    
+    @property
+    def directory(self):
+        return Path(settings.MEDIA_ROOT) / 'chunked_uploads' / str(self.id)
+    
+    def part_path(self, index):
+        return self.directory / f'{index:06d}.part'
+    
+    def received_chunks(self):
+        if not self.directory.is_dir():
+            return []
+        return sorted(int(p.stem) for p in self.directory.glob('*.part'))
+
+class TimeSeries(models.Model):
+    """An append-only dataset: each upload adds timestamped readings to the same equipment."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    name = models.SlugField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'name'], name='timeseries_user_name_uniq')]
+    
+    def __str__(self):
+        return self.name
+
+class SeriesEquipment(models.Model):
+    series = models.ForeignKey(TimeSeries, on_delete=models.CASCADE, related_name='equipment')
+    name = models.CharField(max_length=255)
+    equipment_type = models.ForeignKey(EquipmentType, on_delete=models.PROTECT, related_name='series_equipment')
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['series', 'name'], name='series_equipment_name_uniq')]
+    
+    def __str__(self):
+        return self.name
+
+class Reading(models.Model):
+    # Unix seconds rather than a DateTimeField: 8 bytes instead of SQLite's ISO text
+    equipment = models.ForeignKey(SeriesEquipment, on_delete=models.CASCADE, related_name='readings')
+    timestamp = models.BigIntegerField()
+    flowrate = models.FloatField()
+    pressure = models.FloatField()
+    temperature = models.FloatField()
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['equipment', 'timestamp'], name='reading_equipment_ts_uniq')]
+
+class Rollup(models.Model):
+    """
+    Count, sum, min and max of one equipment's readings per time bucket, at each of
+    TIMESERIES_RESOLUTIONS; maintained incrementally as readings are appended.
+    """
+    series = models.ForeignKey(TimeSeries, on_delete=models.CASCADE, related_name='rollups')
+    equipment = models.ForeignKey(SeriesEquipment, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.PositiveIntegerField()  # bucket width in seconds
+    bucket = models.BigIntegerField()  # bucket start, Unix seconds
+    count = models.IntegerField()
+    flowrate_sum = models.FloatField()
+    flowrate_min = models.FloatField()
+    flowrate_max = models.FloatField()
+    pressure_sum = models.FloatField()
+    pressure_min = models.FloatField()
+    pressure_max = models.FloatField()
+    temperature_sum = models.FloatField()
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['equipment', 'resolution', 'bucket'], name='rollup_equipment_bucket_uniq'),
+        ]
+        indexes = [
+            # Series-wide trends read one resolution over a bucket range
+            models.Index(fields=['series', 'resolution', 'bucket'], name='rollup_series_bucket_idx'),
+        ]
+
+class Event(models.Model):
+    """A change pushed to the owner's event streams; kept for EVENT_RETENTION_SECONDS so clients can resume."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=50)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.kind} ({self.id})"
+
+class EventTicket(models.Model):
+    """Single-use key that opens one event stream, so the auth token never appears in a URL."""
+    key = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"Event ticket for {self.user_id}"
@@ -0,0 +1,112 @@
+"""
+Opt-in profiling for the ingest and report pipelines.
+
+Views decorated with @profiled_view collect named stage spans (parse, dropna, insert,
+render, ...). Clients get the breakdown as Server-Timing entries by sending
+``X-Profile: 1`` or ``?profile=1``. With PROFILE_SAMPLE_RATE > 0, a sample of those
+requests also runs under cProfile, and the PROFILE_KEEP_SLOWEST slowest profiles are
+kept in PROFILE_DIR as .prof files (``python -m pstats``, snakeviz, ...).
+"""
+import cProfile
+import contextvars
+import heapq
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+
+_spans = contextvars.ContextVar('profile_spans', default=None)
+
+
+@contextmanager
+def collect_stages():
+    spans = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as the named stage of the current request (a no-op outside one)."""
+    spans = _spans.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if spans is not None:
+            spans.append((name, time.perf_counter() - start))
+
+
+def add_stages(spans):
+    """Add spans measured elsewhere (e.g. in a report pool worker) to the current request."""
+    current = _spans.get()
+    if current is not None:
+        current.extend(spans)
+
+
+def stages_requested(request):
+    flag = request.headers.get('X-Profile') or request.GET.get('profile')
+    return flag not in (None, '', '0', 'false')
+
+
+class SlowestProfiles:
+    """Keeps the .prof dumps of this process's slowest profiled requests on disk."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []  # (elapsed, path), fastest first
+    
+    def offer(self, name, elapsed, profiler):
+        keep = settings.PROFILE_KEEP_SLOWEST
+        with self._lock:
+            if len(self._heap) >= keep and (not keep or elapsed <= self._heap[0][0]):
+                return
+            directory = Path(settings.PROFILE_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f'{name}-{elapsed * 1000:.0f}ms-{uuid.uuid4().hex[:8]}.prof'
+            profiler.dump_stats(path)
+            heapq.heappush(self._heap, (elapsed, str(path)))
+            if len(self._heap) > keep:
+                _, evicted = heapq.heappop(self._heap)
+                Path(evicted).unlink(missing_ok=True)
+
+
+slowest_profiles = SlowestProfiles()
+
+# cProfile cannot profile two threads at once, so concurrent requests skip sampling
+_profiler_lock = threading.Lock()
+
+
+def profiled_view(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        sample = random.random() < settings.PROFILE_SAMPLE_RATE and _profiler_lock.acquire(blocking=False)
+        profiler = cProfile.Profile() if sample else None
+        start = time.perf_counter()
+        with collect_stages() as spans:
+            try:
+                if profiler:
+                    profiler.enable()
+                response = view(request, *args, **kwargs)
+            finally:
+                if profiler:
+                    profiler.disable()
+                    _profiler_lock.release()
+        
+        if profiler:
+            slowest_profiles.offer(view.__name__, time.perf_counter() - start, profiler)
+        if stages_requested(request) and spans:
+            # The metrics middleware appends its own total/db/serialize entries
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={seconds * 1000:.1f}' for name, seconds in spans
+            )
+        return response
+    return wrapper
@@ -0,0 +1,283 @@
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+
+from .profiling import add_stages, collect_stages, stage
+
+# Report format -> (content type, download filename)
+REPORT_FORMATS = {
+    'pdf': ('application/pdf', 'equipment_report_{id}.pdf'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'equipment_data_{id}.xlsx'),
+}
+
+
+class ReportQueueFull(Exception):
+    pass
+
+
+def report_version(upload):
+    """Names the dataset version a report shows; a delta upload moves uploaded_at."""
+    return int(upload.uploaded_at.timestamp() * 1000000)
+
+
+def report_path(upload_id, fmt, version):
+    # The version in the name means a render that started before a merge can never be
+    # served afterwards: it lands under the old version, which is no longer requested
+    return Path(settings.REPORT_CACHE_DIR) / f'{upload_id}.{version}.{fmt}'
+
+
+def cached_report(upload_id, fmt, version):
+    path = report_path(upload_id, fmt, version)
+    return path if path.exists() else None
+
+
+def discard_reports(upload_id):
+    """Delete every cached report of an upload, of any version."""
+    for fmt in REPORT_FORMATS:
+        for path in Path(settings.REPORT_CACHE_DIR).glob(f'{upload_id}.*.{fmt}'):
+            path.unlink(missing_ok=True)
+
+
+def render_pdf(upload, using, out):
+    # ReportLab (like pandas/openpyxl below) is only needed in the pool workers that render
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    
+    with stage('query'):
+        equipment_list = list(upload.equipment.using(using).select_related('equipment_type').order_by('id')[:50])
+    
+    doc = SimpleDocTemplate(out, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1a1a1a'),
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    
+    title = Paragraph("Chemical Equipment Analysis Report", title_style)
+    elements.append(title)
+    elements.append(Spacer(1, 0.2*inch))
+    
+    info_data = [
+        ['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+        ['Dataset:', upload.filename],
+        ['Upload Date:', upload.uploaded_at.strftime('%Y-%m-%d %H:%M:%S')],
+        ['Total Equipment:', str(upload.total_count)],
+    ]
+    
+    info_table = Table(info_data, colWidths=[2.5*inch, 4*inch])
+    info_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    
+    elements.append(info_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    summary_title = Paragraph("Summary Statistics", styles['Heading2'])
+    elements.append(summary_title)
+    elements.append(Spacer(1, 0.1*inch))
+    
+    summary_data = [
+        ['Metric', 'Average Value'],
+        ['Flowrate', f"{upload.avg_flowrate:.2f}"],
+        ['Pressure', f"{upload.avg_pressure:.2f}"],
+        ['Temperature', f"{upload.avg_temperature:.2f}"],
+    ]
+    
+    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    equipment_title = Paragraph("Equipment Details", styles['Heading2'])
+    elements.append(equipment_title)
+    elements.append(Spacer(1, 0.1*inch))
+    
+    equipment_data = [['Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
+    
+    for eq in equipment_list:
+        equipment_data.append([
+            eq.equipment_name,
+            eq.equipment_type.name,
+            f"{eq.flowrate:.2f}",
+            f"{eq.pressure:.2f}",
+            f"{eq.temperature:.2f}"
+        ])
+    
+    equipment_table = Table(equipment_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1*inch, 1*inch])
+    equipment_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+    ]))
+    
+    elements.append(equipment_table)
+    
+    with stage('render'):
+        doc.build(elements)
+
+
+def render_xlsx(upload, using, out):
+    import pandas as pd
+    
+    # Imported here: ingest imports this module to discard reports of pruned uploads
+    from .exports import EXPORT_FIELDS
+    from .ingest import REQUIRED_COLUMNS
+    
+    with stage('query'):
+        rows = list(upload.equipment.using(using).order_by('id').values_list(*EXPORT_FIELDS))
+    with stage('render'):
+        df = pd.DataFrame.from_records(rows, columns=REQUIRED_COLUMNS)
+        df.to_excel(out, index=False, engine='openpyxl')
+
+
+RENDERERS = {
+    'pdf': render_pdf,
+    'xlsx': render_xlsx,
+}
+
+
+def render_report(upload_id, fmt, using, path):
+    """Render one report to ``path``. Runs in a pool worker; returns its stage spans."""
+    from .models import UploadHistory
+    
+    with collect_stages() as spans:
+        upload = UploadHistory.objects.using(using).get(id=upload_id)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp_path, 'wb') as out:
+                RENDERERS[fmt](upload, using, out)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return spans
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+class ReportPool:
+    """
+    Renders reports in a bounded ProcessPoolExecutor so ReportLab/openpyxl work never
+    holds the web worker's GIL. A rendered report is cached on disk under its upload id
+    and dataset version until the upload is pruned or a delta upload is merged into it.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}  # (upload_id, fmt, version) -> Future, until it finishes
+    
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn rather than fork: a forked child would share the parent's DB connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.REPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return self._executor
+    
+    def _submit(self, key, using, user_id):
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None:
+                return future
+            if len(self._jobs) >= settings.REPORT_QUEUE_LIMIT:
+                raise ReportQueueFull()
+            args = (render_report, *key[:2], using, str(report_path(*key)))
+            try:
+                future = self._get_executor().submit(*args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool
+                self._executor = None
+                future = self._get_executor().submit(*args)
+            self._jobs[key] = future
+        future.add_done_callback(lambda f: self._done(key, f, user_id))
+        return future
+    
+    def _done(self, key, future, user_id):
+        # Imported here: spawned workers import this module before django.setup()
+        from .events import publish
+        
+        upload_id, fmt, _ = key
+        error = future.exception()
+        # Finished jobs leave the queue either way; after a failure the next request retries
+        self._forget(key, future)
+        if error is None:
+            publish(user_id, 'report.ready', {'upload_id': upload_id, 'format': fmt,
+                                              'status_url': reverse('report_status', args=key[:2])})
+        else:
+            publish(user_id, 'report.failed', {'upload_id': upload_id, 'format': fmt, 'error': str(error)})
+    
+    def _forget(self, key, future):
+        with self._lock:
+            if self._jobs.get(key) is future:
+                del self._jobs[key]
+    
+    def request(self, upload_id, fmt, version, using, timeout, user_id=None):
+        """
+        Return the path of the rendered report of ``version`` (see report_version),
+        rendering it if needed. Returns None if
+        it is still rendering after ``timeout`` seconds; raises ReportQueueFull when
+        REPORT_QUEUE_LIMIT jobs are already queued or running, and re-raises the error of a
+        render that fails. A render that finishes (or fails) publishes report.ready
+        (report.failed) to ``user_id``'s event streams.
+        """
+        path = cached_report(upload_id, fmt, version)
+        if path:
+            return path
+        
+        key = (upload_id, fmt, version)
+        future = self._submit(key, using, user_id)
+        try:
+            with stage('render_wait'):
+                spans = future.result(timeout=timeout)
+            add_stages(spans)
+            return report_path(*key)
+        except TimeoutError:
+            return None
+
+
+report_pool = ReportPool()
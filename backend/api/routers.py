@@ -0,0 +1,65 @@
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_ALIAS = 'replica'
+
+_read_from_replica = contextvars.ContextVar('read_from_replica', default=False)
+
+
+def _pin_key(user):
+    return f'db-primary-pin:{user.pk if user else "guest"}'
+
+
+def pin_to_primary(user):
+    """
+    Route this user's reads to the primary for REPLICA_READ_AFTER_WRITE_SECONDS, so data
+    they just wrote is visible before the replica catches up. Multi-process deployments
+    need a shared CACHES backend for the pin to reach every worker.
+    """
+    if REPLICA_ALIAS in settings.DATABASES:
+        cache.set(_pin_key(user), True, settings.REPLICA_READ_AFTER_WRITE_SECONDS)
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    token = _read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def replica_allowed(user):
+    return REPLICA_ALIAS in settings.DATABASES and not cache.get(_pin_key(user))
+
+
+async def areplica_allowed(user):
+    return REPLICA_ALIAS in settings.DATABASES and not await cache.aget(_pin_key(user))
+
+
+def use_read_replica(view):
+    """Send the ORM reads of a read-only view to the replica, unless the user just wrote."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = request.user if request.user.is_authenticated else None
+        with read_from_replica(replica_allowed(user)):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
@@ -3,6 +3,8 @@ from .models import Equipment, UploadHistory
 from django.contrib.auth.models import User
 
 class EquipmentSerializer(serializers.ModelSerializer):
+    equipment_type = serializers.CharField(source='equipment_type.name')
+    
     class Meta:
         model = Equipment
         fields = ['id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
@@ -16,6 +18,9 @@ class UploadHistorySerializer(serializers.ModelSerializer):
                   'avg_pressure', 'avg_temperature', 'equipment_count']
     
     def get_equipment_count(self, obj):
+        # Views annotate num_equipment to avoid one COUNT query per history row
+        if hasattr(obj, 'num_equipment'):
+            return obj.num_equipment
         return obj.equipment.count()
 
 class UserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,38 @@
+import io
+import random
+
+from .ingest import REQUIRED_COLUMNS
+
+
+def generate_equipment_csv(out, rows, types=5, nan_ratio=0.0, extra_columns=0, seed=0):
+    """
+    Write a synthetic equipment CSV to the text stream ``out``.
+
+    ``types`` sets the type cardinality, ``nan_ratio`` the share of numeric cells left
+    empty (so those rows are dropped on upload) and ``extra_columns`` adds unused columns.
+    The same arguments always produce the same file.
+    """
+    rng = random.Random(seed)
+    type_names = [f'Type-{i:03d}' for i in range(types)]
+    header = REQUIRED_COLUMNS + [f'Extra {i + 1}' for i in range(extra_columns)]
+    out.write(','.join(header) + '\n')
+    
+    def value(mean, stddev):
+        return '' if nan_ratio and rng.random() < nan_ratio else f'{rng.gauss(mean, stddev):.2f}'
+    
+    for i in range(rows):
+        fields = [
+            f'Unit-{i:07d}',
+            rng.choice(type_names),
+            value(150, 40),
+            value(6, 1.5),
+            value(110, 30),
+        ]
+        fields += [f'x{rng.randrange(1000)}' for _ in range(extra_columns)]
+        out.write(','.join(fields) + '\n')
+
+
+def synthetic_csv_bytes(rows, **options):
+    out = io.StringIO()
+    generate_equipment_csv(out, rows, **options)
+    return out.getvalue().encode()
@@ -1,3 +1,478 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections
+from django.db.models import Avg
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .derived import DerivedError, parse_derived
+from .events import issue_ticket, redeem_ticket
+from .filters import NAME_SEARCH_TABLE, name_contains
+from .ingest import CSVFormatError, ingest_csv, merge_csv
+from .models import ChunkedUpload, Equipment, EventTicket, UploadHistory
+
+HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+
+BASE_CSV = HEADER + (
+    'Pump-1,Pump,120.5,5.2,110\n'
+    'Pump-2,Pump,130.0,5.8,115\n'
+    'Valve-1,Valve,60.0,4.1,105\n'
+    'Heat Exchanger-1,HeatExchanger,150.0,6.5,130\n'
+    'Pump-1,Pump,125.0,5.4,112\n'
+)
+
+
+def csv_upload(text, name='data.csv'):
+    return SimpleUploadedFile(name, text.encode(), content_type='text/csv')
+
+
+class MediaRootMixin:
+    """Keep chunk parts and rendered reports in a temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, REPORT_CACHE_DIR=f'{media_root}/reports')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class APITestCase(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Events are recorded from a background thread, which cannot see the test transaction
+        writer = mock.patch('api.events._writer')
+        writer.start()
+        self.addCleanup(writer.stop)
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def upload(self, text=BASE_CSV, name='data.csv', **data):
+        response = self.client.post('/api/upload/', {'file': csv_upload(text, name), **data}, format='multipart')
+        self.assertIn(response.status_code, (200, 201), response.data)
+        return response.data
+
+
+class NameSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_id = self.upload(HEADER + (
+            'Pump-101,Pump,1,1,1\n'
+            'pump-202,Pump,1,1,1\n'
+            'Valve "A",Valve,1,1,1\n'
+            'Compressor_7,Compressor,1,1,1\n'
+            'Valve 50%,Valve,1,1,1\n'
+        ))['upload_id']
+        self.equipment = Equipment.objects.filter(upload_history_id=self.upload_id)
+
+    def names(self, term):
+        return sorted(self.equipment.filter(name_contains(term)).values_list('equipment_name', flat=True))
+
+    def expected(self, term):
+        return sorted(self.equipment.filter(equipment_name__icontains=term).values_list('equipment_name', flat=True))
+
+    def has_search_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [NAME_SEARCH_TABLE])
+            return cursor.fetchone() is not None
+
+    def test_trigram_search_matches_icontains(self):
+        if not self.has_search_table():
+            self.skipTest('SQLite without FTS5 trigram support')
+        self.assertIn(NAME_SEARCH_TABLE, str(self.equipment.filter(name_contains('pump')).query))
+        for term in ['pump', 'PUMP', 'mp-1', '202', 'e "A', 'sor_', '50%', 'missing']:
+            with self.subTest(term=term):
+                self.assertEqual(self.names(term), self.expected(term))
+
+    def test_short_terms_use_icontains(self):
+        self.assertNotIn(NAME_SEARCH_TABLE, str(self.equipment.filter(name_contains('mp')).query))
+        self.assertEqual(self.names('mp'), ['Compressor_7', 'Pump-101', 'pump-202'])
+        # LIKE wildcards in the term are matched literally
+        self.assertEqual(self.names('%'), ['Valve 50%'])
+        self.assertEqual(self.names('_'), ['Compressor_7'])
+
+    def test_falls_back_to_icontains_without_search_table(self):
+        with mock.patch('api.filters._sqlite_search_table_exists', return_value=False) as exists:
+            query = str(self.equipment.filter(name_contains('pump')).query)
+            self.assertEqual(self.names('pump'), ['Pump-101', 'pump-202'])
+        self.assertNotIn(NAME_SEARCH_TABLE, query)
+        self.assertIs(exists.call_args.args[0], connections['default'])
+
+    def test_filter_checks_the_queried_database(self):
+        with mock.patch('api.filters._sqlite_search_table_exists', return_value=False) as exists:
+            response = self.client.get('/api/equipment/', {'upload_id': self.upload_id, 'name': 'pump'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(row['equipment_name'] for row in response.data), ['Pump-101', 'pump-202'])
+        self.assertEqual(exists.call_args.args[0].alias, 'default')
+
+    def test_search_index_follows_deleted_rows(self):
+        if not self.has_search_table():
+            self.skipTest('SQLite without FTS5 trigram support')
+        upload = UploadHistory.objects.get(pk=self.upload_id)
+        merge_csv(csv_upload(HEADER + 'Pump-101,Pump,1,1,1\nValve "A",Valve,1,1,1\n'), upload)
+        self.assertEqual(self.names('pump'), ['Pump-101'])
+
+    def test_search_param_also_matches_type(self):
+        response = self.client.get('/api/equipment/', {'upload_id': self.upload_id, 'search': 'compressor'})
+        self.assertEqual([row['equipment_name'] for row in response.data], ['Compressor_7'])
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_id = self.upload()['upload_id']
+
+    def test_revalidation(self):
+        for url in ['/api/summary/', '/api/equipment/', '/api/export-csv/']:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'upload_id': self.upload_id})
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                self.assertTrue(etag.startswith(f'W/"upload-{self.upload_id}-'))
+
+                response = self.client.get(url, {'upload_id': self.upload_id}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+                response = self.client.get(url, {'upload_id': self.upload_id}, HTTP_IF_NONE_MATCH='W/"other"')
+                self.assertEqual(response.status_code, 200)
+
+    def test_delta_upload_changes_etag(self):
+        etag = self.client.get('/api/summary/', {'upload_id': self.upload_id})['ETag']
+        self.upload(BASE_CSV.replace('60.0', '65.0'), base_upload_id=self.upload_id)
+
+        response = self.client.get('/api/summary/', {'upload_id': self.upload_id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_does_not_bypass_permissions(self):
+        other = APIClient()
+        etag = self.client.get('/api/summary/', {'upload_id': self.upload_id})['ETag']
+        response = other.get('/api/summary/', {'upload_id': self.upload_id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 403)
+
+
+class MergeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_record = UploadHistory.objects.get(pk=self.upload()['upload_id'])
+
+    def assertMatchesStoredRows(self, summary):
+        rows = Equipment.objects.filter(upload_history=self.upload_record)
+        averages = rows.aggregate(avg_flowrate=Avg('flowrate'), avg_pressure=Avg('pressure'),
+                                  avg_temperature=Avg('temperature'))
+        self.assertEqual(summary['total_count'], rows.count())
+        for field, value in averages.items():
+            self.assertAlmostEqual(summary[field], round(value, 2), places=2)
+        self.assertEqual(summary['type_distribution'],
+                         dict(Counter(rows.values_list('equipment_type__name', flat=True))))
+
+        self.upload_record.refresh_from_db()
+        self.assertEqual(self.upload_record.total_count, rows.count())
+        for field, value in averages.items():
+            self.assertAlmostEqual(getattr(self.upload_record, field), value, places=9)
+
+    def test_insert_update_delete(self):
+        result = merge_csv(csv_upload(HEADER + (
+            'Pump-1,Pump,120.5,5.2,110\n'          # unchanged
+            'Pump-2,Compressor,131.0,5.8,115\n'    # new type and flowrate
+            'Heat Exchanger-1,HeatExchanger,150.0,6.5,130\n'
+            'Pump-1,Pump,126.0,5.4,112\n'          # second Pump-1 changed
+            'Valve-9,Valve,70.0,4.4,100\n'         # added
+        ), 'delta.csv'), self.upload_record)    # Valve-1 deleted
+
+        self.assertEqual(result['changes'], {'inserted': 1, 'updated': 2, 'deleted': 1, 'unchanged': 2})
+        self.assertEqual(result['summary']['type_distribution'],
+                         {'Pump': 2, 'Compressor': 1, 'HeatExchanger': 1, 'Valve': 1})
+        self.assertMatchesStoredRows(result['summary'])
+        self.assertEqual(UploadHistory.objects.get(pk=self.upload_record.pk).filename, 'delta.csv')
+
+    def test_repeated_merges_do_not_drift(self):
+        for flowrate in ['61.25', '99.5', '0.125', '60.0']:
+            summary = merge_csv(csv_upload(BASE_CSV.replace('60.0', flowrate)), self.upload_record)['summary']
+            self.assertMatchesStoredRows(summary)
+
+    def test_identical_file_changes_nothing(self):
+        result = merge_csv(csv_upload(BASE_CSV), self.upload_record)
+        self.assertEqual(result['changes'], {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 5})
+        self.assertMatchesStoredRows(result['summary'])
+
+    def test_rejected_files_leave_dataset_unchanged(self):
+        for text in ['', HEADER, 'Name,Type\nx,y\n', HEADER + 'Pump-1,Pump,abc,1,1\n']:
+            with self.subTest(text=text):
+                with self.assertRaises(CSVFormatError):
+                    merge_csv(csv_upload(text), self.upload_record)
+                self.assertEqual(Equipment.objects.filter(upload_history=self.upload_record).count(), 5)
+
+    def test_delta_upload_needs_own_dataset(self):
+        other = User.objects.create_user(username='bob', password='secret')
+        other_upload = ingest_csv(csv_upload(BASE_CSV), other)['upload_id']
+        response = self.client.post('/api/upload/', {'file': csv_upload(BASE_CSV), 'base_upload_id': other_upload},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+
+class UploadTests(APITestCase):
+    def test_empty_and_malformed_files_are_rejected(self):
+        for text, error in [('', 'File is empty'), ('\n\n', 'File is empty'),
+                            ('Name,Type\nx,y\n', 'CSV must contain columns')]:
+            with self.subTest(text=text):
+                response = self.client.post('/api/upload/', {'file': csv_upload(text)}, format='multipart')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(error, response.data['error'])
+
+    def test_invalid_rows_are_dropped(self):
+        result = self.upload(BASE_CSV + 'Pump-9,Pump,n/a,1,1\nPump-10,Pump,,1,1\n')
+        self.assertEqual(result['dropped_rows'], 2)
+        self.assertEqual(result['summary']['total_count'], 5)
+
+
+class ChunkedUploadTests(APITestCase):
+    def start(self, data, chunk_size=64):
+        response = self.client.post('/api/upload/sessions/',
+                                    {'filename': 'big.csv', 'total_size': len(data), 'chunk_size': chunk_size})
+        self.assertEqual(response.status_code, 201)
+        session_id = response.data['upload_session_id']
+        for index in range(response.data['total_chunks']):
+            chunk = data[index * chunk_size:(index + 1) * chunk_size]
+            response = self.client.put(f'/api/upload/sessions/{session_id}/chunks/{index}/', chunk,
+                                       content_type='application/octet-stream',
+                                       HTTP_X_CHUNK_SHA256=hashlib.sha256(chunk).hexdigest())
+            self.assertEqual(response.status_code, 200, response.data)
+        return ChunkedUpload.objects.get(id=session_id)
+
+    def finalize(self, session):
+        return self.client.post(f'/api/upload/sessions/{session.id}/finalize/')
+
+    def test_finalize(self):
+        session = self.start(BASE_CSV.encode())
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['summary']['total_count'], 5)
+        self.assertFalse(ChunkedUpload.objects.filter(id=session.id).exists())
+        self.assertFalse(session.directory.parent.exists() and any(session.directory.parent.iterdir()))
+
+    def test_missing_chunk(self):
+        session = self.start(BASE_CSV.encode())
+        session.part_path(1).unlink()
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Missing chunks: [1]', response.data['error'])
+        self.assertTrue(ChunkedUpload.objects.filter(id=session.id).exists())
+
+    def test_bad_checksum(self):
+        session = self.start(BASE_CSV.encode())
+        response = self.client.put(f'/api/upload/sessions/{session.id}/chunks/0/', b'x' * 64,
+                                   content_type='application/octet-stream', HTTP_X_CHUNK_SHA256='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(session.part_path(0).read_bytes(), BASE_CSV.encode()[:64])
+
+    def test_format_error_discards_session(self):
+        session = self.start(b'Name,Type\n' + b'x,y\n' * 40)
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChunkedUpload.objects.filter(id=session.id).exists())
+        self.assertFalse(session.directory.exists())
+
+    def test_transient_failure_keeps_parts(self):
+        session = self.start(BASE_CSV.encode())
+        with mock.patch('api.views.ingest_csv', side_effect=OperationalError('database is locked')):
+            response = self.finalize(session)
+        self.assertEqual(response.status_code, 500)
+        self.assertTrue(ChunkedUpload.objects.filter(id=session.id).exists())
+        self.assertEqual(session.received_chunks(), list(range(session.total_chunks)))
+        self.assertFalse(session.directory.with_name(f'{session.id}.assembling').exists())
+
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['summary']['total_count'], 5)
+
+    def test_other_users_session(self):
+        session = self.start(BASE_CSV.encode())
+        response = APIClient().post(f'/api/upload/sessions/{session.id}/finalize/')
+        self.assertEqual(response.status_code, 403)
+
+
+class DerivedTests(APITestCase):
+    def test_rejects_anything_outside_the_whitelist(self):
+        rejected = [
+            "__import__('os').system('true')",
+            'flowrate.__class__',
+            'open',
+            '[flowrate]',
+            'f:lambda: 1',
+            "'text'",
+            'flowrate if pressure else 1',
+            'flowrate[0]',
+            'sum(flowrate)',
+            'sqrt(flowrate, 2)',
+            'max(flowrate, pressure, 1)',
+            'abs(x=flowrate)',
+            'flowrate @ pressure',
+            'flowrate // 2',
+            'flowrate +',
+            'x' * 300,
+        ]
+        for expression in rejected:
+            with self.subTest(expression=expression):
+                with self.assertRaises(DerivedError):
+                    parse_derived([expression])
+
+    def test_names_and_limits(self):
+        with self.assertRaises(DerivedError):
+            parse_derived(['not a name:flowrate'])
+        with self.assertRaises(DerivedError):
+            parse_derived(['flowrate'] * 9)
+        derived = parse_derived(['ratio:Flowrate / PRESSURE', 'sqrt( flowrate )'])
+        self.assertEqual(list(derived), ['ratio', 'sqrt(flowrate)'])
+
+    def test_rejections_are_bad_requests(self):
+        upload_id = self.upload()['upload_id']
+        for url in ['/api/summary/', '/api/equipment/', '/api/derived/', '/api/export-csv/']:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'upload_id': upload_id, 'derived': "__import__('os')"})
+                self.assertEqual(response.status_code, 400)
+
+    def test_values(self):
+        upload_id = self.upload()['upload_id']
+        response = self.client.get('/api/derived/', {'upload_id': upload_id,
+                                                     'derived': ['ratio:flowrate / pressure', 'type_mean(flowrate)']})
+        self.assertEqual(response.status_code, 200)
+        flowrates = [120.5, 130.0, 60.0, 150.0, 125.0]
+        pressures = [5.2, 5.8, 4.1, 6.5, 5.4]
+        ratios = [f / p for f, p in zip(flowrates, pressures)]
+        self.assertAlmostEqual(response.data['derived']['ratio']['mean'], sum(ratios) / len(ratios), places=4)
+
+
+class SeriesQueryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = int(timezone.now().timestamp())
+        rows = ''.join(f'Pump-1,Pump,{i},1,1,{self.now - 3600 * i}\n' for i in range(1, 4))
+        response = self.client.post('/api/series/plant/readings/',
+                                    {'file': csv_upload(HEADER.replace('\n', ',Timestamp\n') + rows)},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['readings'], 3)
+
+    def query(self, **params):
+        return self.client.get('/api/series/plant/readings/', params)
+
+    def test_out_of_range_times_are_bad_requests(self):
+        for params in [{'start': 'inf'}, {'end': '-inf'}, {'start': 'nan'}, {'start': '1e30'},
+                       {'end': '-1e30'}, {'start': '2024-13-01'}, {'end': '2024-02-30T00:00:00'},
+                       {'start': '99999-01-01'}, {'start': 'yesterday'}, {'start': '10', 'end': '5'}]:
+            with self.subTest(params=params):
+                response = self.query(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+    def test_open_start_is_clamped_to_stored_data(self):
+        response = self.query(start='0')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertNotEqual(response.data['start'], '1970-01-01T00:00:00+00:00')
+        self.assertEqual(sum(point['count'] for point in response.data['points']), 3)
+
+    def test_raw_readings(self):
+        response = self.query(equipment='Pump-1', resolution='raw', start=str(self.now - 86400))
+        self.assertEqual([point['flowrate'] for point in response.data['points']], [3.0, 2.0, 1.0])
+
+    def test_too_many_points(self):
+        response = self.query(start='0', resolution='1m')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('use a coarser resolution', response.data['error'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                       'LOCATION': tempfile.gettempdir() + '/api-tests-cache'}})
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(cache.clear)
+
+    def assertAuthenticated(self, expected=True):
+        response = self.client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 201 if expected else 401)
+
+    def test_logout_revokes_cached_token(self):
+        self.assertAuthenticated()
+        self.assertAuthenticated()
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertAuthenticated(False)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.assertAuthenticated()
+        self.user.is_active = False
+        self.user.save()
+        self.assertAuthenticated(False)
+
+
+class MetricsAuthTests(TestCase):
+    def test_closed_by_default(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="metrics"')
+
+        User.objects.create_user(username='alice', password='secret')
+        self.client.login(username='alice', password='secret')
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    def test_staff(self):
+        User.objects.create_user(username='admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 401)
+
+    def test_empty_token_setting_is_not_a_secret(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 401)
+
+
+class EventTicketTests(APITestCase):
+    def test_ticket_is_single_use(self):
+        response = self.client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 201)
+        ticket = response.data['ticket']
+        self.assertEqual(async_to_sync(redeem_ticket)(ticket), self.user)
+        self.assertIsNone(async_to_sync(redeem_ticket)(ticket))
+
+    def test_ticket_expires(self):
+        ticket = issue_ticket(self.user)
+        EventTicket.objects.filter(key=ticket).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertIsNone(async_to_sync(redeem_ticket)(ticket))
+
+    def test_inactive_user(self):
+        ticket = issue_ticket(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(async_to_sync(redeem_ticket)(ticket))
+
+    def test_ticket_needs_authentication(self):
+        self.assertEqual(APIClient().post('/api/events/ticket/').status_code, 401)
+
+    def test_stream_refuses_token_and_bad_tickets(self):
+        client = AsyncClient()
+        response = async_to_sync(client.get)('/api/events/', {'token': self.token.key})
+        self.assertEqual(response.status_code, 400)
+        response = async_to_sync(client.get)('/api/events/', {'ticket': 'unknown'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_needs_asgi(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
@@ -0,0 +1,334 @@
+"""
+Time-series datasets. An upload to a series appends timestamped readings per equipment
+instead of creating a new snapshot, and updates the per-bucket rollups at every
+TIMESERIES_RESOLUTIONS level in the same transaction, so a trend over months reads a
+few hundred rollup rows rather than every reading.
+"""
+import time
+from datetime import datetime, timezone
+from itertools import repeat
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Min, Sum
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .db import write_transaction
+from .events import publish
+from .ingest import CSVFormatError, NUMERIC_COLUMNS, equipment_type_ids, open_upload, read_equipment_csv
+from .models import Reading, Rollup, SeriesEquipment, TimeSeries
+from .profiling import stage
+
+TIMESTAMP_COLUMN = 'Timestamp'
+METRICS = ['flowrate', 'pressure', 'temperature']
+ROLLUP_AGGREGATES = ['sum', 'min', 'max']
+DAY = 86400
+
+
+class SeriesQueryError(ValueError):
+    pass
+
+
+def to_iso(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+
+def parse_timestamps(values):
+    """
+    Unix seconds (float64, NaN where unparseable) for a column of epoch seconds or of
+    ISO 8601 times; times without an offset are taken as UTC.
+    """
+    import pandas as pd
+
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().all():
+        return numeric.to_numpy(dtype='float64')
+    parsed = pd.to_datetime(values, utc=True, errors='coerce', format='ISO8601')
+    return ((parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype='float64')
+
+
+def parse_time(value, name):
+    if value in (None, ''):
+        return None
+    error = SeriesQueryError(f'{name} must be an ISO 8601 time or Unix seconds')
+    try:
+        seconds = int(float(value))
+    except OverflowError:
+        raise error
+    except ValueError:
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None and parse_date(value):
+                parsed = datetime.combine(parse_date(value), datetime.min.time())
+        except ValueError:
+            # Well-formed but out of range, e.g. month 13
+            raise error
+        if parsed is None:
+            raise error
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds = int(parsed.timestamp())
+    try:
+        # Responses carry ISO times, so the value must also be a valid datetime
+        to_iso(seconds)
+    except (OverflowError, OSError, ValueError):
+        raise SeriesQueryError(f'{name} is out of range')
+    return seconds
+
+
+def series_equipment_ids(series, types_by_name):
+    """Map equipment names to SeriesEquipment ids, creating the series' new equipment."""
+    ids = dict(series.equipment.values_list('name', 'id'))
+    missing = {name: type_name for name, type_name in types_by_name.items() if name not in ids}
+    if missing:
+        type_ids = equipment_type_ids(set(missing.values()))
+        SeriesEquipment.objects.bulk_create([
+            SeriesEquipment(series=series, name=name, equipment_type_id=type_ids[type_name])
+            for name, type_name in missing.items()
+        ], ignore_conflicts=True)
+        ids = dict(series.equipment.values_list('name', 'id'))
+    return ids
+
+
+def insert_readings(readings):
+    # A plain executemany: several times faster than bulk_create, which builds a model
+    # instance per row and splits the insert into 999-parameter statements on SQLite
+    columns = ['equipment_id', 'timestamp'] + METRICS
+    sql = (f'INSERT INTO {connection.ops.quote_name(Reading._meta.db_table)} '
+           f'({", ".join(connection.ops.quote_name(c) for c in columns)}) VALUES ({", ".join(["%s"] * len(columns))})')
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, list(zip(*[readings[column].tolist() for column in columns])))
+
+
+def rollup_upsert_sql():
+    """
+    INSERT of one bucket's aggregates that folds into an existing row instead of
+    replacing it, so rollups grow incrementally without reading them back first.
+    """
+    table = connection.ops.quote_name(Rollup._meta.db_table)
+    count = connection.ops.quote_name('count')
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+    columns = ['series_id', 'equipment_id', 'resolution', 'bucket', 'count']
+    updates = [f'{count} = {table}.{count} + excluded.{count}']
+    for metric in METRICS:
+        columns += [f'{metric}_{aggregate}' for aggregate in ROLLUP_AGGREGATES]
+        updates += [
+            f'{metric}_sum = {table}.{metric}_sum + excluded.{metric}_sum',
+            f'{metric}_min = {least}({table}.{metric}_min, excluded.{metric}_min)',
+            f'{metric}_max = {greatest}({table}.{metric}_max, excluded.{metric}_max)',
+        ]
+    return (f'INSERT INTO {table} ({", ".join(connection.ops.quote_name(c) for c in columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'ON CONFLICT (equipment_id, resolution, bucket) DO UPDATE SET {", ".join(updates)}')
+
+
+def update_rollups(series, readings):
+    """Fold new readings (equipment_id, timestamp and METRICS columns) into every rollup level."""
+    sql = rollup_upsert_sql()
+    with connection.cursor() as cursor:
+        for seconds in settings.TIMESERIES_RESOLUTIONS.values():
+            keys = [readings['equipment_id'], readings['timestamp'] // seconds * seconds]
+            groups = readings.groupby(keys)
+            aggregates = groups[METRICS].agg(ROLLUP_AGGREGATES)
+            rows = zip(
+                repeat(series.id),
+                aggregates.index.get_level_values(0).tolist(),
+                repeat(seconds),
+                aggregates.index.get_level_values(1).tolist(),
+                groups.size().tolist(),
+                *[aggregates[(metric, aggregate)].tolist() for metric in METRICS for aggregate in ROLLUP_AGGREGATES]
+            )
+            cursor.executemany(sql, list(rows))
+
+
+def prune_series(series, now):
+    """Drop raw readings and rollups older than their TIMESERIES_RETENTION_DAYS."""
+    retention = settings.TIMESERIES_RETENTION_DAYS
+    if retention.get('raw'):
+        Reading.objects.filter(equipment__series=series, timestamp__lt=now - retention['raw'] * DAY).delete()
+    for label, seconds in settings.TIMESERIES_RESOLUTIONS.items():
+        if retention.get(label):
+            Rollup.objects.filter(series=series, resolution=seconds,
+                                  bucket__lt=now - retention[label] * DAY).delete()
+
+
+def ingest_readings(uploaded_file, user, name):
+    """
+    Append the readings of an uploaded CSV to the user's series ``name``, creating it on
+    first use. A ``Timestamp`` column (ISO 8601 or Unix seconds) dates each row; without
+    one the whole file is a snapshot taken now. Readings already stored for the same
+    equipment and time are skipped, so re-sending a file does not count it twice.
+    Readings older than the raw retention are dropped: with no raw copy to check them
+    against, they would be added to the rollups again on every re-send.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df, dropped_rows = read_equipment_csv(open_upload(uploaded_file), optional_columns=[TIMESTAMP_COLUMN])
+    now = int(time.time())
+
+    with stage('aggregate'):
+        if TIMESTAMP_COLUMN in df:
+            timestamps = parse_timestamps(df[TIMESTAMP_COLUMN])
+            valid = ~np.isnan(timestamps)
+            dropped_rows += int((~valid).sum())
+            df, timestamps = df[valid], timestamps[valid].astype('int64')
+        else:
+            timestamps = np.full(len(df), now, dtype='int64')
+        readings = pd.DataFrame({
+            'name': df['Equipment Name'].to_numpy(),
+            'timestamp': timestamps,
+            **{metric: df[column].to_numpy() for metric, column in zip(METRICS, NUMERIC_COLUMNS)},
+        })
+        types_by_name = dict(zip(df['Equipment Name'], df['Type'].astype(str)))
+        # A reading repeated within the file keeps its last value
+        readings = readings.drop_duplicates(['name', 'timestamp'], keep='last')
+    if readings.empty:
+        raise CSVFormatError('No valid readings in file')
+    expired = 0
+    raw_retention = settings.TIMESERIES_RETENTION_DAYS.get('raw')
+    if raw_retention:
+        is_current = readings['timestamp'] >= now - raw_retention * DAY
+        expired = len(readings) - int(is_current.sum())
+        readings = readings[is_current]
+
+    with stage('insert'), write_transaction():
+        series, _ = TimeSeries.objects.get_or_create(user=user, name=name)
+        # Serialise appends to one series (a no-op on SQLite, where the write lock already does)
+        TimeSeries.objects.select_for_update().filter(pk=series.pk).first()
+
+        readings['equipment_id'] = readings['name'].map(series_equipment_ids(series, types_by_name))
+        stored = set() if readings.empty else set(Reading.objects.filter(
+            equipment__series=series,
+            timestamp__gte=int(readings['timestamp'].min()),
+            timestamp__lte=int(readings['timestamp'].max()),
+        ).values_list('equipment_id', 'timestamp'))
+        skipped = 0
+        if stored:
+            is_new = [key not in stored for key in zip(readings['equipment_id'].tolist(), readings['timestamp'].tolist())]
+            skipped = len(is_new) - sum(is_new)
+            readings = readings[is_new]
+
+        insert_readings(readings)
+        with stage('rollup'):
+            if not readings.empty:
+                update_rollups(series, readings)
+            prune_series(series, now)
+
+    result = {
+        'series': series.name,
+        'readings': len(readings),
+        'skipped_readings': skipped,
+        'expired_readings': expired,
+        'dropped_rows': dropped_rows,
+        'equipment_count': readings['equipment_id'].nunique(),
+        'start': to_iso(int(readings['timestamp'].min())) if len(readings) else None,
+        'end': to_iso(int(readings['timestamp'].max())) if len(readings) else None,
+    }
+    publish(user.pk if user else None, 'series.updated', result)
+    return result
+
+
+def choose_resolution(start, end, now):
+    """The finest rollup level that still covers ``start`` and stays within TIMESERIES_MAX_POINTS."""
+    levels = sorted(settings.TIMESERIES_RESOLUTIONS.items(), key=lambda level: level[1])
+    for label, seconds in levels:
+        retention = settings.TIMESERIES_RETENTION_DAYS.get(label)
+        if retention and start < now - retention * DAY:
+            continue
+        if (end - start) / seconds <= settings.TIMESERIES_MAX_POINTS:
+            return label
+    return levels[-1][0]
+
+
+def clamp_start(series, equipment, start, end):
+    """
+    Move ``start`` up to the oldest stored bucket, so an open range (e.g. ``start=0``)
+    covers what the series holds rather than decades of empty buckets.
+    """
+    rollups = Rollup.objects.filter(series=series, resolution=max(settings.TIMESERIES_RESOLUTIONS.values()))
+    if equipment is not None:
+        rollups = rollups.filter(equipment=equipment)
+    oldest = rollups.aggregate(oldest=Min('bucket'))['oldest']
+    if oldest is None or oldest >= end:
+        # Nothing stored before end: any range returns no points
+        return max(start, end - DAY)
+    return max(start, oldest)
+
+
+def query_series(series, params):
+    """
+    Readings of a series between ``start`` and ``end`` (default: the last day), for one
+    ``equipment`` or summed over all of it, read from the rollup level picked by
+    ``resolution`` (auto by default, which starts no earlier than the oldest stored
+    bucket; ``raw`` returns the stored readings of one equipment).
+    """
+    now = int(time.time())
+    end = parse_time(params.get('end'), 'end')
+    if end is None:
+        end = now
+    start = parse_time(params.get('start'), 'start')
+    if start is None:
+        start = end - DAY
+    if start >= end:
+        raise SeriesQueryError('start must be before end')
+
+    equipment = None
+    equipment_name = params.get('equipment')
+    if equipment_name:
+        equipment = series.equipment.filter(name=equipment_name).first()
+        if equipment is None:
+            raise SeriesQueryError(f'Unknown equipment: {equipment_name}')
+
+    resolution = params.get('resolution') or 'auto'
+    if resolution == 'auto':
+        start = clamp_start(series, equipment, start, end)
+    max_points = settings.TIMESERIES_MAX_POINTS
+    response = {'series': series.name, 'equipment': equipment_name, 'start': to_iso(start), 'end': to_iso(end)}
+
+    if resolution == 'raw':
+        if equipment is None:
+            raise SeriesQueryError('resolution=raw needs an equipment')
+        rows = list(equipment.readings.filter(timestamp__gte=start, timestamp__lt=end)
+                    .order_by('timestamp').values_list('timestamp', *METRICS)[:max_points + 1])
+        response.update(resolution='raw', truncated=len(rows) > max_points, points=[
+            {'t': to_iso(row[0]), **dict(zip(METRICS, row[1:]))} for row in rows[:max_points]
+        ])
+        return response
+
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end, now)
+    elif resolution not in settings.TIMESERIES_RESOLUTIONS:
+        raise SeriesQueryError(f'resolution must be auto, raw or one of: {", ".join(settings.TIMESERIES_RESOLUTIONS)}')
+    seconds = settings.TIMESERIES_RESOLUTIONS[resolution]
+    first_bucket = start // seconds * seconds
+    if (end - first_bucket) / seconds > max_points:
+        coarsest = seconds == max(settings.TIMESERIES_RESOLUTIONS.values())
+        advice = 'narrow the range' if coarsest else 'use a coarser resolution'
+        raise SeriesQueryError(f'More than {max_points} points at {resolution}; {advice}')
+
+    rollups = Rollup.objects.filter(resolution=seconds, bucket__gte=first_bucket, bucket__lt=end).order_by('bucket')
+    fields = [f'{metric}_{aggregate}' for metric in METRICS for aggregate in ROLLUP_AGGREGATES]
+    if equipment is not None:
+        rows = rollups.filter(equipment=equipment).values_list('bucket', 'count', *fields)
+    else:
+        # The (series, resolution, bucket) index serves this range; buckets are combined per time
+        aggregates = {'total': Sum('count')}
+        for metric in METRICS:
+            aggregates.update({
+                f'{metric}_total': Sum(f'{metric}_sum'),
+                f'{metric}_low': Min(f'{metric}_min'),
+                f'{metric}_high': Max(f'{metric}_max'),
+            })
+        rows = rollups.filter(series=series).values('bucket').annotate(**aggregates).values_list(
+            'bucket', *aggregates)
+
+    points = []
+    for bucket, count, *values in rows:
+        point = {'t': to_iso(bucket), 'count': count}
+        for i, metric in enumerate(METRICS):
+            total, low, high = values[3 * i:3 * i + 3]
+            point.update({f'{metric}_mean': total / count, f'{metric}_min': low, f'{metric}_max': high})
+        points.append(point)
+    response.update(resolution=resolution, points=points)
+    return response
@@ -1,14 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
 
 urlpatterns = [
     path('auth/login/', views.login_view, name='login'),
     path('auth/register/', views.register_view, name='register'),
+    path('auth/logout/', views.logout_view, name='logout'),
+    path('auth/cache-stats/', views.auth_cache_stats, name='auth_cache_stats'),
     path('upload/', views.upload_csv, name='upload_csv'),
-    path('summary/', views.get_summary, name='get_summary'),
-    path('equipment/', views.get_equipment_list, name='get_equipment'),
-    path('history/', views.get_history, name='get_history'),
+    path('upload/batch/', views.upload_batch, name='upload_batch'),
+    path('series/', views.series_list, name='series_list'),
+    path('series/<slug:name>/readings/', views.series_readings, name='series_readings'),
+    path('upload/sessions/', views.chunked_upload_init, name='chunked_upload_init'),
+    path('upload/sessions/<uuid:session_id>/', views.chunked_upload_status, name='chunked_upload_status'),
+    path('upload/sessions/<uuid:session_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('upload/sessions/<uuid:session_id>/finalize/', views.chunked_upload_finalize,
+         name='chunked_upload_finalize'),
+    path('summary/', read_views.get_summary, name='get_summary'),
+    path('equipment/', read_views.get_equipment_list, name='get_equipment'),
+    path('derived/', read_views.get_derived, name='get_derived'),
+    path('history/', read_views.get_history, name='get_history'),
     path('generate-report/', views.generate_pdf_report, name='generate_report'),
     path('export-excel/', views.export_excel, name='export_excel'),
+    path('reports/<int:upload_id>/<str:fmt>/', views.report_status, name='report_status'),
+    path('export-csv/', read_views.export_csv, name='export_csv'),
+    path('events/', async_views.event_stream, name='event_stream'),
+    path('events/ticket/', views.event_ticket, name='event_ticket'),
 
 ]
@@ -1,22 +1,33 @@
-import pandas as pd
 import io
-from django.http import HttpResponse
+from functools import partial
+from django.db import router
+from django.db.models import Count
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from .models import Equipment, UploadHistory
+from django.conf import settings
+from .models import ChunkedUpload, Equipment, TimeSeries, UploadHistory
 from .serializers import EquipmentSerializer, UploadHistorySerializer, UserSerializer
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from datetime import datetime
+from .authentication import token_cache
+from .batch import BatchError, ingest_batch
+from .conditional import not_modified, with_etag
+from .events import issue_ticket, publish
+from .profiling import profiled_view
+from .routers import read_from_replica, replica_allowed, use_read_replica
+from .filters import EquipmentPagination, FilterError, filter_equipment
+from .derived import DerivedError, add_derived_values, derived_rows, derived_stats, parse_derived
+from .exports import CSV_EXPORT_CHUNK_SIZE, EXPORT_FIELDS, csv_export_chunks, with_derived
+from .ingest import UPLOAD_EXTENSIONS, CSVFormatError, ingest_csv, merge_csv
+from .reports import REPORT_FORMATS, ReportQueueFull, report_pool, report_version
+from .timeseries import SeriesQueryError, ingest_readings, query_series
+from .chunked import (ChunkError, ChunkedUploadBusy, assemble_and_ingest, purge_expired_chunked_uploads,
+                      store_chunk)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -34,6 +45,26 @@ def login_view(request):
         })
     return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_view(request):
+    # Deleting the token revokes it (and evicts it from the auth cache); the next login issues a new one
+    if isinstance(request.auth, Token):
+        request.auth.delete()
+    return Response({'message': 'Logged out'})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def event_ticket(request):
+    # EventSource cannot send the Authorization header; this key stands in for it once
+    return Response({'ticket': issue_ticket(request.user), 'expires_in': settings.EVENT_TICKET_SECONDS},
+                    status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def auth_cache_stats(request):
+    return Response(token_cache.stats())
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_view(request):
@@ -55,89 +86,225 @@ def register_view(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@profiled_view
 def upload_csv(request):
     if 'file' not in request.FILES:
         return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
     
     csv_file = request.FILES['file']
     
-    if not csv_file.name.endswith('.csv'):
-        return Response({'error': 'File must be CSV format'}, status=status.HTTP_400_BAD_REQUEST)
+    if not csv_file.name.lower().endswith(UPLOAD_EXTENSIONS):
+        return Response({'error': 'File must be CSV format (optionally .gz, .bz2 or .zip compressed)'},
+                        status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        df = pd.read_csv(csv_file)
-        
-        required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-        if not all(col in df.columns for col in required_columns):
-            return Response({'error': f'CSV must contain columns: {", ".join(required_columns)}'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
-        
-        df = df.dropna()
-        
-        avg_flowrate = df['Flowrate'].mean()
-        avg_pressure = df['Pressure'].mean()
-        avg_temperature = df['Temperature'].mean()
-        total_count = len(df)
-        
         user = request.user if request.user.is_authenticated else None
-        
-        upload_history = UploadHistory.objects.create(
-            filename=csv_file.name,
-            total_count=total_count,
-            avg_flowrate=avg_flowrate,
-            avg_pressure=avg_pressure,
-            avg_temperature=avg_temperature,
-            user=user
-        )
-        
-        equipment_objects = []
-        for _, row in df.iterrows():
-            equipment_objects.append(Equipment(
-                upload_history=upload_history,
-                equipment_name=row['Equipment Name'],
-                equipment_type=row['Type'],
-                flowrate=row['Flowrate'],
-                pressure=row['Pressure'],
-                temperature=row['Temperature']
-            ))
-        
-        Equipment.objects.bulk_create(equipment_objects)
-        
-        if user:
-            user_uploads = UploadHistory.objects.filter(user=user).order_by('-uploaded_at')
-            if user_uploads.count() > 5:
-                old_uploads = user_uploads[5:]
-                for old_upload in old_uploads:
-                    old_upload.delete()
-        else:
-            guest_uploads = UploadHistory.objects.filter(user__isnull=True).order_by('-uploaded_at')
-            if guest_uploads.count() > 5:
-                old_uploads = guest_uploads[5:]
-                for old_upload in old_uploads:
-                    old_upload.delete()
-        
-        type_distribution = df['Type'].value_counts().to_dict()
-        
-        return Response({
-            'message': 'File uploaded successfully',
-            'upload_id': upload_history.id,
-            'summary': {
-                'total_count': total_count,
-                'avg_flowrate': round(avg_flowrate, 2),
-                'avg_pressure': round(avg_pressure, 2),
-                'avg_temperature': round(avg_temperature, 2),
-                'type_distribution': type_distribution
-            }
-        }, status=status.HTTP_201_CREATED)
+        base_upload_id = request.data.get('base_upload_id')
+        if base_upload_id:
+            # Delta mode: merge the file into an existing dataset of the user's
+            try:
+                base = UploadHistory.objects.get(id=base_upload_id)
+            except (UploadHistory.DoesNotExist, ValueError):
+                return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+            if base.user != user:
+                return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+            try:
+                return Response(merge_csv(csv_file, base))
+            except CSVFormatError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            result = ingest_csv(csv_file, user)
+        except CSVFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(result, status=status.HTTP_201_CREATED)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@profiled_view
+def upload_batch(request):
+    uploaded_files = request.FILES.getlist('files')
+    if not uploaded_files:
+        return Response({'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    user = request.user if request.user.is_authenticated else None
+    try:
+        results = ingest_batch(uploaded_files, user)
+    except BatchError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    created = sum(1 for result in results if 'upload_id' in result)
+    if created == len(results):
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({'created': created, 'failed': len(results) - created, 'files': results},
+                    status=response_status)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@use_read_replica
+def series_list(request):
+    user = request.user if request.user.is_authenticated else None
+    series = TimeSeries.objects.filter(user=user).annotate(equipment_count=Count('equipment')).order_by('name')
+    return Response([
+        {'name': s.name, 'created_at': s.created_at, 'equipment_count': s.equipment_count} for s in series
+    ])
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+@profiled_view
+def series_readings(request, name):
+    user = request.user if request.user.is_authenticated else None
+    
+    if request.method == 'POST':
+        if 'file' not in request.FILES:
+            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+        csv_file = request.FILES['file']
+        if not csv_file.name.lower().endswith(UPLOAD_EXTENSIONS):
+            return Response({'error': 'File must be CSV format (optionally .gz, .bz2 or .zip compressed)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = ingest_readings(csv_file, user, name)
+        except CSVFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(result, status=status.HTTP_201_CREATED)
+    
+    with read_from_replica(replica_allowed(user)):
+        series = TimeSeries.objects.filter(user=user, name=name).first()
+        if series is None:
+            return Response({'error': 'Series not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            return Response(query_series(series, request.query_params))
+        except SeriesQueryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+def _chunked_upload_status(session):
+    return {
+        'upload_session_id': str(session.id),
+        'filename': session.filename,
+        'total_size': session.total_size,
+        'chunk_size': session.chunk_size,
+        'total_chunks': session.total_chunks,
+        'received_chunks': session.received_chunks(),
+    }
+
+def _get_chunked_upload(request, session_id):
+    user = request.user if request.user.is_authenticated else None
+    try:
+        session = ChunkedUpload.objects.get(id=session_id)
+    except ChunkedUpload.DoesNotExist:
+        return None, Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+    if session.user != user:
+        return None, Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    return session, None
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def chunked_upload_init(request):
+    filename = request.data.get('filename', '')
+    
+    if not filename.lower().endswith(UPLOAD_EXTENSIONS):
+        return Response({'error': 'File must be CSV format (optionally .gz, .bz2 or .zip compressed)'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        total_size = int(request.data.get('total_size'))
+        chunk_size = int(request.data.get('chunk_size', settings.CHUNKED_UPLOAD_CHUNK_SIZE))
+    except (TypeError, ValueError):
+        return Response({'error': 'total_size and chunk_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if total_size <= 0 or not 0 < chunk_size <= settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        return Response({'error': f'chunk_size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} '
+                                  f'and total_size positive'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    purge_expired_chunked_uploads()
+    
+    session = ChunkedUpload.objects.create(
+        user=request.user if request.user.is_authenticated else None,
+        filename=filename,
+        total_size=total_size,
+        chunk_size=chunk_size,
+        total_chunks=-(-total_size // chunk_size)
+    )
+    session.directory.mkdir(parents=True, exist_ok=True)
+    return Response(_chunked_upload_status(session), status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def chunked_upload_status(request, session_id):
+    session, error = _get_chunked_upload(request, session_id)
+    if error:
+        return error
+    return Response(_chunked_upload_status(session))
+
+@api_view(['PUT'])
+@permission_classes([AllowAny])
+def upload_chunk(request, session_id, index):
+    session, error = _get_chunked_upload(request, session_id)
+    if error:
+        return error
+    
+    checksum = request.headers.get('X-Chunk-SHA256')
+    if not checksum:
+        return Response({'error': 'X-Chunk-SHA256 header is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Read the raw body in blocks rather than through request.body/request.data,
+    # so chunks larger than DATA_UPLOAD_MAX_MEMORY_SIZE are never buffered whole
+    try:
+        store_chunk(session, index, request.stream or io.BytesIO(), checksum)
+    except ChunkError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    received_chunks = session.received_chunks()
+    publish(session.user_id, 'upload.progress', {
+        'upload_session_id': str(session.id),
+        'filename': session.filename,
+        'received_chunks': len(received_chunks),
+        'total_chunks': session.total_chunks,
+    })
+    return Response({'index': index, 'received_chunks': received_chunks})
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@profiled_view
+def chunked_upload_finalize(request, session_id):
+    session, error = _get_chunked_upload(request, session_id)
+    if error:
+        return error
+    
+    try:
+        result = assemble_and_ingest(session, lambda f: ingest_csv(f, session.user))
+    except ChunkError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except ChunkedUploadBusy:
+        return Response({'error': 'Upload is already being finalized'}, status=status.HTTP_409_CONFLICT)
+    except CSVFormatError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response(result, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@use_read_replica
 def get_summary(request):
     upload_id = request.query_params.get('upload_id')
     
+    try:
+        derived = parse_derived(request.query_params.getlist('derived'))
+    except DerivedError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     user = request.user if request.user.is_authenticated else None
     
     if not upload_id:
@@ -158,13 +325,13 @@ def get_summary(request):
         elif not user and upload.user is not None:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        equipment_list = Equipment.objects.filter(upload_history=upload)
+        cached = not_modified(request, upload)
+        if cached:
+            return cached
         
-        type_distribution = {}
-        for eq in equipment_list:
-            type_distribution[eq.equipment_type] = type_distribution.get(eq.equipment_type, 0) + 1
+        type_distribution = upload.type_distribution()
         
-        return Response({
+        summary = {
             'upload_id': upload.id,
             'filename': upload.filename,
             'uploaded_at': upload.uploaded_at,
@@ -173,15 +340,24 @@ def get_summary(request):
             'avg_pressure': round(upload.avg_pressure, 2),
             'avg_temperature': round(upload.avg_temperature, 2),
             'type_distribution': type_distribution
-        })
+        }
+        if derived:
+            summary['derived'] = derived_stats(upload, derived)
+        return with_etag(Response(summary), upload)
     except UploadHistory.DoesNotExist:
         return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@use_read_replica
 def get_equipment_list(request):
     upload_id = request.query_params.get('upload_id')
     
+    try:
+        derived = parse_derived(request.query_params.getlist('derived'))
+    except DerivedError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     user = request.user if request.user.is_authenticated else None
     
     if not upload_id:
@@ -202,14 +378,66 @@ def get_equipment_list(request):
         elif not user and upload.user is not None:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        equipment_list = Equipment.objects.filter(upload_history=upload)
-        serializer = EquipmentSerializer(equipment_list, many=True)
-        return Response(serializer.data)
+        cached = not_modified(request, upload)
+        if cached:
+            return cached
+        
+        try:
+            equipment_list = filter_equipment(
+                Equipment.objects.filter(upload_history=upload).select_related('equipment_type'),
+                request.query_params
+            )
+        except FilterError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        paginator = EquipmentPagination()
+        page = paginator.paginate_queryset(equipment_list, request)
+        if page is not None:
+            data = EquipmentSerializer(page, many=True).data
+            add_derived_values(upload, derived, data)
+            return with_etag(paginator.get_paginated_response(data), upload)
+        
+        data = EquipmentSerializer(equipment_list, many=True).data
+        add_derived_values(upload, derived, data)
+        return with_etag(Response(data), upload)
     except UploadHistory.DoesNotExist:
         return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@use_read_replica
+def get_derived(request):
+    try:
+        derived = parse_derived(request.query_params.getlist('derived'))
+    except DerivedError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not derived:
+        return Response({'error': 'No derived expressions given'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    upload_id = request.query_params.get('upload_id')
+    user = request.user if request.user.is_authenticated else None
+    
+    if not upload_id:
+        latest_upload = UploadHistory.objects.filter(user=user).order_by('-uploaded_at').first()
+        if not latest_upload:
+            return Response({'error': 'No data available'}, status=status.HTTP_404_NOT_FOUND)
+        upload_id = latest_upload.id
+    
+    try:
+        upload = UploadHistory.objects.get(id=upload_id)
+    except UploadHistory.DoesNotExist:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if upload.user != user:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    cached = not_modified(request, upload)
+    if cached:
+        return cached
+    return with_etag(Response({'upload_id': upload.id, 'derived': derived_stats(upload, derived)}), upload)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@use_read_replica
 def get_history(request):
     user = request.user if request.user.is_authenticated else None
     
@@ -217,12 +445,51 @@ def get_history(request):
         uploads = UploadHistory.objects.filter(user=user).order_by('-uploaded_at')[:5]
     else:
         uploads = UploadHistory.objects.filter(user__isnull=True).order_by('-uploaded_at')[:5]
+    uploads = uploads.annotate(num_equipment=Count('equipment'))
     
     serializer = UploadHistorySerializer(uploads, many=True)
     return Response(serializer.data)
 
+def wants_wait(value, default=True):
+    if value is None:
+        return default
+    return str(value).lower() not in ('false', '0', 'no')
+
+def report_response(request, upload, fmt, wait):
+    """
+    Serve a rendered report, rendering it in the report pool if it isn't cached yet.
+    
+    Waits up to REPORT_WAIT_SECONDS (or not at all when ``wait`` is false); a report
+    still rendering after that is answered with 202 and a job handle to poll.
+    """
+    timeout = settings.REPORT_WAIT_SECONDS if wait else 0
+    try:
+        path = report_pool.request(upload.id, fmt, report_version(upload), router.db_for_read(Equipment),
+                                   timeout, user_id=upload.user_id)
+    except ReportQueueFull:
+        response = Response({'error': 'Too many reports are being generated, try again shortly'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '5'
+        return response
+    except Exception as e:
+        return Response({'error': 'Report generation failed', 'detail': str(e)},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    if path is None:
+        return Response({
+            'job_id': f'{upload.id}.{fmt}',
+            'status': 'pending',
+            'status_url': reverse('report_status', args=[upload.id, fmt]),
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    content_type, filename = REPORT_FORMATS[fmt]
+    return FileResponse(open(path, 'rb'), content_type=content_type, as_attachment=True,
+                        filename=filename.format(id=upload.id))
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@use_read_replica
+@profiled_view
 def generate_pdf_report(request):
     upload_id = request.data.get('upload_id')
     
@@ -246,113 +513,78 @@ def generate_pdf_report(request):
         elif not user and upload.user is not None:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        equipment_list = Equipment.objects.filter(upload_history=upload)
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="equipment_report_{upload.id}.pdf"'
-        
-        doc = SimpleDocTemplate(response, pagesize=A4)
-        elements = []
-        styles = getSampleStyleSheet()
+        return report_response(request, upload, 'pdf', wants_wait(request.data.get('wait')))
         
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1a1a1a'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        
-        title = Paragraph("Chemical Equipment Analysis Report", title_style)
-        elements.append(title)
-        elements.append(Spacer(1, 0.2*inch))
-        
-        info_data = [
-            ['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            ['Dataset:', upload.filename],
-            ['Upload Date:', upload.uploaded_at.strftime('%Y-%m-%d %H:%M:%S')],
-            ['Total Equipment:', str(upload.total_count)],
-        ]
-        
-        info_table = Table(info_data, colWidths=[2.5*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        
-        elements.append(info_table)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        summary_title = Paragraph("Summary Statistics", styles['Heading2'])
-        elements.append(summary_title)
-        elements.append(Spacer(1, 0.1*inch))
-        
-        summary_data = [
-            ['Metric', 'Average Value'],
-            ['Flowrate', f"{upload.avg_flowrate:.2f}"],
-            ['Pressure', f"{upload.avg_pressure:.2f}"],
-            ['Temperature', f"{upload.avg_temperature:.2f}"],
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        
-        elements.append(summary_table)
-        elements.append(Spacer(1, 0.3*inch))
+    except UploadHistory.DoesNotExist:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@use_read_replica
+@profiled_view
+def export_excel(request):
+    upload_id = request.data.get('upload_id')
+    
+    user = request.user if request.user.is_authenticated else None
+    
+    if not upload_id:
+        if user:
+            latest_upload = UploadHistory.objects.filter(user=user).order_by('-uploaded_at').first()
+        else:
+            latest_upload = UploadHistory.objects.filter(user__isnull=True).order_by('-uploaded_at').first()
         
-        equipment_title = Paragraph("Equipment Details", styles['Heading2'])
-        elements.append(equipment_title)
-        elements.append(Spacer(1, 0.1*inch))
+        if not latest_upload:
+            return Response({'error': 'No data available'}, status=status.HTTP_404_NOT_FOUND)
+        upload_id = latest_upload.id
+    
+    try:
+        upload = UploadHistory.objects.get(id=upload_id)
         
-        equipment_data = [['Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
+        if user and upload.user != user:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        elif not user and upload.user is not None:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        for eq in equipment_list[:50]:
-            equipment_data.append([
-                eq.equipment_name,
-                eq.equipment_type,
-                f"{eq.flowrate:.2f}",
-                f"{eq.pressure:.2f}",
-                f"{eq.temperature:.2f}"
-            ])
+        return report_response(request, upload, 'xlsx', wants_wait(request.data.get('wait')))
         
-        equipment_table = Table(equipment_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1*inch, 1*inch])
-        equipment_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-        ]))
+    except UploadHistory.DoesNotExist:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@use_read_replica
+def report_status(request, upload_id, fmt):
+    if fmt not in REPORT_FORMATS:
+        return Response({'error': f'Format must be one of: {", ".join(REPORT_FORMATS)}'},
+                        status=status.HTTP_404_NOT_FOUND)
+    
+    user = request.user if request.user.is_authenticated else None
+    
+    try:
+        upload = UploadHistory.objects.get(id=upload_id)
         
-        elements.append(equipment_table)
+        if user and upload.user != user:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        elif not user and upload.user is not None:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        doc.build(elements)
-        return response
+        # Re-requesting is idempotent: it joins the job if this worker runs it, and
+        # starts it otherwise (e.g. the handle came from another worker process)
+        return report_response(request, upload, fmt, wants_wait(request.query_params.get('wait'), default=False))
         
     except UploadHistory.DoesNotExist:
         return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
 
-@api_view(['POST'])
+@api_view(['GET'])
 @permission_classes([AllowAny])
-def export_excel(request):
-    upload_id = request.data.get('upload_id')
+@use_read_replica
+def export_csv(request):
+    upload_id = request.query_params.get('upload_id')
+    
+    try:
+        derived = parse_derived(request.query_params.getlist('derived'))
+    except DerivedError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     user = request.user if request.user.is_authenticated else None
     
@@ -374,27 +606,24 @@ def export_excel(request):
         elif not user and upload.user is not None:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        equipment_list = Equipment.objects.filter(upload_history=upload)
-        
-        data = []
-        for eq in equipment_list:
-            data.append({
-                'Equipment Name': eq.equipment_name,
-                'Type': eq.equipment_type,
-                'Flowrate': eq.flowrate,
-                'Pressure': eq.pressure,
-                'Temperature': eq.temperature
-            })
-        
-        df = pd.DataFrame(data)
-        
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="equipment_data_{upload_id}.xlsx"'
+        cached = not_modified(request, upload)
+        if cached:
+            return cached
+        
+        # Bind the alias now: the rows are read after the view (and its replica routing) returns
+        rows = (Equipment.objects.using(router.db_for_read(Equipment))
+                .filter(upload_history=upload).order_by('id'))
+        if derived:
+            # Evaluate while the routing still applies; streaming then reads the cache
+            derived_rows(upload, derived, [])
+            rows = with_derived(rows.values_list('id', *EXPORT_FIELDS).iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE),
+                                partial(derived_rows, upload, derived))
+        else:
+            rows = rows.values_list(*EXPORT_FIELDS).iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE)
         
-        df.to_excel(response, index=False, engine='openpyxl')
-        return response
+        response = StreamingHttpResponse(csv_export_chunks(rows, list(derived)), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="equipment_data_{upload.id}.csv"'
+        return with_etag(response, upload)
         
     except UploadHistory.DoesNotExist:
         return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
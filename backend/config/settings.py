@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -63,12 +64,84 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Serve summary/equipment/history/export-csv from the async views in api.async_views.
+# Enable when running under ASGI (gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker).
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Database selection: DB_ENGINE=sqlite (default) or postgresql.
+# Setting DB_REPLICA_HOST (postgresql) or SQLITE_REPLICA_PATH (sqlite) adds a 'replica'
+# alias that api.routers.PrimaryReplicaRouter uses for the read-only views.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+
+# SQLITE_TUNING=False restores SQLite defaults (rollback journal, no persistent connections)
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'True') == 'True'
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'chemical_equipment'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Required when DB_HOST points at PgBouncer in transaction pooling mode
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER', 'False') == 'True',
+        }
     }
-}
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = dict(
+            DATABASES['default'],
+            HOST=os.environ['DB_REPLICA_HOST'],
+            PORT=os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            TEST={'MIRROR': 'default'},
+        )
+else:
+    DATABASES = {
+        'default': {
+            # Django's SQLite backend plus BEGIN IMMEDIATE for api.db.write_transaction()
+            'ENGINE': 'api.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE if SQLITE_TUNING else 0,
+            'CONN_HEALTH_CHECKS': SQLITE_TUNING,
+            'OPTIONS': {'timeout': 20} if SQLITE_TUNING else {},
+        }
+    }
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = dict(
+            DATABASES['default'],
+            NAME=os.environ['SQLITE_REPLICA_PATH'],
+            TEST={'MIRROR': 'default'},
+        )
+
+DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+
+# A cache shared by every worker process (needs the redis package): token lookups are only
+# cached with one, and the primary-read window after an upload reaches every worker
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# How long a user's reads stay on the primary after they upload or delete data
+REPLICA_READ_AFTER_WRITE_SECONDS = int(os.environ.get('REPLICA_READ_AFTER_WRITE_SECONDS', '30'))
+
+# Applied to every new SQLite connection by api.db.configure_sqlite.
+# WAL lets readers run alongside a writer instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # 64 MiB (negative values are KiB)
+    'temp_store': 'MEMORY',
+} if SQLITE_TUNING else {}
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -88,13 +161,78 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Resumable chunked uploads (parts are stored under MEDIA_ROOT/chunked_uploads/)
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+# Batch uploads (many files or a .zip of CSVs) are ingested on a shared thread pool
+BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', 4))
+BATCH_UPLOAD_MAX_FILES = int(os.environ.get('BATCH_UPLOAD_MAX_FILES', 200))
+DATA_UPLOAD_MAX_NUMBER_FILES = BATCH_UPLOAD_MAX_FILES
+
+# Time-series datasets: rollup levels (label -> bucket seconds) kept up to date at ingest,
+# how long raw readings and fine rollups are kept, and the most points a range query returns
+TIMESERIES_RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+TIMESERIES_RETENTION_DAYS = {
+    'raw': int(os.environ.get('TIMESERIES_RAW_RETENTION_DAYS', 30)),
+    '1m': int(os.environ.get('TIMESERIES_MINUTE_RETENTION_DAYS', 90)),
+}
+TIMESERIES_MAX_POINTS = 2000
+
+# Derived parameters (?derived=name:expression): dataset columns and evaluated expressions
+# are cached per process, up to DERIVED_CACHE_BYTES of arrays. By default 128 MB is shared
+# out between the web workers (WEB_CONCURRENCY, which gunicorn also reads)
+WEB_CONCURRENCY = max(int(os.environ.get('WEB_CONCURRENCY', 1)), 1)
+DERIVED_CACHE_BYTES = int(os.environ.get('DERIVED_CACHE_BYTES', 128 * 1024 * 1024 // WEB_CONCURRENCY))
+DERIVED_MAX_EXPRESSIONS = 8
+DERIVED_MAX_LENGTH = 256
+
+# Server-sent events (GET /api/events/, ASGI only). Every process polls the event table
+# once per EVENT_POLL_INTERVAL seconds for all the streams it serves
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 1))
+EVENT_HEARTBEAT_SECONDS = 15
+EVENT_STREAM_SECONDS = int(os.environ.get('EVENT_STREAM_SECONDS', 300))
+EVENT_RETRY_MS = 3000
+EVENT_RETENTION_SECONDS = int(os.environ.get('EVENT_RETENTION_SECONDS', 3600))
+EVENT_QUEUE_SIZE = 100
+# Browsers open the stream with a single-use ticket (POST /api/events/ticket/) valid this long
+EVENT_TICKET_SECONDS = 30
+
+# PDF/Excel rendering runs in a process pool; rendered reports are cached under REPORT_CACHE_DIR
+REPORT_CACHE_DIR = MEDIA_ROOT / 'reports'
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', os.cpu_count() or 1))
+REPORT_QUEUE_LIMIT = int(os.environ.get('REPORT_QUEUE_LIMIT', 4 * REPORT_WORKERS))
+REPORT_WAIT_SECONDS = float(os.environ.get('REPORT_WAIT_SECONDS', 30))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Token -> user lookups cached by api.authentication.CachingTokenAuthentication; only with a
+# shared cache (REDIS_URL), so that logout revokes a token in every worker process at once
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60))
+
+# Per-endpoint request metrics, served at /metrics (see api.metrics)
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 1024))  # recent samples per endpoint for quantiles
+METRICS_TRACE_MEMORY = os.environ.get('METRICS_TRACE_MEMORY', 'False') == 'True'  # tracemalloc; slow
+METRICS_TIMING_ALLOW_ORIGIN = os.environ.get('METRICS_TIMING_ALLOW_ORIGIN', '*')
+# Bearer secret for scraping /metrics; unset, only logged-in staff can read them
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Stage timings are returned on request (X-Profile: 1); cProfile dumps of a sample of
+# upload/report requests, keeping the slowest PROFILE_KEEP_SLOWEST (see api.profiling)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_KEEP_SLOWEST = int(os.environ.get('PROFILE_KEEP_SLOWEST', 10))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', BASE_DIR / 'profiles'))
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachingTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -115,6 +253,8 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-chunk-sha256',
+    'x-profile',
 ]
 
 # Trust Render proxy headers
@@ -0,0 +1,30 @@
+"""
+gunicorn settings, read automatically when gunicorn is started from this directory
+(``gunicorn config.wsgi:application``); command-line options override them.
+
+With preload_app the master imports the application once and forks every worker from
+it, so workers boot without importing anything and share the master's memory pages
+(copy-on-write) instead of each holding their own copy of Django, DRF and the app.
+"""
+import importlib
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Imported lazily by the app (see api.ingest), so a worker would otherwise load its own copy
+# on its first upload. When preloading, the master imports them once for all workers.
+# Report rendering runs in separately spawned processes and is not helped by this.
+PRELOAD_MODULES = [name for name in os.environ.get('GUNICORN_PRELOAD_MODULES', 'pandas').split(',') if name]
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    # Django imports the URLconf, and with it every view module, on the first request
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    # The workers must not inherit a database connection opened while loading
+    from django.db import connections
+    connections.close_all()
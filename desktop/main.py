@@ -1,39 +1,616 @@
 import sys
+import os
+import io
+import csv
+import json
+import gzip
+import sqlite3
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import threading
+from array import array
+from itertools import islice
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.patches import Polygon, Wedge
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QPushButton, QFileDialog, QTableWidget, 
-                             QTableWidgetItem, QLabel, QLineEdit, QTabWidget,
-                             QMessageBox, QGroupBox, QFormLayout, QListWidget,
+                             QHBoxLayout, QPushButton, QFileDialog, QTableView, 
+                             QLabel, QLineEdit, QTabWidget,
+                             QMessageBox, QGroupBox, QFormLayout, QListWidget, QComboBox, QProgressDialog,
                              QSplitter)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import (Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QSortFilterProxyModel,
+                          QThread, QThreadPool, QTimer, QSettings, QStandardPaths, pyqtSignal)
 from PyQt5.QtGui import QFont
 
 API_BASE_URL = 'http://localhost:8000/api'
+COMPRESSED_EXTENSIONS = ('.gz', '.zip', '.bz2')
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_WORKERS = 4
+UPLOAD_CHUNK_RETRIES = 4
+UPLOAD_EXTENSIONS = ('.csv', '.csv.gz', '.gz', '.zip', '.bz2')
+FOLDER_IMPORT_BATCH_FILES = 10
+FOLDER_IMPORT_BATCH_BYTES = 32 * 1024 * 1024
+NETWORK_WORKERS = 4
+HTTP_POOL_SIZE = NETWORK_WORKERS + UPLOAD_WORKERS
+HTTP_TIMEOUT = 60
+REPORT_POLL_INTERVAL = 1
+# The server sends a keep-alive every 15 s, so a silent stream is a dead one
+EVENT_READ_TIMEOUT = 45
+EVENT_RETRY_SECONDS = 3
+HISTORY_REFRESH_DELAY_MS = 300
+EQUIPMENT_PAGE_SIZE = 1000
+COLUMN_SAMPLE_ROWS = 200
+EQUIPMENT_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+# Column -> server ordering key; sorting is done by the API, which has an index per key
+EQUIPMENT_ORDERING = ['name', 'type', 'flowrate', 'pressure', 'temperature']
+DATASET_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DATASET_CACHE_BATCH = 10000
+# Mirrors backend/api/ingest.py so the local preview accepts and drops the same rows
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+COLUMN_DTYPES = {
+    'Equipment Name': str,
+    'Type': 'category',
+    'Flowrate': 'float64',
+    'Pressure': 'float64',
+    'Temperature': 'float64',
+}
+PREVIEW_ROWS = 1000
+PREVIEW_CHUNK_ROWS = 200000
+
+class ApiError(Exception):
+    pass
+
+class CSVPreviewError(ValueError):
+    pass
+
+def read_csv_chunks(filepath, coerce=False):
+    # Compression (.gz, .bz2, single-file .zip) is inferred from the extension, as on the server
+    if coerce:
+        return pd.read_csv(filepath, usecols=REQUIRED_COLUMNS, chunksize=PREVIEW_CHUNK_ROWS,
+                           dtype={'Equipment Name': str, 'Type': 'category'})
+    return pd.read_csv(filepath, usecols=REQUIRED_COLUMNS, chunksize=PREVIEW_CHUNK_ROWS, dtype=COLUMN_DTYPES)
+
+def preview_csv(filepath):
+    """
+    Validate and summarize a CSV locally, one chunk at a time, the way the server will
+    ingest it. Returns (summary, preview_rows) with the first PREVIEW_ROWS valid rows.
+    """
+    try:
+        header = pd.read_csv(filepath, nrows=0).columns
+    except (OSError, EOFError, ValueError) as e:
+        raise CSVPreviewError(f'Could not read file: {e}')
+    if any(col not in header for col in REQUIRED_COLUMNS):
+        raise CSVPreviewError(f'CSV must contain columns: {", ".join(REQUIRED_COLUMNS)}')
+    
+    try:
+        return summarize_chunks(read_csv_chunks(filepath))
+    except CSVPreviewError:
+        raise
+    except ValueError:
+        # A numeric column holds text: coerce bad values to NaN, as the server does
+        return summarize_chunks(read_csv_chunks(filepath, coerce=True))
+
+def summarize_chunks(chunks):
+    rows_read = 0
+    total_count = 0
+    sums = pd.Series(0.0, index=NUMERIC_COLUMNS)
+    type_counts = pd.Series(dtype='int64')
+    preview_rows = []
+    for chunk in chunks:
+        rows_read += len(chunk)
+        for col in NUMERIC_COLUMNS:
+            if chunk[col].dtype != 'float64':
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+        chunk = chunk.dropna()
+        total_count += len(chunk)
+        sums += chunk[NUMERIC_COLUMNS].sum()
+        type_counts = type_counts.add(chunk['Type'].value_counts(), fill_value=0)
+        if len(preview_rows) < PREVIEW_ROWS:
+            head = chunk.head(PREVIEW_ROWS - len(preview_rows))
+            preview_rows.extend(zip(head['Equipment Name'], head['Type'].astype(str), head['Flowrate'],
+                                    head['Pressure'], head['Temperature']))
+    
+    if not total_count:
+        raise CSVPreviewError('CSV contains no valid rows')
+    averages = sums / total_count
+    summary = {
+        'total_count': total_count,
+        'avg_flowrate': round(averages['Flowrate'], 2),
+        'avg_pressure': round(averages['Pressure'], 2),
+        'avg_temperature': round(averages['Temperature'], 2),
+        'type_distribution': {str(name): int(count) for name, count in type_counts.items() if count},
+        'dropped_rows': rows_read - total_count,
+    }
+    return summary, preview_rows
+
+class ApiClient:
+    """One keep-alive requests.Session shared by the whole app (requests' pool is thread-safe)."""
+    
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def set_token(self, token):
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+        else:
+            self.session.headers.pop('Authorization', None)
+    
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        url = path if path.startswith('http') else f'{API_BASE_URL}{path}'
+        return self.session.request(method, url, **kwargs)
+    
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+    
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+    
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+    
+    def get_json(self, path, params=None):
+        response = self.get(path, params=params)
+        if response.status_code != 200:
+            raise ApiError(response.text)
+        return response.json()
+    
+    def get_json_with_etag(self, path, params=None):
+        response = self.get(path, params=params)
+        if response.status_code != 200:
+            raise ApiError(response.text)
+        return response.json(), response.headers.get('ETag')
+    
+    def not_modified(self, path, params, etag):
+        """True if the server confirms etag is still current (304)."""
+        response = self.get(path, params=params, headers={'If-None-Match': etag})
+        return response.status_code == 304
+    
+    def post_json(self, path, data, expected=(200, 201)):
+        response = self.post(path, json=data)
+        if response.status_code not in expected:
+            raise ApiError(response.text)
+        return response.json()
+    
+    def download_report(self, path, data):
+        """POST a report request and return the file body, polling while the server is still rendering."""
+        response = self.post(path, json=data)
+        while response.status_code == 202:
+            time.sleep(REPORT_POLL_INTERVAL)
+            response = self.get(urljoin(API_BASE_URL, response.json()['status_url']))
+        if response.status_code != 200:
+            raise ApiError(response.text)
+        return response.content
+
+class DatasetCache:
+    """
+    Viewed datasets kept as one SQLite file per upload under the user's cache directory.
+    
+    A dataset only changes on the server when a delta upload is merged into it (which
+    also changes its ETag and is pushed as upload.updated), so a cached dataset opens
+    without any network call and is revalidated against its ETag in the background. File mtimes record use;
+    the least recently used files are deleted once the total passes max_bytes.
+    """
+    
+    def __init__(self, directory=None, max_bytes=DATASET_CACHE_MAX_BYTES):
+        if directory is None:
+            base = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
+            # Upload ids are only unique per server
+            server = urlsplit(API_BASE_URL).netloc.replace(':', '_')
+            directory = os.path.join(base, 'chemical-equipment-visualizer', server)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+    
+    def path(self, upload_id):
+        return os.path.join(self.directory, f'{upload_id}.sqlite3')
+    
+    def get(self, upload_id):
+        """Return {'etag', 'summary', 'rows'} for a cached upload (marking it used), or None."""
+        path = self.path(upload_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with sqlite3.connect(path) as conn:
+                meta = dict(conn.execute('SELECT key, value FROM meta'))
+            os.utime(path)
+        except (sqlite3.Error, OSError):
+            self.discard(upload_id)
+            return None
+        if 'stale' in meta:
+            self.discard(upload_id)
+            return None
+        return {'etag': meta['etag'], 'summary': json.loads(meta['summary']), 'rows': int(meta['rows'])}
+    
+    def rows(self, upload_id, ordering=None):
+        """Return (cursor, row count) for a cached dataset, in upload order or by an API ordering key."""
+        order = 'rowid'
+        if ordering:
+            key = ordering.lstrip('-')
+            if key not in EQUIPMENT_ORDERING:
+                raise ValueError(f'Unknown ordering: {ordering}')
+            direction = 'DESC' if ordering.startswith('-') else 'ASC'
+            order = f'{key} {direction}, rowid {direction}'
+        conn = sqlite3.connect(self.path(upload_id))
+        total = int(conn.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()[0])
+        return conn.execute(f'SELECT name, type, flowrate, pressure, temperature FROM equipment ORDER BY {order}'), total
+    
+    def download(self, api, upload_id, summary, etag):
+        """Stream an upload's CSV export into the cache; runs on a worker thread."""
+        path = self.path(upload_id)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        response = api.get('/export-csv/', params={'upload_id': upload_id}, stream=True)
+        if response.status_code != 200:
+            raise ApiError(response.text)
+        try:
+            response.raw.decode_content = True
+            reader = csv.reader(io.TextIOWrapper(response.raw, encoding='utf-8', newline=''))
+            next(reader)
+            conn = sqlite3.connect(tmp)
+            try:
+                conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+                conn.execute('CREATE TABLE equipment (name TEXT, type TEXT, flowrate REAL, pressure REAL, temperature REAL)')
+                rows = 0
+                while True:
+                    batch = list(islice(reader, DATASET_CACHE_BATCH))
+                    if not batch:
+                        break
+                    conn.executemany('INSERT INTO equipment VALUES (?, ?, ?, ?, ?)', batch)
+                    rows += len(batch)
+                conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+                    ('etag', etag), ('summary', json.dumps(summary)), ('rows', str(rows)),
+                ])
+                conn.commit()
+            finally:
+                conn.close()
+            # Readers only ever see a complete file
+            os.replace(tmp, path)
+        finally:
+            response.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict(keep=path)
+    
+    def discard(self, upload_id):
+        path = self.path(upload_id)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # Still open (Windows): mark it so get() never serves it; a later discard deletes it
+            try:
+                with sqlite3.connect(path) as conn:
+                    conn.execute("INSERT OR REPLACE INTO meta VALUES ('stale', '1')")
+            except sqlite3.Error:
+                pass
+    
+    def evict(self, keep=None):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.sqlite3'):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                # Still open (Windows) - try again after the next download
+                pass
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object)
+    error = pyqtSignal(object)
+
+class ApiTask(QRunnable):
+    """Runs fn(*args) on a QThreadPool worker; the result or exception is delivered as a signal."""
+    
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = TaskSignals()
+    
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.error.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+class EquipmentTableModel(QAbstractTableModel):
+    """
+    Equipment rows stored as column arrays and fetched a page at a time as the view
+    scrolls. Types are kept as codes into a small list of names.
+    """
+    loaded = pyqtSignal(int, int)
+    
+    def __init__(self, api, run_task, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.run_task = run_task
+        self.upload_id = None
+        self.ordering = None
+        self.generation = 0
+        self.cache = None
+        self.cursor = None
+        self.clear()
+    
+    def clear(self):
+        if self.cursor is not None:
+            self.cursor.connection.close()
+            self.cursor = None
+        self.names = []
+        self.type_names = []
+        self.type_codes = {}
+        self.types = array('H')
+        self.numbers = [array('d'), array('d'), array('d')]
+        self.total = 0
+        self.next_page = None
+        self.fetching = False
+    
+    def load(self, upload_id, ordering=None, cache=None):
+        """Show an upload, paging from the API or, when cache is given, from its cached copy."""
+        self.beginResetModel()
+        self.generation += 1
+        self.upload_id = upload_id
+        self.ordering = ordering
+        self.clear()
+        self.cache = cache
+        if cache is not None:
+            self.cursor, self.total = cache.rows(upload_id, ordering)
+        self.next_page = 1
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+    
+    def release_cache(self, upload_id):
+        """Stop paging from the cached copy of an upload, so the file can be deleted."""
+        if self.cursor is not None and self.upload_id == upload_id:
+            self.cursor.connection.close()
+            self.cursor = None
+            self.next_page = None
+    
+    def load_rows(self, rows, total):
+        """Show rows that are not (yet) on the server, e.g. a local preview."""
+        self.beginResetModel()
+        self.generation += 1
+        self.upload_id = None
+        self.ordering = None
+        self.clear()
+        self.cache = None
+        self.total = total
+        self.endResetModel()
+        self.append_rows(rows)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(EQUIPMENT_COLUMNS)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.TextAlignmentRole):
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter) if column >= 2 else None
+        if column == 0:
+            return self.names[row]
+        if column == 1:
+            return self.type_names[self.types[row]]
+        return str(self.numbers[column - 2][row])
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return EQUIPMENT_COLUMNS[section]
+        return super().headerData(section, orientation, role)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.next_page is not None and not self.fetching
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        if self.cursor is not None:
+            # Local pages are cheap enough to read on the GUI thread
+            rows = self.cursor.fetchmany(EQUIPMENT_PAGE_SIZE)
+            self.next_page = self.next_page + 1 if len(rows) == EQUIPMENT_PAGE_SIZE else None
+            self.append_rows(rows)
+            return
+        self.fetching = True
+        generation = self.generation
+        params = {'upload_id': self.upload_id, 'page': self.next_page, 'page_size': EQUIPMENT_PAGE_SIZE}
+        if self.ordering:
+            params['ordering'] = self.ordering
+        self.run_task(self.api.get_json, '/equipment/', params,
+                      on_done=lambda page: self.append_page(generation, page),
+                      on_error=lambda e: self.fetch_failed(generation, e))
+    
+    def append_page(self, generation, page):
+        # Pages requested before a reload or re-sort belong to a different result set
+        if generation != self.generation:
+            return
+        self.fetching = False
+        self.next_page = self.next_page + 1 if page['next'] else None
+        self.total = page['count']
+        self.append_rows([
+            (equipment['equipment_name'], equipment['equipment_type'],
+             equipment['flowrate'], equipment['pressure'], equipment['temperature'])
+            for equipment in page['results']
+        ])
+    
+    def append_rows(self, rows):
+        if rows:
+            start = len(self.names)
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            for name, type_name, flowrate, pressure, temperature in rows:
+                code = self.type_codes.get(type_name)
+                if code is None:
+                    code = self.type_codes[type_name] = len(self.type_names)
+                    self.type_names.append(type_name)
+                self.names.append(name)
+                self.types.append(code)
+                self.numbers[0].append(flowrate)
+                self.numbers[1].append(pressure)
+                self.numbers[2].append(temperature)
+            self.endInsertRows()
+        self.loaded.emit(len(self.names), self.total)
+    
+    def fetch_failed(self, generation, error):
+        if generation == self.generation:
+            self.fetching = False
+            self.next_page = None
+        print(f"Error loading equipment data: {error}")
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self.upload_id is None:
+            return
+        if column < 0:
+            self.load(self.upload_id, cache=self.cache)
+            return
+        key = EQUIPMENT_ORDERING[column]
+        self.load(self.upload_id, key if order == Qt.AscendingOrder else f'-{key}', cache=self.cache)
+    
+    def row_text(self, row):
+        return self.names[row], self.type_names[self.types[row]]
+
+class EquipmentFilterProxy(QSortFilterProxyModel):
+    """Filters the loaded rows by name or type, reading the source arrays in place."""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.text = ''
+    
+    def set_text(self, text):
+        self.text = text.strip().lower()
+        self.invalidateFilter()
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.text:
+            return True
+        name, type_name = self.sourceModel().row_text(source_row)
+        return self.text in name.lower() or self.text in type_name.lower()
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Only part of the data is loaded, so let the server sort and keep its order here
+        self.sourceModel().sort(column, order)
 
 class UploadThread(QThread):
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
     
-    def __init__(self, filepath, token):
+    def __init__(self, filepath, api, token):
         super().__init__()
         self.filepath = filepath
+        self.api = api
         self.token = token
+        self.read_lock = threading.Lock()
+    
+    def compress(self):
+        # Gzip plain CSVs into a temp file before sending; already-compressed files go as-is.
+        # mtime=0 keeps the output byte-identical between runs so a resumed session still matches.
+        filename = self.filepath.replace('\\', '/').split('/')[-1]
+        if filename.lower().endswith(COMPRESSED_EXTENSIONS):
+            return filename, open(self.filepath, 'rb')
+        
+        tmp = tempfile.TemporaryFile()
+        with open(self.filepath, 'rb') as src, \
+                gzip.GzipFile(fileobj=tmp, mode='wb', compresslevel=6, mtime=0) as gz:
+            shutil.copyfileobj(src, gz, 1024 * 1024)
+        tmp.seek(0)
+        return f'{filename}.gz', tmp
+    
+    def resume_key(self):
+        stat = os.stat(self.filepath)
+        source = f'{os.path.abspath(self.filepath)}|{stat.st_size}|{stat.st_mtime_ns}|{self.token}'
+        return 'upload_sessions/' + hashlib.sha256(source.encode()).hexdigest()
+    
+    def open_session(self, filename, total_size):
+        settings = QSettings('ChemicalEquipmentVisualizer', 'Desktop')
+        key = self.resume_key()
+        session_id = settings.value(key)
+        if session_id:
+            response = self.api.get(f'/upload/sessions/{session_id}/')
+            if response.status_code == 200 and response.json()['total_size'] == total_size:
+                return key, response.json()
+        
+        response = self.api.post('/upload/sessions/',
+                                 json={'filename': filename, 'total_size': total_size,
+                                       'chunk_size': UPLOAD_CHUNK_SIZE})
+        if response.status_code != 201:
+            raise RuntimeError(response.text)
+        session = response.json()
+        settings.setValue(key, session['upload_session_id'])
+        return key, session
+    
+    def send_chunk(self, f, session, index):
+        with self.read_lock:
+            f.seek(index * session['chunk_size'])
+            body = f.read(session['chunk_size'])
+        headers = {'X-Chunk-SHA256': hashlib.sha256(body).hexdigest()}
+        path = f"/upload/sessions/{session['upload_session_id']}/chunks/{index}/"
+        
+        for attempt in range(UPLOAD_CHUNK_RETRIES):
+            try:
+                response = self.api.put(path, data=body, headers=headers)
+                if response.status_code == 200:
+                    return
+                error = response.text
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < UPLOAD_CHUNK_RETRIES - 1:
+                time.sleep(2 ** attempt)
+        raise RuntimeError(f'Chunk {index} failed: {error}')
     
     def run(self):
         try:
-            with open(self.filepath, 'rb') as f:
-                files = {'file': f}
-                headers = {}
-                if self.token:
-                    headers['Authorization'] = f'Token {self.token}'
+            filename, f = self.compress()
+            with f:
+                total_size = f.seek(0, os.SEEK_END)
+                key, session = self.open_session(filename, total_size)
+                
+                received = set(session['received_chunks'])
+                pending = [i for i in range(session['total_chunks']) if i not in received]
+                done = len(received)
+                self.progress.emit(done, session['total_chunks'])
+                
+                with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+                    futures = [pool.submit(self.send_chunk, f, session, i) for i in pending]
+                    for future in as_completed(futures):
+                        future.result()
+                        done += 1
+                        self.progress.emit(done, session['total_chunks'])
                 
-                response = requests.post(f'{API_BASE_URL}/upload/', 
-                                       files=files, headers=headers)
+                # Ingesting a large file can take minutes, so only the connect is time-limited
+                response = self.api.post(f"/upload/sessions/{session['upload_session_id']}/finalize/",
+                                         timeout=(HTTP_TIMEOUT, None))
                 
+                # Finalize consumes the session unless the server failed (5xx), which
+                # leaves the chunks in place so the next attempt goes straight to finalize
+                if response.status_code < 500:
+                    QSettings('ChemicalEquipmentVisualizer', 'Desktop').remove(key)
                 if response.status_code in [200, 201]:
                     self.finished.emit(response.json())
                 else:
@@ -41,6 +618,137 @@ class UploadThread(QThread):
         except Exception as e:
             self.error.emit(str(e))
 
+def folder_batches(paths):
+    """Group files into batch requests of at most FOLDER_IMPORT_BATCH_FILES files / _BYTES bytes."""
+    batch, size = [], 0
+    for path in paths:
+        file_size = os.path.getsize(path)
+        if batch and (len(batch) == FOLDER_IMPORT_BATCH_FILES or size + file_size > FOLDER_IMPORT_BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(path)
+        size += file_size
+    if batch:
+        yield batch
+
+class FolderImportThread(QThread):
+    """
+    Imports many files through /upload/batch/, several batches in flight at once; the
+    server ingests the files of each batch in parallel.
+    """
+    finished = pyqtSignal(list)
+    progress = pyqtSignal(int, int)
+    
+    def __init__(self, paths, api):
+        super().__init__()
+        self.paths = paths
+        self.api = api
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def send_batch(self, paths):
+        names = [os.path.basename(path) for path in paths]
+        if self.cancelled:
+            return [{'filename': name, 'error': 'Cancelled'} for name in names]
+        handles = [open(path, 'rb') for path in paths]
+        try:
+            response = self.api.post('/upload/batch/', files=[('files', (name, f)) for name, f in zip(names, handles)],
+                                     timeout=(HTTP_TIMEOUT, None))
+        except requests.RequestException as e:
+            return [{'filename': name, 'error': str(e)} for name in names]
+        finally:
+            for f in handles:
+                f.close()
+        try:
+            return response.json()['files']
+        except (ValueError, KeyError):
+            return [{'filename': name, 'error': response.text} for name in names]
+    
+    def run(self):
+        results = []
+        self.progress.emit(0, len(self.paths))
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            futures = [pool.submit(self.send_batch, batch) for batch in folder_batches(self.paths)]
+            for future in as_completed(futures):
+                results.extend(future.result())
+                self.progress.emit(len(results), len(self.paths))
+        self.finished.emit(results)
+
+class EventStreamThread(QThread):
+    """
+    Listens to the server's event stream (/events/) and re-emits each event on the GUI
+    thread, reconnecting with Last-Event-ID so nothing published meanwhile is missed.
+    Gives up, emitting connected(False), when the server has no stream (WSGI deployments).
+    """
+    event = pyqtSignal(str, dict)
+    connected = pyqtSignal(bool)
+    
+    def __init__(self, api):
+        super().__init__()
+        self.api = api
+        self.stopped = False
+        self.wake = threading.Event()
+        self.response = None
+        self.last_event_id = None
+    
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        response = self.response
+        connection = getattr(response.raw, 'connection', None) if response is not None else None
+        if connection is not None and connection.sock is not None:
+            # Closing the response would wait for the blocked read to return; shutting
+            # the socket down ends that read at once
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def listen(self):
+        headers = {'Accept': 'text/event-stream'}
+        if self.last_event_id:
+            headers['Last-Event-ID'] = self.last_event_id
+        self.response = self.api.get('/events/', headers=headers, stream=True,
+                                     timeout=(HTTP_TIMEOUT, EVENT_READ_TIMEOUT))
+        try:
+            if self.response.status_code != 200:
+                return self.response.status_code
+            self.connected.emit(True)
+            kind, data = None, []
+            for line in self.response.iter_lines(decode_unicode=True):
+                if self.stopped:
+                    break
+                if line.startswith('id:'):
+                    self.last_event_id = line[3:].strip()
+                elif line.startswith('event:'):
+                    kind = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].strip())
+                elif not line and kind:
+                    self.event.emit(kind, json.loads('\n'.join(data)))
+                    kind, data = None, []
+                elif not line:
+                    data = []
+            return 200
+        finally:
+            self.response.close()
+            self.response = None
+    
+    def run(self):
+        while not self.stopped:
+            try:
+                status_code = self.listen()
+            except (requests.RequestException, ValueError):
+                status_code = None
+            if status_code in (401, 404, 501):
+                break
+            if not self.stopped:
+                self.connected.emit(False)
+                self.wake.wait(EVENT_RETRY_SECONDS)
+        self.connected.emit(False)
+
 class ChartCanvas(FigureCanvas):
     def __init__(self, parent=None):
         fig = Figure(figsize=(6, 4))
@@ -48,13 +756,180 @@ class ChartCanvas(FigureCanvas):
         super().__init__(fig)
         self.setParent(parent)
 
+class PieChartCanvas(ChartCanvas):
+    """Type distribution pie whose wedges and labels are reused (hidden when unused) between datasets."""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.axes.set_aspect('equal')
+        self.axes.set_xlim(-1.4, 1.4)
+        self.axes.set_ylim(-1.2, 1.2)
+        self.axes.axis('off')
+        self.axes.set_title('Equipment Type Distribution')
+        self.colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        self.wedges = []
+        self.labels = []
+        self.percents = []
+    
+    def update_data(self, distribution):
+        total = sum(distribution.values())
+        while len(self.wedges) < len(distribution):
+            i = len(self.wedges)
+            self.wedges.append(self.axes.add_patch(Wedge((0, 0), 1, 0, 0, facecolor=self.colors[i % len(self.colors)])))
+            self.labels.append(self.axes.text(0, 0, '', va='center'))
+            self.percents.append(self.axes.text(0, 0, '', ha='center', va='center'))
+        
+        theta = 0
+        for i, wedge in enumerate(self.wedges):
+            visible = i < len(distribution) and total > 0
+            for artist in (wedge, self.labels[i], self.percents[i]):
+                artist.set_visible(visible)
+            if not visible:
+                continue
+            name, value = list(distribution.items())[i]
+            span = 360 * value / total
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+            mid = np.radians(theta + span / 2)
+            self.labels[i].set_text(name)
+            self.labels[i].set_position((1.1 * np.cos(mid), 1.1 * np.sin(mid)))
+            self.labels[i].set_horizontalalignment('left' if np.cos(mid) >= 0 else 'right')
+            self.percents[i].set_text(f'{100 * value / total:.1f}%')
+            self.percents[i].set_position((0.6 * np.cos(mid), 0.6 * np.sin(mid)))
+            theta += span
+        self.draw_idle()
+
+class BarChartCanvas(ChartCanvas):
+    """Average parameters as a fixed set of bars whose heights are updated in place."""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bars = self.axes.bar(['Flowrate', 'Pressure', 'Temperature'], [0, 0, 0],
+                                  color=['#4bc0c0', '#ff9f40', '#9966ff'])
+        self.axes.set_title('Average Parameters')
+        self.axes.set_ylabel('Value')
+    
+    def update_data(self, values):
+        for bar, value in zip(self.bars, values):
+            bar.set_height(value)
+        low, high = min(0, *values), max(0, *values)
+        margin = (high - low) * 0.1 or 1
+        self.axes.set_ylim(low - margin if low < 0 else 0, high + margin)
+        self.draw_idle()
+
+def downsample(values, width):
+    """
+    Reduce a series to the min and max of each pixel column, which covers the same pixels
+    as the full series (spikes included). Returns (x, lows, highs), or None if the series
+    already has no more than two points per column.
+    """
+    n = len(values)
+    if n <= 2 * width:
+        return None
+    edges = np.linspace(0, n, width + 1).astype(np.intp)[:-1]
+    return edges, np.minimum.reduceat(values, edges), np.maximum.reduceat(values, edges)
+
+class SeriesChartCanvas(ChartCanvas):
+    """
+    One parameter across the loaded equipment rows. Long series are drawn as their
+    min/max envelope (a single polygon) rather than a line through every point. Both
+    artists are animated and blitted over a cached background, so appending a page only
+    redraws the series; the whole figure is redrawn only when the axis limits grow.
+    """
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.axes.set_xlabel('Row')
+        (self.line,) = self.axes.plot([], [], linewidth=0.8, animated=True)
+        # A thin edge keeps flat stretches (min == max) visible
+        self.band = self.axes.add_patch(Polygon(np.zeros((1, 2)), closed=True, animated=True, visible=False,
+                                                color=self.line.get_color(), linewidth=0.5))
+        self.background = None
+        self.empty = True
+        self.mpl_connect('draw_event', self.on_draw)
+    
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.draw_series()
+    
+    def draw_series(self):
+        self.axes.draw_artist(self.band)
+        self.axes.draw_artist(self.line)
+    
+    def reset(self, title):
+        self.line.set_data([], [])
+        self.band.set_visible(False)
+        self.axes.set_title(title)
+        self.axes.set_xlim(0, 1)
+        self.axes.set_ylim(0, 1)
+        self.empty = True
+        self.draw_idle()
+    
+    def update_data(self, values, total):
+        if not len(values):
+            return
+        values = np.frombuffer(values, dtype=np.float64)
+        reduced = downsample(values, max(int(self.axes.bbox.width), 1))
+        if reduced is None:
+            # Copy: the model's array('d') cannot grow while a view of it is alive
+            self.line.set_data(np.arange(len(values)), np.array(values))
+            low, high = float(values.min()), float(values.max())
+        else:
+            x, lows, highs = reduced
+            self.band.set_xy(np.concatenate((np.column_stack((x, highs)), np.column_stack((x[::-1], lows[::-1])))))
+            low, high = float(lows.min()), float(highs.max())
+        self.line.set_visible(reduced is None)
+        self.band.set_visible(reduced is not None)
+        
+        y_min, y_max = self.axes.get_ylim()
+        if self.empty or low < y_min or high > y_max or self.axes.get_xlim()[1] != max(total, 1):
+            margin = (high - low) * 0.05 or 1
+            self.axes.set_xlim(0, max(total, 1))
+            self.axes.set_ylim(low - margin if self.empty else min(low - margin, y_min),
+                               high + margin if self.empty else max(high + margin, y_max))
+            self.empty = False
+            self.draw_idle()
+        elif self.background is not None:
+            self.restore_region(self.background)
+            self.draw_series()
+            self.blit(self.axes.bbox)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.token = None
         self.current_upload_id = None
+        self.preview_state = None
+        self.upload_pending = False
+        self.api = ApiClient()
+        self.dataset_cache = DatasetCache()
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(NETWORK_WORKERS)
+        self.tasks = set()
+        self.load_generation = 0
+        self.events_thread = None
+        self.events_live = False
+        self.history_timer = QTimer(self)
+        self.history_timer.setSingleShot(True)
+        self.history_timer.setInterval(HISTORY_REFRESH_DELAY_MS)
+        self.history_timer.timeout.connect(self.load_history)
         self.initUI()
     
+    def run_task(self, fn, *args, on_done, on_error=None):
+        """Run a network call on the thread pool; on_done/on_error are called on the GUI thread."""
+        task = ApiTask(fn, *args)
+        task.setAutoDelete(False)
+        # Keep the task (and its signals object) alive until its result is delivered
+        self.tasks.add(task)
+        task.signals.finished.connect(lambda _: self.tasks.discard(task))
+        task.signals.error.connect(lambda _: self.tasks.discard(task))
+        task.signals.finished.connect(on_done)
+        task.signals.error.connect(on_error or self.show_error)
+        self.thread_pool.start(task)
+    
+    def show_error(self, error):
+        QMessageBox.critical(self, 'Error', str(error))
+    
     def initUI(self):
         self.setWindowTitle('Chemical Equipment Visualizer')
         self.setGeometry(100, 100, 1200, 800)
@@ -107,33 +982,63 @@ class MainWindow(QMainWindow):
         username = self.username_input.text()
         password = self.password_input.text()
         
-        try:
-            response = requests.post(f'{API_BASE_URL}/auth/login/', 
-                                   json={'username': username, 'password': password})
-            if response.status_code == 200:
-                data = response.json()
-                self.token = data['token']
-                self.show_main_screen()
-            else:
-                QMessageBox.warning(self, 'Error', 'Invalid credentials')
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        self.run_task(self.api.post_json, '/auth/login/', {'username': username, 'password': password}, (200,),
+                      on_done=self.logged_in,
+                      on_error=lambda e: self.auth_failed(e, 'Invalid credentials'))
     
     def handle_register(self):
         username = self.username_input.text()
         password = self.password_input.text()
         
-        try:
-            response = requests.post(f'{API_BASE_URL}/auth/register/', 
-                                   json={'username': username, 'password': password})
-            if response.status_code == 201:
-                data = response.json()
-                self.token = data['token']
-                self.show_main_screen()
-            else:
-                QMessageBox.warning(self, 'Error', 'Registration failed')
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        self.run_task(self.api.post_json, '/auth/register/', {'username': username, 'password': password}, (201,),
+                      on_done=self.logged_in,
+                      on_error=lambda e: self.auth_failed(e, 'Registration failed'))
+    
+    def logged_in(self, data):
+        self.token = data['token']
+        self.api.set_token(self.token)
+        self.show_main_screen()
+        self.start_events()
+    
+    def start_events(self):
+        self.events_thread = EventStreamThread(self.api)
+        self.events_thread.event.connect(self.server_event)
+        self.events_thread.connected.connect(self.events_connected)
+        self.events_thread.start()
+    
+    def stop_events(self):
+        thread, self.events_thread = self.events_thread, None
+        self.events_live = False
+        if thread is not None and not thread.isFinished():
+            thread.stop()
+            # Keep it referenced until it has wound down (it may be mid-connect)
+            self.tasks.add(thread)
+            thread.finished.connect(lambda: self.tasks.discard(thread))
+        return thread
+    
+    def events_connected(self, live):
+        # Ignore a stopped stream from before a logout
+        if self.sender() is self.events_thread:
+            self.events_live = live
+    
+    def server_event(self, kind, data):
+        """Apply a change pushed by the server, made from this or any other client."""
+        if self.sender() is not self.events_thread:
+            return
+        if kind == 'history.pruned':
+            for upload_id in data['upload_ids']:
+                self.dataset_cache.discard(upload_id)
+        if kind == 'upload.updated':
+            self.dataset_cache.discard(data['upload_id'])
+        if kind in ('upload.created', 'upload.updated', 'history.pruned'):
+            # A folder import sends one event per file; refresh once per burst
+            self.history_timer.start()
+    
+    def auth_failed(self, error, message):
+        if isinstance(error, ApiError):
+            QMessageBox.warning(self, 'Error', message)
+        else:
+            QMessageBox.critical(self, 'Error', str(error))
     
     def show_main_screen(self):
         self.clear_layout()
@@ -178,8 +1083,11 @@ class MainWindow(QMainWindow):
         select_btn.clicked.connect(self.select_file)
         upload_btn = QPushButton('Upload')
         upload_btn.clicked.connect(self.upload_file)
+        import_btn = QPushButton('Import Folder')
+        import_btn.clicked.connect(self.import_folder)
         btn_layout.addWidget(select_btn)
         btn_layout.addWidget(upload_btn)
+        btn_layout.addWidget(import_btn)
         upload_layout.addLayout(btn_layout)
         
         upload_group.setLayout(upload_layout)
@@ -211,88 +1119,228 @@ class MainWindow(QMainWindow):
         widget = QWidget()
         layout = QVBoxLayout(widget)
         
-        self.data_table = QTableWidget()
+        self.table_filter = QLineEdit()
+        self.table_filter.setPlaceholderText('Filter by name or type')
+        layout.addWidget(self.table_filter)
+        
+        self.equipment_model = EquipmentTableModel(self.api, self.run_task, self)
+        self.table_proxy = EquipmentFilterProxy(self)
+        self.table_proxy.setSourceModel(self.equipment_model)
+        self.table_filter.textChanged.connect(self.table_proxy.set_text)
+        
+        self.data_table = QTableView()
+        self.data_table.setModel(self.table_proxy)
+        self.data_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.data_table.setSortingEnabled(True)
+        # Size columns from the first rows instead of measuring every loaded row
+        self.data_table.horizontalHeader().setResizeContentsPrecision(COLUMN_SAMPLE_ROWS)
         layout.addWidget(self.data_table)
         
+        self.table_status = QLabel()
+        layout.addWidget(self.table_status)
+        self.table_sized = False
+        self.equipment_model.loaded.connect(self.table_loaded)
+        
         return widget
     
     def create_charts_tab(self):
         widget = QWidget()
         layout = QVBoxLayout(widget)
         
-        self.pie_canvas = ChartCanvas(widget)
-        self.bar_canvas = ChartCanvas(widget)
+        self.pie_canvas = PieChartCanvas(widget)
+        self.bar_canvas = BarChartCanvas(widget)
+        self.series_canvas = SeriesChartCanvas(widget)
         
         layout.addWidget(QLabel('Equipment Type Distribution'))
         layout.addWidget(self.pie_canvas)
         layout.addWidget(QLabel('Average Parameters'))
         layout.addWidget(self.bar_canvas)
         
+        self.series_picker = QComboBox()
+        self.series_picker.addItems(['Flowrate', 'Pressure', 'Temperature'])
+        self.series_picker.currentIndexChanged.connect(self.reset_series)
+        layout.addWidget(self.series_picker)
+        layout.addWidget(self.series_canvas)
+        # Follows the data table: rows are plotted as their pages load
+        self.equipment_model.modelReset.connect(self.reset_series)
+        self.equipment_model.loaded.connect(self.plot_series)
+        self.reset_series()
+        
         return widget
     
     def select_file(self):
-        filename, _ = QFileDialog.getOpenFileName(self, 'Select CSV File', '', 'CSV Files (*.csv)')
+        filename, _ = QFileDialog.getOpenFileName(self, 'Select CSV File', '',
+                                                  'CSV Files (*.csv *.csv.gz *.gz *.zip *.bz2)')
         if filename:
             self.selected_file = filename
             self.file_label.setText(filename.split('/')[-1].split('\\')[-1])
+            self.preview_file(filename)
+    
+    def preview_file(self, filename):
+        # Parsed locally first so the data shows and column errors surface before any upload
+        self.preview_state = 'running'
+        self.upload_pending = False
+        self.load_generation += 1
+        generation = self.load_generation
+        self.current_upload_id = None
+        self.run_task(preview_csv, filename,
+                      on_done=lambda result: self.preview_ready(filename, generation, *result),
+                      on_error=lambda e: self.preview_failed(filename, e))
+    
+    def preview_ready(self, filename, generation, summary, rows):
+        if filename != self.selected_file:
+            return
+        self.preview_state = 'ok'
+        if self.is_current(generation):
+            self.display_summary(summary)
+            self.load_preview_rows(rows, summary['total_count'])
+        if self.upload_pending:
+            self.start_upload()
+        else:
+            self.file_label.setText(f'{os.path.basename(filename)} - local preview, '
+                                    f'{summary["total_count"]} rows ({summary["dropped_rows"]} dropped), not uploaded')
+    
+    def preview_failed(self, filename, error):
+        if filename != self.selected_file:
+            return
+        self.preview_state = 'failed'
+        self.upload_pending = False
+        QMessageBox.warning(self, 'Invalid file', str(error))
+    
+    def load_preview_rows(self, rows, total):
+        self.reset_table_view()
+        self.equipment_model.load_rows(rows, total)
     
     def upload_file(self):
         if not hasattr(self, 'selected_file'):
             QMessageBox.warning(self, 'Warning', 'Please select a file first')
             return
-        
-        self.upload_thread = UploadThread(self.selected_file, self.token)
+        if self.preview_state == 'failed':
+            QMessageBox.warning(self, 'Invalid file', 'Fix the file or select another one before uploading')
+            return
+        if self.preview_state == 'running':
+            # Starts as soon as the local validation passes
+            self.upload_pending = True
+            self.file_label.setText(f'{os.path.basename(self.selected_file)} - checking before upload...')
+            return
+        self.start_upload()
+    
+    def start_upload(self):
+        self.upload_pending = False
+        self.upload_thread = UploadThread(self.selected_file, self.api, self.token)
         self.upload_thread.finished.connect(self.upload_finished)
         self.upload_thread.error.connect(self.upload_error)
+        self.upload_thread.progress.connect(self.upload_progress)
         self.upload_thread.start()
     
     def upload_finished(self, data):
+        # The server's summary replaces the local preview
+        self.load_generation += 1
         self.current_upload_id = data['upload_id']
         QMessageBox.information(self, 'Success', 'File uploaded successfully')
         self.display_summary(data['summary'])
         self.load_equipment_data(data['upload_id'])
-        self.load_history()
+        if not self.events_live:
+            self.load_history()
+    
+    def import_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, 'Select Folder of CSV Files')
+        if not folder:
+            return
+        paths = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.lower().endswith(UPLOAD_EXTENSIONS) and os.path.isfile(os.path.join(folder, name))
+        )
+        if not paths:
+            QMessageBox.warning(self, 'Warning', 'No CSV files in this folder')
+            return
+        
+        self.import_thread = FolderImportThread(paths, self.api)
+        self.import_dialog = QProgressDialog(f'Importing {len(paths)} files...', 'Cancel', 0, len(paths), self)
+        self.import_dialog.setWindowModality(Qt.WindowModal)
+        self.import_dialog.setMinimumDuration(0)
+        self.import_dialog.canceled.connect(self.import_thread.cancel)
+        self.import_thread.progress.connect(self.import_progress)
+        self.import_thread.finished.connect(self.import_finished)
+        self.import_thread.start()
+    
+    def import_progress(self, done, total):
+        self.import_dialog.setValue(done)
+        self.import_dialog.setLabelText(f'Imported {done} of {total} files')
+    
+    def import_finished(self, results):
+        self.import_dialog.reset()
+        failed = [result for result in results if 'upload_id' not in result]
+        message = f'Imported {len(results) - len(failed)} of {len(results)} files'
+        if failed:
+            message += '\n\nFailed:\n' + '\n'.join(f"{r['filename']}: {r['error']}" for r in failed[:10])
+            if len(failed) > 10:
+                message += f'\n... and {len(failed) - 10} more'
+        QMessageBox.information(self, 'Folder Import', message)
+        if not self.events_live:
+            self.load_history()
+    
+    def upload_progress(self, done, total):
+        self.file_label.setText(f'{self.selected_file.split("/")[-1]} - uploading {done}/{total} chunks')
     
     def upload_error(self, error):
         QMessageBox.critical(self, 'Error', f'Upload failed: {error}')
     
     def load_history(self):
-        try:
-            headers = {}
-            if self.token:
-                headers['Authorization'] = f'Token {self.token}'
-            
-            response = requests.get(f'{API_BASE_URL}/history/', headers=headers)
-            if response.status_code == 200:
-                history_data = response.json()
-                self.history_list.clear()
-                for item in history_data:
-                    self.history_list.addItem(
-                        f"{item['filename']} - {item['uploaded_at']} (Count: {item['total_count']})"
-                    )
-                self.history_data = history_data
-        except Exception as e:
-            print(f"Error loading history: {e}")
+        self.run_task(self.api.get_json, '/history/', on_done=self.show_history,
+                      on_error=lambda e: print(f"Error loading history: {e}"))
+    
+    def show_history(self, history_data):
+        self.history_list.clear()
+        for item in history_data:
+            self.history_list.addItem(
+                f"{item['filename']} - {item['uploaded_at']} (Count: {item['total_count']})"
+            )
+        self.history_data = history_data
     
     def load_history_item(self, item):
         index = self.history_list.row(item)
-        upload_id = self.history_data[index]['id']
+        self.open_dataset(self.history_data[index]['id'])
+    
+    def open_dataset(self, upload_id):
         self.current_upload_id = upload_id
+        self.load_generation += 1
+        generation = self.load_generation
         
-        try:
-            headers = {}
-            if self.token:
-                headers['Authorization'] = f'Token {self.token}'
-            
-            response = requests.get(f'{API_BASE_URL}/summary/?upload_id={upload_id}', headers=headers)
-            if response.status_code == 200:
-                summary = response.json()
-                self.display_summary(summary)
-                self.load_equipment_data(upload_id)
-            else:
-                QMessageBox.critical(self, 'Error', f'Failed to load data: {response.text}')
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        cached = self.dataset_cache.get(upload_id)
+        if cached:
+            self.display_summary(cached['summary'])
+            self.load_equipment_data(upload_id, cache=self.dataset_cache)
+            # Revalidate in the background; if the server can't be reached, keep the cached copy
+            self.run_task(self.api.not_modified, '/summary/', {'upload_id': upload_id}, cached['etag'],
+                          on_done=lambda current: current or self.cache_stale(upload_id, generation),
+                          on_error=lambda e: None)
+            return
+        
+        # Summary and equipment are independent, so fetch them in parallel
+        self.run_task(self.api.get_json_with_etag, '/summary/', {'upload_id': upload_id},
+                      on_done=lambda result: self.summary_loaded(upload_id, generation, *result),
+                      on_error=lambda e: self.show_error(f'Failed to load data: {e}'))
+        self.load_equipment_data(upload_id)
+    
+    def summary_loaded(self, upload_id, generation, summary, etag):
+        if self.is_current(generation):
+            self.display_summary(summary)
+        if etag:
+            self.run_task(self.dataset_cache.download, self.api, upload_id, summary, etag,
+                          on_done=lambda _: None,
+                          on_error=lambda e: print(f"Error caching dataset {upload_id}: {e}"))
+    
+    def cache_stale(self, upload_id, generation):
+        # The table may still be reading the file, which Windows won't let us delete
+        self.equipment_model.release_cache(upload_id)
+        self.dataset_cache.discard(upload_id)
+        if self.is_current(generation):
+            self.open_dataset(upload_id)
+    
+    def is_current(self, generation):
+        # Drop responses for a dataset the user has already clicked away from
+        return generation == self.load_generation
     
     def display_summary(self, summary):
         self.clear_form_layout(self.summary_layout)
@@ -306,87 +1354,69 @@ class MainWindow(QMainWindow):
             if 'type_distribution' in summary:
                 self.plot_charts(summary)
     
-    def load_equipment_data(self, upload_id):
-        try:
-            headers = {}
-            if self.token:
-                headers['Authorization'] = f'Token {self.token}'
-            
-            response = requests.get(f'{API_BASE_URL}/equipment/?upload_id={upload_id}', headers=headers)
-            if response.status_code == 200:
-                equipment_data = response.json()
-                self.populate_table(equipment_data)
-            else:
-                print(f"Error: {response.status_code} - {response.text}")
-        except Exception as e:
-            print(f"Error loading equipment data: {e}")
+    def load_equipment_data(self, upload_id, cache=None):
+        self.reset_table_view()
+        self.equipment_model.load(upload_id, cache=cache)
     
-    def populate_table(self, data):
-        if not data:
-            return
-        
-        self.data_table.setRowCount(len(data))
-        self.data_table.setColumnCount(5)
-        self.data_table.setHorizontalHeaderLabels(['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
-        
-        for row, equipment in enumerate(data):
-            self.data_table.setItem(row, 0, QTableWidgetItem(equipment['equipment_name']))
-            self.data_table.setItem(row, 1, QTableWidgetItem(equipment['equipment_type']))
-            self.data_table.setItem(row, 2, QTableWidgetItem(str(equipment['flowrate'])))
-            self.data_table.setItem(row, 3, QTableWidgetItem(str(equipment['pressure'])))
-            self.data_table.setItem(row, 4, QTableWidgetItem(str(equipment['temperature'])))
-        
-        self.data_table.resizeColumnsToContents()
+    def reset_table_view(self):
+        # A new dataset starts in file order; clearing the indicator must not trigger a sort
+        header = self.data_table.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.blockSignals(False)
+        self.table_sized = False
+    
+    def table_loaded(self, rows, total):
+        if rows and not self.table_sized:
+            self.data_table.resizeColumnsToContents()
+            self.table_sized = True
+        self.table_status.setText(f'{rows} of {total} rows loaded')
     
     def plot_charts(self, summary):
-        type_dist = summary.get('type_distribution', {})
-        
-        self.pie_canvas.axes.clear()
-        if type_dist:
-            self.pie_canvas.axes.pie(type_dist.values(), labels=type_dist.keys(), autopct='%1.1f%%')
-            self.pie_canvas.axes.set_title('Equipment Type Distribution')
-        self.pie_canvas.draw()
-        
-        self.bar_canvas.axes.clear()
-        metrics = ['Flowrate', 'Pressure', 'Temperature']
-        values = [summary['avg_flowrate'], summary['avg_pressure'], summary['avg_temperature']]
-        self.bar_canvas.axes.bar(metrics, values, color=['#4bc0c0', '#ff9f40', '#9966ff'])
-        self.bar_canvas.axes.set_title('Average Parameters')
-        self.bar_canvas.axes.set_ylabel('Value')
-        self.bar_canvas.draw()
+        self.pie_canvas.update_data(summary.get('type_distribution', {}))
+        self.bar_canvas.update_data([summary['avg_flowrate'], summary['avg_pressure'], summary['avg_temperature']])
+    
+    def reset_series(self, *args):
+        self.series_canvas.reset(f'{self.series_picker.currentText()} per Equipment')
+        self.plot_series()
+    
+    def plot_series(self, *args):
+        model = self.equipment_model
+        self.series_canvas.update_data(model.numbers[self.series_picker.currentIndex()], model.total)
     
     def generate_pdf(self):
         if not self.current_upload_id:
             QMessageBox.warning(self, 'Warning', 'No data loaded')
             return
         
-        try:
-            headers = {}
-            if self.token:
-                headers['Authorization'] = f'Token {self.token}'
-            
-            response = requests.post(f'{API_BASE_URL}/generate-report/', 
-                                   json={'upload_id': self.current_upload_id},
-                                   headers=headers)
-            
-            if response.status_code == 200:
-                filename, _ = QFileDialog.getSaveFileName(self, 'Save PDF', 
-                                                         f'equipment_report_{self.current_upload_id}.pdf',
-                                                         'PDF Files (*.pdf)')
-                if filename:
-                    with open(filename, 'wb') as f:
-                        f.write(response.content)
-                    QMessageBox.information(self, 'Success', 'PDF saved successfully')
-            else:
-                QMessageBox.critical(self, 'Error', f'Failed to generate PDF: {response.text}')
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        upload_id = self.current_upload_id
+        self.run_task(self.api.download_report, '/generate-report/', {'upload_id': upload_id},
+                      on_done=lambda content: self.save_pdf(upload_id, content),
+                      on_error=lambda e: self.show_error(
+                          f'Failed to generate PDF: {e}' if isinstance(e, ApiError) else e))
+    
+    def save_pdf(self, upload_id, content):
+        filename, _ = QFileDialog.getSaveFileName(self, 'Save PDF', 
+                                                 f'equipment_report_{upload_id}.pdf',
+                                                 'PDF Files (*.pdf)')
+        if filename:
+            with open(filename, 'wb') as f:
+                f.write(content)
+            QMessageBox.information(self, 'Success', 'PDF saved successfully')
     
     def handle_logout(self):
+        self.stop_events()
         self.token = None
+        self.api.set_token(None)
         self.current_upload_id = None
         self.show_login_screen()
     
+    def closeEvent(self, event):
+        thread = self.stop_events()
+        if thread is not None:
+            thread.wait(HTTP_TIMEOUT * 1000)
+        super().closeEvent(event)
+    
     def clear_layout(self):
         while self.layout.count():
             child = self.layout.takeAt(0)
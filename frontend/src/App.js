@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { Chart as ChartJS, ArcElement, Tooltip, Legend, CategoryScale, LinearScale, BarElement } from 'chart.js';
 import { Pie, Bar } from 'react-chartjs-2';
@@ -25,6 +25,7 @@ function App() {
   const [message, setMessage] = useState('');
   const [darkMode, setDarkMode] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
+  const eventsOpen = useRef(false);
 
   useEffect(() => {
     if (token) {
@@ -33,6 +34,68 @@ function App() {
     }
   }, [token]);
 
+  useEffect(() => {
+    // Pushed changes from any client refresh the history list (ASGI servers only; under
+    // WSGI the stream is refused and uploads refresh it themselves)
+    if (!token || typeof EventSource === 'undefined') return;
+    let source = null;
+    let timer = null;
+    let reconnect = null;
+    let closed = false;
+    let lastEventId = null;
+    const refresh = (event) => {
+      lastEventId = event.lastEventId || lastEventId;
+      // A batch upload sends one event per file; refetch once per burst
+      clearTimeout(timer);
+      timer = setTimeout(fetchHistory, 300);
+    };
+    const connect = async () => {
+      let ticket;
+      try {
+        // EventSource cannot send the token as a header, and in the URL it would be logged:
+        // trade it for a single-use ticket for each connection
+        const response = await axios.post(`${API_BASE_URL}/events/ticket/`, null, {
+          headers: { 'Authorization': `Token ${token}` }
+        });
+        ticket = response.data.ticket;
+      } catch (error) {
+        return;
+      }
+      if (closed) return;
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) params.set('last_event_id', lastEventId);
+      source = new EventSource(`${API_BASE_URL}/events/?${params}`);
+      let opened = false;
+      source.onopen = () => {
+        opened = true;
+        eventsOpen.current = true;
+      };
+      source.onerror = () => {
+        eventsOpen.current = false;
+        // The ticket is spent, so reconnect with a new one, but only to a stream that worked
+        source.close();
+        if (opened && !closed) reconnect = setTimeout(connect, 3000);
+      };
+      source.addEventListener('upload.created', refresh);
+      source.addEventListener('upload.updated', refresh);
+      source.addEventListener('history.pruned', refresh);
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      clearTimeout(reconnect);
+      if (source) source.close();
+      eventsOpen.current = false;
+    };
+  }, [token]);
+
+  useEffect(() => {
+    if (!selectedUploadId) return;
+    const timer = setTimeout(() => fetchEquipmentList(selectedUploadId, searchTerm), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
   const handleAuth = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -87,18 +150,21 @@ function App() {
       setSummary(response.data.summary);
       setSelectedUploadId(response.data.upload_id);
       setMessage('File uploaded successfully!');
-      fetchEquipmentList(response.data.upload_id);
-      fetchHistory();
+      fetchEquipmentList(response.data.upload_id, searchTerm);
+      if (!eventsOpen.current) fetchHistory();
     } catch (error) {
       setMessage(error.response?.data?.error || 'Upload failed');
     }
     setLoading(false);
   };
 
-  const fetchEquipmentList = async (uploadId = null) => {
+  const fetchEquipmentList = async (uploadId = null, search = '') => {
     try {
-      const url = uploadId ? `${API_BASE_URL}/equipment/?upload_id=${uploadId}` : `${API_BASE_URL}/equipment/`;
-      const response = await axios.get(url, {
+      const params = {};
+      if (uploadId) params.upload_id = uploadId;
+      if (search) params.search = search;
+      const response = await axios.get(`${API_BASE_URL}/equipment/`, {
+        params,
         headers: token ? { 'Authorization': `Token ${token}` } : {}
       });
       setEquipmentList(response.data);
@@ -132,7 +198,7 @@ function App() {
         type_distribution: response.data.type_distribution
       });
       setSelectedUploadId(uploadId);
-      fetchEquipmentList(uploadId);
+      fetchEquipmentList(uploadId, searchTerm);
     } catch (error) {
       setMessage('Error loading history data');
     }
@@ -274,7 +340,7 @@ function App() {
         <section className="upload-section">
           <h2>Upload CSV File</h2>
           <form onSubmit={handleUpload}>
-            <input type="file" accept=".csv" onChange={handleFileChange} />
+            <input type="file" accept=".csv,.gz,.zip,.bz2" onChange={handleFileChange} />
             <button type="submit" disabled={loading}>
               {loading ? 'Uploading...' : 'Upload'}
             </button>
@@ -373,10 +439,6 @@ function App() {
                   </thead>
                   <tbody>
                     {equipmentList
-                      .filter(eq => 
-                        eq.equipment_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                        eq.equipment_type.toLowerCase().includes(searchTerm.toLowerCase())
-                      )
                       .map((equipment) => (
                         <tr key={equipment.id}>
                           <td>{equipment.equipment_name}</td>
@@ -1,3 +1,28 @@
+// Backend timings (total, db, serialize) arrive in the Server-Timing header of API
+// responses; report them next to the web vitals so both can be correlated per request
+const reportServerTiming = onPerfEntry => {
+  if (typeof PerformanceObserver === 'undefined') {
+    return;
+  }
+  const observer = new PerformanceObserver(list => {
+    list.getEntries().forEach(entry => {
+      if (entry.serverTiming && entry.serverTiming.length) {
+        onPerfEntry({
+          name: 'server-timing',
+          url: entry.name,
+          duration: entry.duration,
+          serverTiming: entry.serverTiming.map(({ name, duration, description }) => ({ name, duration, description })),
+        });
+      }
+    });
+  });
+  try {
+    observer.observe({ type: 'resource', buffered: true });
+  } catch (e) {
+    // Browsers without resource timing support
+  }
+};
+
 const reportWebVitals = onPerfEntry => {
   if (onPerfEntry && onPerfEntry instanceof Function) {
     import('web-vitals').then(({ getCLS, getFID, getFCP, getLCP, getTTFB }) => {
@@ -7,6 +32,7 @@ const reportWebVitals = onPerfEntry => {
       getLCP(onPerfEntry);
       getTTFB(onPerfEntry);
     });
+    reportServerTiming(onPerfEntry);
   }
 };
 